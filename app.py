@@ -3,70 +3,99 @@
 
 import os
 import sys
-import json
 import logging
 from datetime import datetime
 import asyncio
-import subprocess
+import threading
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from typing import Dict, Optional
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for
 from dotenv import load_dotenv
 
+import thuis
+import thuis_browser
+import thuis_disk
+import thuis_metrics as metrics
+from thuis_cookies import get_store as get_cookie_store
+from thuis_jobs import JobQueue
+from thuis_logging import configure_logging
+
 # Load environment
 load_dotenv()
 
 # Paths
 BASE_DIR = Path(__file__).parent
 COOKIE_FILE = BASE_DIR / "cookies.json"
-THUIS_SCRIPT = BASE_DIR / "thuis.py"
+JOBS_FILE = Path(os.getenv("THUIS_QUEUE") or BASE_DIR / "jobs.db")
+
+# Seconds between byte progress updates of a running job
+PROGRESS_INTERVAL = 5.0
+# Seconds between looks at the queue while it has nothing due
+QUEUE_POLL_INTERVAL = 30.0
+
+# Values that switch on a yes/no environment variable
+ENV_TRUE = ("1", "true", "yes")
 
-# Setup logging
+# Logging, rotated daily; configured in setup_logging()
 LOG_DIR = BASE_DIR / "logs"
-LOG_DIR.mkdir(exist_ok=True)
-LOG_FILE = LOG_DIR / f"app-{datetime.now().strftime('%Y-%m-%d')}.log"
+LOG_FILE = LOG_DIR / "app.log"
+LOG_BACKUP_DAYS = 30
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler(LOG_FILE), logging.StreamHandler()],
-)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
 
+def setup_logging():
+    """Queue-based logging to logs/app.log (JSON lines with THUIS_LOG_JSON=1)"""
+    configure_logging(
+        LOG_FILE,
+        json_lines=os.getenv("THUIS_LOG_JSON", "").lower() in ENV_TRUE,
+        when="midnight",
+        backup_count=LOG_BACKUP_DAYS,
+    )
+
+
+# A WSGI server imports the app without running __main__ below; unless it
+# set up logging itself, the INFO messages go to logs/app.log from import on
+if __name__ != "__main__" and not logging.getLogger().handlers:
+    setup_logging()
+
+
 def load_cookies():
-    """Load cookies from file"""
-    if COOKIE_FILE.exists():
-        with open(COOKIE_FILE) as f:
-            return json.load(f)
-    return None
+    """Load unexpired cookies from the shared cookie store"""
+    return get_cookie_store(COOKIE_FILE).load()
 
 
 def save_cookies(cookies):
-    """Save cookies to file"""
-    with open(COOKIE_FILE, "w") as f:
-        json.dump(cookies, f)
+    """Save cookies to the shared cookie store"""
+    get_cookie_store(COOKIE_FILE).save(cookies)
 
 
 def check_login_status():
     """Check if user is logged in via cookies"""
-    cookies = load_cookies()
-    if not cookies:
+    store = get_cookie_store(COOKIE_FILE)
+    if store.load(include_expired=True) is None:
         return False, "No cookies found"
 
-    # Check if cookies are still valid by looking at expiry
-    # For now, assume cookies are valid if they exist
+    cookies = store.load()
+    if not cookies:
+        return False, "Cookies expired"
+
     # A more sophisticated check would test against the VRT API
+    expires_at = store.expires_at()
+    if expires_at:
+        valid_until = datetime.fromtimestamp(expires_at).strftime("%Y-%m-%d %H:%M")
+        return True, f"Cookies valid until {valid_until}"
     return True, "Cookies exist"
 
 
 def get_episodes_from_url(url: str) -> dict:
     """Get episodes from URL using thuis.py logic"""
-    # Import the parsing functions from thuis
+    # thuis_core has no heavy dependencies (no Playwright or requests)
     sys.path.insert(0, str(BASE_DIR))
-    from thuis import detect_url_type, parse_episode_info
+    from thuis_core import detect_url_type, parse_episode_info
 
     url_type = detect_url_type(url)
     info = parse_episode_info(url)
@@ -80,25 +109,145 @@ def get_episodes_from_url(url: str) -> dict:
     }
 
 
-def run_thuis_download(
-    url: str, output_dir: str = None, start_episode: int = None
-) -> tuple:
-    """Run thuis.py to download"""
-    cmd = [sys.executable, str(THUIS_SCRIPT)]
+def worker_options() -> Dict:
+    """QueueWorker options from the environment (see docs/usage.md).
 
-    if output_dir:
-        cmd.extend(["-o", output_dir])
-    if start_episode:
-        cmd.extend(["-s", str(start_episode)])
+    THUIS_BLOCK, THUIS_BROWSER_MAX_RSS (MB), THUIS_BROWSER_MAX_NAVIGATIONS,
+    THUIS_DISK_HEADROOM (GB), THUIS_DISK_WAIT (minutes), THUIS_AUDIO_ONLY and
+    THUIS_FRAGMENTED (fmp4 or ts) do what the thuis.py flags of the same name
+    do. THUIS_FASTSTART and THUIS_FRAGMENTED start the post-processing pool.
+    """
+    block = os.getenv("THUIS_BLOCK", ",".join(thuis_browser.BLOCKABLE))
+    try:
+        block_types = thuis_browser.parse_block_types(block)
+    except ValueError as e:
+        logger.error(f"THUIS_BLOCK ignored: {e}")
+        block_types = thuis_browser.parse_block_types(",".join(thuis_browser.BLOCKABLE))
+    output_format = os.getenv("THUIS_FRAGMENTED") or None
+    if output_format and output_format not in thuis.FRAGMENTED_FORMATS:
+        logger.error(f"THUIS_FRAGMENTED ignored: unknown format {output_format}")
+        output_format = None
+    max_rss = os.getenv("THUIS_BROWSER_MAX_RSS")
+    headroom = os.getenv("THUIS_DISK_HEADROOM")
+    max_wait = os.getenv("THUIS_DISK_WAIT")
+    return {
+        "watchdog": thuis_browser.BrowserWatchdog(
+            max_rss=(
+                int(float(max_rss) * 1024**2)
+                if max_rss
+                else thuis_browser.DEFAULT_MAX_RSS
+            ),
+            max_navigations=int(
+                os.getenv(
+                    "THUIS_BROWSER_MAX_NAVIGATIONS",
+                    thuis_browser.DEFAULT_MAX_NAVIGATIONS,
+                )
+            ),
+        ),
+        "blocker": thuis_browser.RequestBlocker(block_types),
+        "disk": thuis_disk.DiskSpaceScheduler(
+            thuis.MEDIA_DIR,
+            headroom=(
+                int(float(headroom) * thuis_disk.GB)
+                if headroom
+                else thuis_disk.DEFAULT_HEADROOM
+            ),
+            max_wait=float(max_wait) * 60 if max_wait else thuis_disk.DEFAULT_MAX_WAIT,
+            log=logger.info,
+        ),
+        "postprocessor": (
+            thuis.create_postprocessor(1, False, None)
+            if output_format or os.getenv("THUIS_FASTSTART", "").lower() in ENV_TRUE
+            else None
+        ),
+        "output_format": output_format,
+        "audio_only": os.getenv("THUIS_AUDIO_ONLY", "").lower() in ENV_TRUE,
+    }
 
-    cmd.append(url)
 
-    # Run in background
-    process = subprocess.Popen(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-    )
+class DownloadService:
+    """Works through the job queue in this process with a thuis.QueueWorker.
+
+    Jobs are stored in jobs.db (see thuis_jobs), so a restart of the app
+    loses nothing: the worker puts interrupted jobs back in the queue and
+    continues. A background thread owns an asyncio loop and the worker;
+    workers started with thuis.py --worker on other hosts can share the
+    same queue file.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        username: Optional[str],
+        password: str,
+        options=worker_options,
+    ):
+        self.queue = queue
+        self.username = username
+        self.password = password
+        # Called per worker, so a restarted worker gets a fresh process pool
+        self.options = options
+        self.worker: Optional[thuis.QueueWorker] = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker once; resumes jobs interrupted by a restart."""
+        with self._start_lock:
+            if self.worker is not None:
+                return
+            loop = asyncio.new_event_loop()
+            # Given the loop, wake() reaches the worker before run() starts
+            self.worker = thuis.QueueWorker(
+                self.queue,
+                self.username,
+                self.password,
+                **self.options(),
+                poll_interval=QUEUE_POLL_INTERVAL,
+                progress_interval=PROGRESS_INTERVAL,
+                loop=loop,
+            )
+            threading.Thread(
+                target=loop.run_forever, name="thuis-downloads", daemon=True
+            ).start()
+            running = asyncio.run_coroutine_threadsafe(self.worker.run(), loop)
+            running.add_done_callback(lambda future: self._stopped(future, loop))
+
+    def _stopped(self, future, loop: asyncio.AbstractEventLoop):
+        """The worker ended; the next start() or submit() starts a new one."""
+        if not future.cancelled() and future.exception():
+            logger.error(f"Download worker stopped: {future.exception()!r}")
+        with self._start_lock:
+            worker, self.worker = self.worker, None
+        if worker is not None and worker.postprocessor is not None:
+            worker.postprocessor.close()
+        loop.call_soon_threadsafe(loop.stop)
+
+    def submit(self, url: str, start_episode: int = None) -> Dict:
+        """Queue a download; returns its job row."""
+        if not self.username or not self.password:
+            raise RuntimeError("No VRT MAX credentials (run thuis.py --setup)")
+
+        job = self.queue.enqueue(url, start_episode)
+        self.start()
+        self.worker.wake()
+        return job
+
+
+downloads = DownloadService(
+    JobQueue(JOBS_FILE), os.getenv("VRT_USERNAME"), os.getenv("VRT_PASSWORD")
+)
+
 
-    return process.pid, cmd
+@app.before_request
+def start_downloads():
+    """Resume the queue in the process that serves requests.
+
+    Runs under any WSGI server; app.run() below starts it before the first
+    request. Without credentials the worker could not log in; submit()
+    reports that instead.
+    """
+    if downloads.username and downloads.password:
+        downloads.start()
 
 
 @app.route("/")
@@ -147,10 +296,14 @@ def api_download():
         return jsonify({"error": "No URL provided"}), 400
 
     try:
-        pid, cmd = run_thuis_download(url)
-        logger.info(f"Download started: {url} (PID: {pid})")
+        job = downloads.submit(url, data.get("start_episode"))
+        logger.info(f"Download queued: {url} (job {job['id']})")
         return jsonify(
-            {"success": True, "pid": pid, "message": f"Download started (PID: {pid})"}
+            {
+                "success": True,
+                "job": job["id"],
+                "message": f"Download queued (job {job['id']})",
+            }
         )
     except Exception as e:
         logger.error(f"Download error: {str(e)}")
@@ -159,16 +312,25 @@ def api_download():
 
 @app.route("/api/downloads/status")
 def api_downloads_status():
-    """Check running downloads"""
-    # Find running thuis.py processes
-    try:
-        result = subprocess.run(
-            ["pgrep", "-f", "thuis.py"], capture_output=True, text=True
-        )
-        pids = result.stdout.strip().split("\n") if result.stdout.strip() else []
-        return jsonify({"running": len(pids) > 0, "count": len(pids), "pids": pids})
-    except Exception:
-        return jsonify({"running": False, "count": 0})
+    """Queued, running and finished downloads with their progress"""
+    counts = downloads.queue.counts()
+    active = counts["queued"] + counts["running"]
+    return jsonify(
+        {
+            "running": active > 0,
+            "count": active,
+            "counts": counts,
+            "jobs": downloads.queue.list(),
+        }
+    )
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics of the web app and the downloads it runs"""
+    # Downloads run in this process; only the queue depth is read here
+    metrics.QUEUE_DEPTH.set(downloads.queue.counts()["queued"])
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
@@ -176,6 +338,12 @@ if __name__ == "__main__":
     templates_dir = BASE_DIR / "templates"
     templates_dir.mkdir(exist_ok=True)
 
+    setup_logging()
+    debug = os.getenv("FLASK_DEBUG", "1").lower() in ENV_TRUE
+    # With the reloader the app runs in a child process; only that one
+    # works on the queue, the parent only watches the files
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_downloads()
     print("Starting Thuis Web UI...")
     print("Go to http://localhost:5000")
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    app.run(debug=debug, host="0.0.0.0", port=5000)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Episode discovery on large mocked season pages.
+
+Gebruik:
+    python -m benchmarks.bench_discovery --anchors 10000 --rtt-ms 0.2
+
+Compares the old discovery (one get_attribute round-trip per anchor, list
+membership dedupe) with discover_season_episodes_async (one evaluate call,
+set dedupe). The mocked page simulates the Playwright round-trip latency
+per awaited call with --rtt-ms.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import thuis
+
+
+def make_hrefs(anchors: int, duplicate_every: int = 3) -> List[Optional[str]]:
+    """Hrefs of a program page with every season expanded.
+
+    Mixes episode links (relative and absolute, some repeated as teaser and
+    title link), navigation links and anchors without href.
+    """
+    hrefs: List[Optional[str]] = []
+    episode = 0
+    while len(hrefs) < anchors:
+        episode += 1
+        season = episode // 250 + 1
+        path = f"/vrtmax/a-z/thuis/{season}/thuis-s{season}a{episode}/"
+        hrefs.append(path)
+        if episode % duplicate_every == 0:
+            hrefs.append(thuis.BASE_URL + path)
+        if episode % 10 == 0:
+            hrefs.append("/vrtmax/a-z/thuis/")
+            hrefs.append(None)
+    return hrefs[:anchors]
+
+
+class MockAnchor:
+    def __init__(self, href: Optional[str], rtt: float):
+        self.href = href
+        self.rtt = rtt
+
+    async def get_attribute(self, name: str):
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        return self.href if name == "href" else None
+
+
+class MockAsyncPage:
+    """Async Playwright-like page where every awaited call costs one RTT."""
+
+    def __init__(self, hrefs: List[Optional[str]], rtt: float = 0.0):
+        self.hrefs = hrefs
+        self.rtt = rtt
+        self.calls = 0
+
+    async def query_selector_all(self, selector: str):
+        self.calls += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        return [MockAnchor(href, self.rtt) for href in self.hrefs]
+
+    async def evaluate(self, script: str):
+        self.calls += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        return list(self.hrefs)
+
+
+async def discover_per_anchor(page) -> List[str]:
+    """The previous discovery: one round-trip per anchor, O(n²) dedupe."""
+    episode_urls = []
+    for link in await page.query_selector_all("a"):
+        page.calls += 1
+        href = await link.get_attribute("href")
+        if href and "/vrtmax/a-z/" in href:
+            if re.search(r"[a-z]+-s\d+a\d+", href):
+                if href.startswith("/"):
+                    href = thuis.BASE_URL + href
+                if href not in episode_urls:
+                    episode_urls.append(href)
+    return sorted(episode_urls)
+
+
+async def run(anchors: int, rtt_ms: float) -> dict:
+    hrefs = make_hrefs(anchors)
+    results = {"anchors": anchors, "rtt_ms": rtt_ms}
+
+    for name, discover in (
+        ("per_anchor", discover_per_anchor),
+        ("single_evaluate", thuis.discover_season_episodes_async),
+    ):
+        page = MockAsyncPage(hrefs, rtt_ms / 1000)
+        start = time.perf_counter()
+        urls = await discover(page)
+        results[name] = {
+            "seconds": round(time.perf_counter() - start, 4),
+            "round_trips": page.calls,
+            "episodes": len(urls),
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thuis discovery benchmark")
+    parser.add_argument("--anchors", type=int, default=10_000)
+    parser.add_argument(
+        "--rtt-ms",
+        type=float,
+        default=0.0,
+        help="Gesimuleerde Playwright round-trip per call in milliseconden",
+    )
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.anchors, args.rtt_ms)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
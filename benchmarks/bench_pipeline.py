@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Offline benchmarks against the fake VRT origin.
+
+Gebruik:
+    python -m benchmarks.bench_pipeline ffmpeg --segments 60 --segment-size 1048576
+    python -m benchmarks.bench_pipeline season --episodes 10 --segments 20
+    python -m benchmarks.bench_pipeline season --json bench.json
+
+The ffmpeg benchmark measures download_with_ffmpeg against the local HLS
+server. The season benchmark runs the HTTP side of the season pipeline:
+season page discovery, filtering, media-services resolve and the ffmpeg
+transfer for every episode. Browser login and page resolution need a live
+Chromium and are not part of it.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import thuis
+from thuis_metrics import StageTimer
+from benchmarks.fake_vrt import FakeVRT
+
+
+class _AnchorParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.hrefs: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.hrefs.append(href)
+
+
+class _StaticLink:
+    def __init__(self, href: str):
+        self.href = href
+
+    def get_attribute(self, name: str):
+        return self.href if name == "href" else None
+
+
+class StaticPage:
+    """Page-like wrapper around fetched HTML for discover_season_episodes."""
+
+    def __init__(self, html: str):
+        parser = _AnchorParser()
+        parser.feed(html)
+        self.hrefs = parser.hrefs
+
+    def query_selector_all(self, selector: str):
+        return [_StaticLink(href) for href in self.hrefs]
+
+
+def mb_per_second(size: int, seconds: float) -> float:
+    return round(size / 1024 / 1024 / seconds, 3) if seconds > 0 else 0.0
+
+
+def bench_ffmpeg(origin: FakeVRT, runs: int, output_dir: Path) -> Dict:
+    """Time download_with_ffmpeg against the fake HLS server."""
+    results = []
+    for run in range(runs):
+        output_path = output_dir / f"ffmpeg-{run}.mp4"
+        start = time.monotonic()
+        success, result = thuis.download_with_ffmpeg(
+            origin.master_url, output_path, f"bench-{run}", timeout=600
+        )
+        elapsed = time.monotonic() - start
+        size = int(result) if success else 0
+        results.append({"success": success, "seconds": elapsed, "bytes": size})
+        output_path.unlink(missing_ok=True)
+
+    total_bytes = sum(r["bytes"] for r in results)
+    total_seconds = sum(r["seconds"] for r in results)
+    return {
+        "benchmark": "ffmpeg",
+        "runs": results,
+        "stream_bytes": origin.segment_size * origin.segments,
+        "mb_per_second": mb_per_second(total_bytes, total_seconds),
+    }
+
+
+def bench_season(origin: FakeVRT, output_dir: Path) -> Dict:
+    """Run discovery, resolve and transfer for every episode of a season."""
+    timings = StageTimer()
+    session = thuis.get_http_session()
+
+    with timings.stage("discovery"):
+        html = session.get(origin.season_url).text
+        episode_urls = thuis.discover_season_episodes(StaticPage(html))
+        filenames = [
+            thuis.generate_filename(thuis.parse_episode_info(url))
+            for url in episode_urls
+        ]
+        to_download = thuis.filter_episodes_to_download(
+            filenames, thuis.get_existing_episodes(output_dir)
+        )
+
+    completed = 0
+    total_bytes = 0
+    for filename in to_download:
+        episode_id = filename.rsplit(".", 1)[0]
+
+        with timings.stage("media_services"):
+            data = thuis.fetch_stream_info(origin.media_services_url(episode_id), "")
+        stream_url = thuis.get_hls_url(data) if data else None
+        if not stream_url:
+            continue
+
+        success, result = thuis.download_with_ffmpeg(
+            stream_url, output_dir / filename, episode_id, timeout=600, timings=timings
+        )
+        if success:
+            completed += 1
+            total_bytes += int(result)
+
+    summary = timings.summary()
+    return {
+        "benchmark": "season",
+        "episodes_found": len(episode_urls),
+        "episodes_completed": completed,
+        "bytes": total_bytes,
+        "seconds": summary["wall_seconds"],
+        "mb_per_second": mb_per_second(total_bytes, summary["wall_seconds"]),
+        "timings": summary["stages"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thuis offline benchmarks")
+    parser.add_argument("benchmark", choices=["ffmpeg", "season"])
+    parser.add_argument("--episodes", type=int, default=5)
+    parser.add_argument("--segments", type=int, default=30)
+    parser.add_argument("--segment-seconds", type=float, default=2.0)
+    parser.add_argument("--segment-size", type=int, default=512 * 1024)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="Schrijf resultaten als JSON naar dit bestand")
+    args = parser.parse_args()
+
+    with FakeVRT(
+        episodes=args.episodes,
+        segments=args.segments,
+        segment_seconds=args.segment_seconds,
+        segment_size=args.segment_size,
+    ) as origin, tempfile.TemporaryDirectory(prefix="thuis-bench-out-") as out:
+        if args.benchmark == "ffmpeg":
+            result = bench_ffmpeg(origin, args.runs, Path(out))
+        else:
+            result = bench_season(origin, Path(out))
+        result["bytes_served"] = origin.bytes_served
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""Local stand-ins for the VRT origin, used by the benchmarks.
+
+Serves from one HTTP server:
+
+    /hls/master.m3u8                      master playlist with one variant
+    /hls/video.m3u8                       media playlist with N segments
+    /hls/seg-{i}.ts                       MPEG-TS segments of a fixed size
+    /vualto/videos/{id}                   302 to media-services (like VRT)
+    /media-services/videos/{id}           JSON with title and targetUrls
+    /vrtmax/a-z/{program}/                season page with N episode links
+
+Segments are real MPEG-TS generated once with ffmpeg (test pattern + tone)
+and padded with null packets to the requested size, so ffmpeg can remux
+them. Without ffmpeg the segments contain only null packets, which is
+enough to benchmark everything up to the transfer.
+"""
+
+import json
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+TS_PACKET_SIZE = 188
+TS_NULL_PACKET = b"\x47\x1f\xff\x10" + b"\xff" * (TS_PACKET_SIZE - 4)
+
+
+def pad_segment(data: bytes, size: int) -> bytes:
+    """Pad MPEG-TS data with null packets up to (at least) size bytes."""
+    missing = size - len(data)
+    if missing <= 0:
+        return data
+    packets = -(-missing // TS_PACKET_SIZE)
+    return data + TS_NULL_PACKET * packets
+
+
+def generate_segments(
+    directory: Path, count: int, segment_seconds: float
+) -> Optional[List[bytes]]:
+    """Encode a continuous test stream into HLS segments with ffmpeg.
+
+    Returns:
+        The raw segments, or None if ffmpeg is not available
+    """
+    if not shutil.which("ffmpeg"):
+        return None
+
+    playlist = directory / "source.m3u8"
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        "testsrc=size=320x180:rate=25",
+        "-f",
+        "lavfi",
+        "-i",
+        "sine=frequency=440:sample_rate=48000",
+        "-t",
+        str(count * segment_seconds),
+        "-c:v",
+        "mpeg2video",
+        "-g",
+        "25",
+        "-b:v",
+        "300k",
+        "-c:a",
+        "aac",
+        "-b:a",
+        "64k",
+        "-f",
+        "hls",
+        "-hls_time",
+        str(segment_seconds),
+        "-hls_list_size",
+        "0",
+        "-hls_segment_filename",
+        str(directory / "source-%d.ts"),
+        str(playlist),
+    ]
+    subprocess.run(cmd, check=True)
+
+    segments = []
+    for i in range(count):
+        path = directory / f"source-{i}.ts"
+        if not path.exists():
+            break
+        segments.append(path.read_bytes())
+    return segments
+
+
+class FakeVRT:
+    """Fake VRT origin, HLS server and media-services on a local port.
+
+    Args:
+        episodes: Number of episode links on the season page
+        segments: Number of HLS segments per stream
+        segment_seconds: Duration of each segment
+        segment_size: Size in bytes of each served segment
+        program: Program slug used in URLs
+        season: Season number used in URLs
+    """
+
+    def __init__(
+        self,
+        episodes: int = 10,
+        segments: int = 10,
+        segment_seconds: float = 2.0,
+        segment_size: int = 256 * 1024,
+        program: str = "bench",
+        season: int = 1,
+    ):
+        self.episodes = episodes
+        self.segments = segments
+        self.segment_seconds = segment_seconds
+        self.segment_size = segment_size
+        self.program = program
+        self.season = season
+        self.bytes_served = 0
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._tmpdir: Optional[tempfile.TemporaryDirectory] = None
+        self._segments: List[bytes] = []
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def master_url(self) -> str:
+        return f"{self.base_url}/hls/master.m3u8"
+
+    @property
+    def season_url(self) -> str:
+        return f"{self.base_url}/vrtmax/a-z/{self.program}/{self.season}/"
+
+    def episode_id(self, number: int) -> str:
+        return f"{self.program}-s{self.season}a{number}"
+
+    def media_services_url(self, episode_id: str) -> str:
+        return f"{self.base_url}/media-services/videos/{episode_id}"
+
+    @property
+    def bandwidth(self) -> int:
+        """Advertised variant bandwidth in bits per second."""
+        return int(self.segment_size * 8 / self.segment_seconds)
+
+    def start(self) -> "FakeVRT":
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="thuis-bench-")
+        raw = generate_segments(
+            Path(self._tmpdir.name), self.segments, self.segment_seconds
+        )
+        if raw is None:
+            raw = [b""] * self.segments
+        self._segments = [pad_segment(data, self.segment_size) for data in raw]
+        self.segments = len(self._segments)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self._tmpdir:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+
+    def __enter__(self) -> "FakeVRT":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def master_playlist(self) -> str:
+        return (
+            "#EXTM3U\n"
+            "#EXT-X-VERSION:3\n"
+            f"#EXT-X-STREAM-INF:BANDWIDTH={self.bandwidth},RESOLUTION=320x180\n"
+            "video.m3u8\n"
+        )
+
+    def media_playlist(self) -> str:
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{int(self.segment_seconds + 0.999)}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:VOD",
+        ]
+        for i in range(self.segments):
+            lines.append(f"#EXTINF:{self.segment_seconds:.3f},")
+            lines.append(f"seg-{i}.ts")
+        lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def season_page(self) -> str:
+        links = "\n".join(
+            f'<a href="/vrtmax/a-z/{self.program}/{self.season}/'
+            f'{self.episode_id(i)}/">Aflevering {i}</a>'
+            for i in range(1, self.episodes + 1)
+        )
+        return f"<html><body>\n{links}\n</body></html>\n"
+
+    def stream_info(self, episode_id: str) -> Dict:
+        return {
+            "title": episode_id,
+            "targetUrls": [
+                {"type": "dash", "url": f"{self.base_url}/dash/{episode_id}.mpd"},
+                {"type": "hls", "url": self.master_url},
+            ],
+        }
+
+    def _count(self, route: str, size: int):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            self.bytes_served += size
+
+    def _handler_class(self):
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; avoid delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+
+                if path == "/hls/master.m3u8":
+                    return self._send("master", origin.master_playlist(), "m3u8")
+                if path == "/hls/video.m3u8":
+                    return self._send("playlist", origin.media_playlist(), "m3u8")
+
+                match = re.fullmatch(r"/hls/seg-(\d+)\.ts", path)
+                if match and int(match.group(1)) < len(origin._segments):
+                    data = origin._segments[int(match.group(1))]
+                    return self._send("segment", data, "video/mp2t")
+
+                match = re.fullmatch(r"/vualto/videos/([^/]+)", path)
+                if match:
+                    origin._count("vualto", 0)
+                    self.send_response(302)
+                    self.send_header("Location", f"/media-services/videos/{match[1]}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                match = re.fullmatch(r"/media-services/videos/([^/]+)", path)
+                if match:
+                    body = json.dumps(origin.stream_info(match.group(1)))
+                    return self._send("media-services", body, "application/json")
+
+                if path.rstrip("/") in (
+                    f"/vrtmax/a-z/{origin.program}",
+                    f"/vrtmax/a-z/{origin.program}/{origin.season}",
+                ):
+                    return self._send("season", origin.season_page(), "text/html")
+
+                self.send_error(404)
+
+            def _send(self, route: str, body, content_type: str):
+                if isinstance(body, str):
+                    body = body.encode()
+                if content_type == "m3u8":
+                    content_type = "application/vnd.apple.mpegurl"
+                origin._count(route, len(body))
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
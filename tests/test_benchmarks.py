@@ -0,0 +1,83 @@
+"""Test the offline benchmark stand-ins"""
+
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest.fixture
+def fake_vrt(monkeypatch):
+    from benchmarks import fake_vrt
+
+    # Null-packet segments only; no ffmpeg needed
+    monkeypatch.setattr(fake_vrt, "generate_segments", lambda *args: None)
+    with fake_vrt.FakeVRT(episodes=5, segments=3, segment_size=188 * 10) as origin:
+        yield origin
+
+
+class TestFakeVRT:
+    """Test the fake origin, HLS server and media-services"""
+
+    def test_pad_segment(self):
+        """Segments should be padded with whole TS packets"""
+        from benchmarks.fake_vrt import pad_segment, TS_PACKET_SIZE
+
+        data = pad_segment(b"", 1000)
+
+        assert len(data) >= 1000
+        assert len(data) % TS_PACKET_SIZE == 0
+        assert data[0] == 0x47
+
+    def test_playlists(self, fake_vrt):
+        """Master and media playlists should describe the segments"""
+        from thuis import get_http_session
+
+        session = get_http_session()
+        master = session.get(fake_vrt.master_url).text
+        media = session.get(fake_vrt.base_url + "/hls/video.m3u8").text
+
+        assert f"BANDWIDTH={fake_vrt.bandwidth}" in master
+        assert media.count("#EXTINF") == 3
+        assert "#EXT-X-ENDLIST" in media
+
+    def test_segment_size(self, fake_vrt):
+        """Segments should have the configured size"""
+        from thuis import get_http_session
+
+        resp = get_http_session().get(fake_vrt.base_url + "/hls/seg-0.ts")
+
+        assert resp.status_code == 200
+        assert len(resp.content) == 188 * 10
+
+    def test_media_services(self, fake_vrt):
+        """fetch_stream_info should resolve the fake HLS URL"""
+        from thuis import fetch_stream_info, get_hls_url
+
+        data = fetch_stream_info(fake_vrt.media_services_url("bench-s1a1"), "")
+
+        assert data["title"] == "bench-s1a1"
+        assert get_hls_url(data) == fake_vrt.master_url
+
+    def test_vualto_redirect(self, fake_vrt):
+        """vualto URL should redirect to media-services like VRT"""
+        from thuis import get_http_session
+
+        resp = get_http_session().get(
+            fake_vrt.base_url + "/vualto/videos/bench-s1a2", allow_redirects=False
+        )
+
+        assert resp.status_code == 302
+        assert resp.headers["Location"] == "/media-services/videos/bench-s1a2"
+
+    def test_season_page_discovery(self, fake_vrt):
+        """Season page should yield one URL per episode"""
+        from thuis import discover_season_episodes, get_http_session
+        from benchmarks.bench_pipeline import StaticPage
+
+        html = get_http_session().get(fake_vrt.season_url).text
+        urls = discover_season_episodes(StaticPage(html))
+
+        assert len(urls) == 5
+        assert urls[0].endswith("/bench-s1a1/")
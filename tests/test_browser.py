@@ -0,0 +1,472 @@
+"""Test attaching to the browser daemon"""
+
+import asyncio
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+        self.crashed = False
+        self.viewport = None
+        self.url = "about:blank"
+        self.listeners = {}
+        self.init_scripts = 0
+
+    async def set_viewport_size(self, size):
+        self.viewport = size
+
+    def on(self, event, handler):
+        self.listeners.setdefault(event, []).append(handler)
+
+    def remove_listener(self, event, handler):
+        self.listeners[event].remove(handler)
+
+    async def evaluate(self, expression):
+        if self.crashed:
+            raise RuntimeError("Target crashed")
+        return 1
+
+    async def goto(self, url):
+        self.url = url
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.pages = []
+        self.jar = []
+
+    async def cookies(self):
+        return list(self.jar)
+
+    async def add_cookies(self, cookies):
+        self.jar.extend(cookies)
+
+    async def new_page(self):
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+
+class FakeBrowser:
+    def __init__(self, contexts=None):
+        self.contexts = contexts or []
+        self.closed = False
+
+    async def new_context(self, **options):
+        return FakeContext()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeChromium:
+    """Records whether a run attached over CDP or launched a browser"""
+
+    def __init__(self, daemon_context=None):
+        self.daemon_context = daemon_context
+        self.calls = []
+
+    async def connect_over_cdp(self, endpoint, timeout=None):
+        self.calls.append(("connect", endpoint))
+        if self.daemon_context is None:
+            raise ConnectionError("geen daemon")
+        return FakeBrowser([self.daemon_context])
+
+    async def launch(self, headless=True):
+        self.calls.append(("launch", headless))
+        return FakeBrowser()
+
+
+class FakePlaywright:
+    def __init__(self, daemon_context=None):
+        self.chromium = FakeChromium(daemon_context)
+
+
+@pytest.fixture
+def listener():
+    """A local port that accepts connections, like a running daemon"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    sock.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestEndpoint:
+    """Test finding the daemon"""
+
+    def test_default_endpoint(self, monkeypatch):
+        """Without configuration the default local port is used"""
+        from thuis_browser import DEFAULT_CDP_PORT, cdp_endpoint
+
+        monkeypatch.delenv("THUIS_BROWSER_CDP", raising=False)
+
+        assert cdp_endpoint() == f"http://127.0.0.1:{DEFAULT_CDP_PORT}"
+
+    def test_disabled(self, monkeypatch):
+        """THUIS_BROWSER_CDP=off never attaches"""
+        from thuis_browser import cdp_endpoint
+
+        monkeypatch.setenv("THUIS_BROWSER_CDP", "off")
+
+        assert cdp_endpoint() is None
+
+    def test_reachable(self, listener):
+        """Only a listening port counts as a running daemon"""
+        from thuis_browser import endpoint_reachable
+
+        assert endpoint_reachable(listener)
+        assert not endpoint_reachable(f"http://127.0.0.1:{free_port()}")
+
+
+class TestOpenSession:
+    """Test attaching with fallback to launching"""
+
+    async def test_attaches_to_daemon(self, listener):
+        """A running daemon's context is reused"""
+        from thuis_browser import VIEWPORT, open_session
+
+        daemon_context = FakeContext()
+        playwright = FakePlaywright(daemon_context)
+
+        session = await open_session(playwright, endpoint=listener, log=lambda m: None)
+        page = await session.new_page()
+
+        assert session.attached
+        assert session.context is daemon_context
+        assert page.viewport == VIEWPORT
+        assert [c[0] for c in playwright.chromium.calls] == ["connect"]
+
+    async def test_launches_without_daemon(self):
+        """Nothing listening: launch without trying to connect"""
+        from thuis_browser import open_session
+
+        playwright = FakePlaywright()
+        endpoint = f"http://127.0.0.1:{free_port()}"
+
+        session = await open_session(playwright, endpoint=endpoint, log=print)
+
+        assert not session.attached
+        assert playwright.chromium.calls == [("launch", True)]
+
+    async def test_falls_back_when_connect_fails(self, listener):
+        """A port that is not a CDP endpoint falls back to launching"""
+        from thuis_browser import open_session
+
+        messages = []
+        playwright = FakePlaywright()
+
+        session = await open_session(
+            playwright, headless=False, endpoint=listener, log=messages.append
+        )
+
+        assert not session.attached
+        assert playwright.chromium.calls[-1] == ("launch", False)
+        assert "eigen browser" in messages[0]
+
+    async def test_close_keeps_daemon_pages(self, listener):
+        """Closing an attached run only closes the pages it opened"""
+        from thuis_browser import open_session
+
+        daemon_context = FakeContext()
+        daemon_page = await daemon_context.new_page()
+        session = await open_session(
+            FakePlaywright(daemon_context), endpoint=listener, log=lambda m: None
+        )
+        page = await session.new_page()
+
+        await session.close()
+
+        assert page.closed
+        assert not daemon_page.closed
+        assert session.browser.closed
+
+
+async def stealth(page):
+    page.init_scripts += 1
+
+
+class TestPagePool:
+    """Test reusing prepared pages across episodes"""
+
+    async def test_pages_are_reused(self):
+        """One page serves several episodes and is prepared only once"""
+        from thuis_browser import BrowserSession, PagePool
+
+        context = FakeContext()
+        pool = PagePool(BrowserSession(FakeBrowser(), context), prepare=stealth)
+
+        for _ in range(3):
+            page = await pool.acquire()
+            await page.goto("https://www.vrt.be/vrtmax/a-z/thuis/")
+            await pool.release(page)
+
+        assert len(context.pages) == 1
+        assert context.pages[0].init_scripts == 1
+        assert context.pages[0].url == "about:blank"
+
+    async def test_listeners_are_detached(self):
+        """A released page no longer calls the previous episode's handler"""
+        from thuis_browser import BrowserSession, PagePool
+
+        pool = PagePool(BrowserSession(FakeBrowser(), FakeContext()))
+
+        def handler(response):
+            pass
+
+        page = await pool.acquire({"response": handler})
+        assert page.listeners["response"] == [handler]
+        await pool.release(page)
+
+        assert page.listeners["response"] == []
+
+    async def test_recycled_after_max_uses(self):
+        """After max_uses the page is closed and a fresh one is prepared"""
+        from thuis_browser import BrowserSession, PagePool
+
+        context = FakeContext()
+        pool = PagePool(
+            BrowserSession(FakeBrowser(), context), max_uses=2, prepare=stealth
+        )
+
+        for _ in range(5):
+            await pool.release(await pool.acquire())
+
+        assert len(context.pages) == 3
+        assert [p.closed for p in context.pages] == [True, True, False]
+        assert all(p.init_scripts == 1 for p in context.pages)
+        assert pool.recycled == 2
+
+    async def test_unhealthy_page_is_replaced(self):
+        """A crashed page fails the health check and is replaced"""
+        from thuis_browser import BrowserSession, PagePool
+
+        context = FakeContext()
+        pool = PagePool(BrowserSession(FakeBrowser(), context))
+
+        first = await pool.acquire()
+        await pool.release(first)
+        first.crashed = True
+        second = await pool.acquire()
+
+        assert second is not first
+        assert first.closed
+        assert pool.recycled == 1
+
+
+def fake_proc(root: Path, processes) -> Path:
+    """A /proc with (pid, ppid, name, resident pages) entries"""
+    for pid, ppid, name, pages in processes:
+        entry = root / str(pid)
+        entry.mkdir(parents=True)
+        (entry / "stat").write_text(f"{pid} ({name}) S {ppid} {pid} {pid} 0")
+        (entry / "statm").write_text(f"{pages * 2} {pages} 0 0 0 0 0")
+    return root
+
+
+class TestWatchdog:
+    """Test the browser memory watchdog"""
+
+    def test_rss_of_browser_descendants(self, tmp_path):
+        """Only Chromium processes below the given pid are counted"""
+        import os
+
+        from thuis_browser import process_tree_rss
+
+        proc = fake_proc(
+            tmp_path,
+            [
+                (100, 1, "python", 5000),
+                (200, 100, "node", 3000),
+                (300, 200, "chrome", 100),
+                (301, 300, "chrome", 40),
+                (302, 300, "Chrome Helper (R)", 7),
+                (310, 200, "ffmpeg", 900),
+                (400, 1, "chrome", 10000),
+            ],
+        )
+
+        rss = process_tree_rss(root_pid=100, proc=proc)
+
+        assert rss == 140 * os.sysconf("SC_PAGE_SIZE")
+
+    def test_thresholds(self):
+        """Memory or navigation count above the limit asks for a restart"""
+        from thuis_browser import BrowserWatchdog
+
+        usage = {"rss": 500 * 1024**2}
+        watchdog = BrowserWatchdog(
+            max_rss=1024**3, max_navigations=3, sample=lambda: usage["rss"]
+        )
+
+        assert watchdog.check() is None
+        watchdog.navigated(3)
+        assert watchdog.check() == "3 navigaties"
+
+        watchdog.reset()
+        usage["rss"] = 1536 * 1024**2
+        assert watchdog.check() == "geheugen 1536 MB"
+
+    async def test_restart_keeps_cookies(self, monkeypatch):
+        """The relaunched browser gets the old context's cookies"""
+        from thuis_browser import open_session
+
+        monkeypatch.setenv("THUIS_BROWSER_CDP", "off")
+        playwright = FakePlaywright()
+        session = await open_session(playwright, log=print)
+        old_browser = session.browser
+        session.context.jar.append({"name": "session", "value": "abc"})
+
+        await session.restart()
+
+        assert old_browser.closed
+        assert session.browser is not old_browser
+        assert session.context.jar == [{"name": "session", "value": "abc"}]
+        assert [c[0] for c in playwright.chromium.calls] == ["launch", "launch"]
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type):
+        self.url = url
+        self.resource_type = resource_type
+
+
+class FakeRoute:
+    def __init__(self, url, resource_type="document"):
+        self.request = FakeRequest(url, resource_type)
+        self.outcome = None
+
+    async def continue_(self):
+        self.outcome = "continue"
+
+    async def abort(self, error_code=None):
+        self.outcome = "abort"
+
+
+class TestRequestBlocker:
+    """Test which requests are kept from loading"""
+
+    def test_categories(self):
+        """Images, fonts, player media and trackers are blocked"""
+        from thuis_browser import RequestBlocker
+
+        blocker = RequestBlocker()
+
+        assert blocker.category("https://images.vrt.be/a.jpg", "image") == "image"
+        assert blocker.category("https://www.vrt.be/f.woff2", "font") == "font"
+        assert blocker.category("https://cdn.vrt.be/seg-12.m4s?t=1", "xhr") == "media"
+        assert (
+            blocker.category("https://www.googletagmanager.com/gtm.js", "script")
+            == "analytics"
+        )
+        assert blocker.category("https://www.vrt.be/vrtmax/", "document") is None
+        assert blocker.category("https://www.vrt.be/app.js", "script") is None
+
+    def test_stream_requests_are_never_blocked(self):
+        """The vualto redirect and media services always go through"""
+        from thuis_browser import RequestBlocker
+
+        blocker = RequestBlocker()
+
+        assert (
+            blocker.category("https://vod.vualto.example/videos/a.mp4", "media") is None
+        )
+        assert (
+            blocker.category(
+                "https://media-services-public.vrt.be/media-services/v2/x", "fetch"
+            )
+            is None
+        )
+
+    def test_only_configured_types(self):
+        """--block image,font leaves media and trackers alone"""
+        from thuis_browser import RequestBlocker, parse_block_types
+
+        blocker = RequestBlocker(parse_block_types("image,font"))
+
+        assert blocker.category("https://cdn.vrt.be/seg-12.ts", "xhr") is None
+        assert blocker.category("https://www.google-analytics.com/g", "ping") is None
+        assert blocker.category("https://images.vrt.be/a.png", "image") == "image"
+
+    def test_parse_block_types(self):
+        """none disables blocking, unknown types are refused"""
+        from thuis_browser import parse_block_types
+
+        assert parse_block_types("none") == ()
+        assert parse_block_types("Image, font") == ("image", "font")
+        with pytest.raises(ValueError):
+            parse_block_types("image,video")
+
+    async def test_report(self):
+        """Blocked requests are counted for the report"""
+        from thuis_browser import RequestBlocker
+
+        blocker = RequestBlocker()
+        routes = [
+            FakeRoute("https://images.vrt.be/a.jpg", "image"),
+            FakeRoute("https://images.vrt.be/b.jpg", "image"),
+            FakeRoute("https://www.vrt.be/vrtmax/", "document"),
+        ]
+        for route in routes:
+            await blocker.handle(route)
+
+        assert [r.outcome for r in routes] == ["abort", "abort", "continue"]
+        assert blocker.blocked == {"image": 2}
+        assert blocker.report().startswith("Geblokkeerd: 2 verzoeken (image 2)")
+
+
+@pytest.mark.slow
+class TestDaemon:
+    """Run the real daemon (needs an installed Chromium)"""
+
+    async def test_attach_shares_cookies(self, tmp_path):
+        """A run attached to the daemon sees the stored session"""
+        from playwright.async_api import async_playwright
+
+        from thuis_browser import endpoint_reachable, open_session, run_daemon
+        from thuis_cookies import CookieStore
+
+        store = CookieStore(tmp_path / "cookies.json")
+        store.save(
+            [{"name": "session", "value": "abc", "domain": ".vrt.be", "path": "/"}]
+        )
+        port = free_port()
+        daemon = asyncio.create_task(run_daemon(store, port=port, log=print))
+        try:
+            endpoint = f"http://127.0.0.1:{port}"
+            for _ in range(100):
+                if daemon.done():
+                    pytest.skip(f"Chromium start niet: {daemon.exception()}")
+                await asyncio.sleep(0.1)
+                if endpoint_reachable(endpoint):
+                    break
+
+            async with async_playwright() as p:
+                session = await open_session(p, endpoint=endpoint, log=print)
+                cookies = await session.context.cookies()
+                await session.close()
+
+            assert session.attached
+            assert [c["name"] for c in cookies] == ["session"]
+        finally:
+            daemon.cancel()
+            await asyncio.gather(daemon, return_exceptions=True)
@@ -0,0 +1,292 @@
+"""Test the ThuisClient API"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+EPISODE_URL = "https://www.vrt.be/vrtmax/a-z/thuis/31/thuis-s31a6017/"
+
+
+class FakeContext:
+    async def cookies(self):
+        return [{"name": "session", "value": "x", "domain": ".vrt.be", "path": "/"}]
+
+
+class FakeSession:
+    def __init__(self):
+        self.context = FakeContext()
+
+
+class FakePool:
+    """Counts the pages handed out for resolving"""
+
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        return object()
+
+    async def release(self, page):
+        pass
+
+
+def logged_in_client(monkeypatch, tmp_path):
+    """A client with fake browser parts, as start() would leave it"""
+    import thuis
+
+    monkeypatch.setattr(thuis, "COOKIE_FILE", tmp_path / "cookies.json")
+    monkeypatch.setattr(thuis, "MEDIA_DIR", tmp_path / "media")
+    # Keep these downloads out of the process-wide registry
+    for name in ("EPISODES_COMPLETED", "EPISODES_FAILED"):
+        monkeypatch.setattr(thuis.metrics, name, thuis.metrics.Counter(name, ""))
+    monkeypatch.setattr(
+        thuis.metrics, "RESOLVE_DURATION", thuis.metrics.Histogram("resolve", "", [1])
+    )
+    client = thuis.ThuisClient("a@b.be", "geheim")
+    client.session = FakeSession()
+    client.pool = FakePool()
+    return client
+
+
+def fake_resolve(monkeypatch):
+    import thuis
+
+    async def resolve_stream_redirect(page, url, timeout=None):
+        return "https://media-services-public.vrt.be/redirect"
+
+    monkeypatch.setattr(thuis, "resolve_stream_redirect", resolve_stream_redirect)
+    monkeypatch.setattr(
+        thuis,
+        "fetch_stream_info",
+        lambda url, cookies: {
+            "title": "Thuis 6017",
+            "targetUrls": [{"type": "hls", "url": "https://hls/master.m3u8"}],
+        },
+    )
+    monkeypatch.setattr(
+        thuis,
+        "probe_stream",
+        lambda url, cookies: {"bandwidth": 1_000_000, "duration": 1500.0},
+    )
+
+
+class TestResolve:
+    """Test resolving episodes through the client"""
+
+    async def test_resolved_streams_are_cached(self, monkeypatch, tmp_path):
+        """A second resolve of the same episode does not use the browser"""
+        client = logged_in_client(monkeypatch, tmp_path)
+        fake_resolve(monkeypatch)
+
+        first = await client.resolve(EPISODE_URL)
+        second = await client.resolve(EPISODE_URL)
+
+        assert first is second
+        assert first["stream_url"] == "https://hls/master.m3u8"
+        assert first["cookie_header"] == "session=x"
+        assert client.pool.acquired == 1
+
+    async def test_cache_expires(self, monkeypatch, tmp_path):
+        """Stream tokens expire, so old entries are resolved again"""
+        import thuis
+
+        client = logged_in_client(monkeypatch, tmp_path)
+        fake_resolve(monkeypatch)
+
+        stream = await client.resolve(EPISODE_URL)
+        stream["resolved_at"] = time.monotonic() - thuis.STREAM_CACHE_TTL - 1
+        await client.resolve(EPISODE_URL)
+
+        assert client.pool.acquired == 2
+
+    async def test_expired_streams_are_dropped(self, monkeypatch, tmp_path):
+        """Resolving an episode prunes the expired entries of others"""
+        import thuis
+
+        client = logged_in_client(monkeypatch, tmp_path)
+        fake_resolve(monkeypatch)
+
+        stream = await client.resolve(EPISODE_URL)
+        stream["resolved_at"] = time.monotonic() - thuis.STREAM_CACHE_TTL - 1
+        await client.resolve(EPISODE_URL.replace("a6017", "a6018"))
+
+        assert list(client._streams) == [EPISODE_URL.replace("a6017", "a6018")]
+
+    async def test_season_listing_expires(self, monkeypatch, tmp_path):
+        """A long-running client finds episodes published after its first listing"""
+        import thuis
+
+        client = logged_in_client(monkeypatch, tmp_path)
+        season_url = "https://www.vrt.be/vrtmax/a-z/thuis/31/"
+        published = [EPISODE_URL]
+
+        async def discover(url):
+            return list(published)
+
+        monkeypatch.setattr(client, "_discover", discover)
+
+        assert len(await client.list_season(season_url)) == 1
+        published.append(EPISODE_URL.replace("a6017", "a6018"))
+        assert len(await client.list_season(season_url)) == 1
+
+        urls, listed_at = client._seasons[season_url]
+        client._seasons[season_url] = (urls, listed_at - thuis.SEASON_CACHE_TTL - 1)
+
+        assert len(await client.list_season(season_url)) == 2
+
+
+class TestDownload:
+    """Test download() and its progress callbacks"""
+
+    async def test_progress_events(self, monkeypatch, tmp_path):
+        """Callbacks follow the episode from resolve to done"""
+        import thuis
+
+        client = logged_in_client(monkeypatch, tmp_path)
+        fake_resolve(monkeypatch)
+
+        def download_with_ffmpeg(url, path, title, on_progress=None, **kwargs):
+            path.write_bytes(b"x" * 400)
+            on_progress(750.0)
+            path.write_bytes(b"x" * 1000)
+            return True, 1000
+
+        monkeypatch.setattr(thuis, "download_with_ffmpeg", download_with_ffmpeg)
+        events = []
+
+        output = await client.download(
+            EPISODE_URL, filename="Thuis/a6017.mp4", on_progress=events.append
+        )
+        await asyncio.sleep(0)
+
+        assert output == str(tmp_path / "media" / "Thuis" / "a6017.mp4")
+        assert [e["stage"] for e in events] == ["resolve", "transfer", "done"]
+        assert events[1]["seconds"] == 750.0
+        assert events[1]["duration"] == 1500.0
+        assert events[1]["bytes"] == 400
+        assert events[2]["size"] == 1000
+
+    async def test_failed_download(self, monkeypatch, tmp_path):
+        """A failed transfer returns None and reports the error"""
+        import thuis
+
+        client = logged_in_client(monkeypatch, tmp_path)
+        fake_resolve(monkeypatch)
+        monkeypatch.setattr(
+            thuis, "download_with_ffmpeg", lambda *a, **k: (False, "HTTP 403")
+        )
+        events = []
+
+        output = await client.download(EPISODE_URL, on_progress=events.append)
+
+        assert output is None
+        assert events[-1] == {
+            "url": EPISODE_URL,
+            "stage": "failed",
+            "error": "HTTP 403",
+        }
+
+
+class TestWebApp:
+    """Test the in-process downloads of the web app"""
+
+    def test_status_lists_jobs(self, monkeypatch, tmp_path):
+        """Queued jobs are run by the worker and show up in the status API"""
+        import app
+        import thuis
+        from thuis_jobs import JobQueue
+
+        service = app.DownloadService(
+            JobQueue(tmp_path / "jobs.db"), "a@b.be", "geheim"
+        )
+        monkeypatch.setattr(app, "downloads", service)
+
+        async def run_job(worker, job):
+            worker.queue.finish(job["id"], True, owner=worker.owner)
+
+        monkeypatch.setattr(thuis.QueueWorker, "run_job", run_job)
+        job = service.submit(EPISODE_URL)
+        deadline = time.monotonic() + 5
+        while service.queue.get(job["id"])["state"] != "done":
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        status = app.app.test_client().get("/api/downloads/status").get_json()
+
+        assert status["running"] is False
+        assert status["counts"]["done"] == 1
+        assert [j["id"] for j in status["jobs"]] == [job["id"]]
+
+    def test_queue_resumes_without_submit(self, monkeypatch, tmp_path):
+        """Jobs left in jobs.db run once the app serves a request"""
+        import app
+        import thuis
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        job = queue.enqueue(EPISODE_URL)
+        monkeypatch.setattr(
+            app, "downloads", app.DownloadService(queue, "a@b.be", "geheim")
+        )
+
+        async def run_job(worker, job):
+            worker.queue.finish(job["id"], True, owner=worker.owner)
+
+        monkeypatch.setattr(thuis.QueueWorker, "run_job", run_job)
+        app.app.test_client().get("/api/downloads/status")
+        deadline = time.monotonic() + 5
+        while queue.get(job["id"])["state"] != "done":
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    def test_worker_options_from_environment(self, monkeypatch):
+        """The THUIS_* variables configure the worker like the CLI flags"""
+        import app
+
+        monkeypatch.setenv("THUIS_BLOCK", "image")
+        monkeypatch.setenv("THUIS_BROWSER_MAX_RSS", "512")
+        monkeypatch.setenv("THUIS_DISK_HEADROOM", "5")
+        monkeypatch.setenv("THUIS_AUDIO_ONLY", "1")
+        monkeypatch.delenv("THUIS_FASTSTART", raising=False)
+        monkeypatch.delenv("THUIS_FRAGMENTED", raising=False)
+
+        options = app.worker_options()
+
+        assert options["blocker"].types == ("image",)
+        assert options["watchdog"].max_rss == 512 * 1024**2
+        assert options["disk"].headroom == 5 * 1024**3
+        assert options["audio_only"] is True
+        assert options["postprocessor"] is None
+
+    def test_failed_worker_is_restarted(self, monkeypatch, tmp_path):
+        """A worker that stopped on an error is replaced on the next start"""
+        import sqlite3
+        import app
+        import thuis
+        from thuis_jobs import JobQueue
+
+        runs = []
+
+        async def run(worker):
+            runs.append(worker)
+            if len(runs) == 1:
+                raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(thuis.QueueWorker, "run", run)
+        service = app.DownloadService(JobQueue(tmp_path / "jobs.db"), "a@b.be", "x")
+        service.start()
+        deadline = time.monotonic() + 5
+        while service.worker is not None:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        service.start()
+        while len(runs) < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        assert runs[0] is not runs[1]
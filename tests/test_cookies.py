@@ -0,0 +1,158 @@
+"""Test the shared cookie store"""
+
+import sys
+import time
+from multiprocessing import Process
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def cookie(name: str, value: str = "x", expires: float = -1) -> dict:
+    return {
+        "name": name,
+        "value": value,
+        "domain": ".vrt.be",
+        "path": "/",
+        "expires": expires,
+    }
+
+
+def add_cookies(path: str, worker: int, count: int):
+    """Runs in a child process: add cookies one at a time"""
+    from thuis_cookies import CookieStore
+
+    store = CookieStore(Path(path))
+    for i in range(count):
+        store.update([cookie(f"w{worker}-{i}")])
+
+
+class TestCookieStore:
+    """Test saving, loading and caching"""
+
+    def test_save_is_atomic(self, tmp_path):
+        """Saving should leave only the cookie file and its lock"""
+        from thuis_cookies import CookieStore
+
+        store = CookieStore(tmp_path / "cookies.json")
+        store.save([cookie("session")])
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "cookies.json",
+            "cookies.json.lock",
+        ]
+        assert CookieStore(tmp_path / "cookies.json").load() == [cookie("session")]
+
+    def test_expired_cookies_are_skipped(self, tmp_path):
+        """Cookies past their expiry should not be returned"""
+        from thuis_cookies import CookieStore
+
+        now = time.time()
+        store = CookieStore(tmp_path / "cookies.json")
+        store.save(
+            [
+                cookie("verlopen", expires=now - 60),
+                cookie("geldig", expires=now + 3600),
+                cookie("sessie"),
+            ]
+        )
+
+        assert [c["name"] for c in store.load()] == ["geldig", "sessie"]
+        assert len(store.load(include_expired=True)) == 3
+        assert store.expires_at() == pytest.approx(now + 3600)
+
+    def test_unchanged_file_is_served_from_memory(self, tmp_path):
+        """The file is only parsed again after its mtime changes"""
+        from thuis_cookies import CookieStore
+
+        path = tmp_path / "cookies.json"
+        store = CookieStore(path)
+        store.save([cookie("session")])
+        store._cache = [cookie("uit-cache")]
+
+        assert store.load()[0]["name"] == "uit-cache"
+
+        CookieStore(path).save([cookie("nieuw", "y")])
+
+        assert store.load() == [cookie("nieuw", "y")]
+
+    def test_update_merges_cookies(self, tmp_path):
+        """Refreshed cookies replace their namesakes and keep the others"""
+        from thuis_cookies import CookieStore
+
+        store = CookieStore(tmp_path / "cookies.json")
+        store.save([cookie("a", "1"), cookie("b", "1")])
+
+        store.update([cookie("b", "2"), cookie("c", "2")])
+
+        values = {c["name"]: c["value"] for c in store.load()}
+        assert values == {"a": "1", "b": "2", "c": "2"}
+
+    def test_lock_timeout(self, tmp_path):
+        """A writer should give up when another holder keeps the lock"""
+        from thuis_cookies import CookieLockTimeout, CookieStore
+
+        path = tmp_path / "cookies.json"
+        holder = CookieStore(path)
+        waiter = CookieStore(path, lock_timeout=0.2)
+
+        with holder.locked():
+            with pytest.raises(CookieLockTimeout):
+                waiter.save([cookie("session")])
+
+
+class TestConcurrentWriters:
+    """Test several processes refreshing cookies at once"""
+
+    def test_no_updates_are_lost(self, tmp_path):
+        """Every cookie added by every process should end up in the file"""
+        from thuis_cookies import CookieStore
+
+        path = tmp_path / "cookies.json"
+        CookieStore(path).save([])
+
+        workers = [
+            Process(target=add_cookies, args=(str(path), w, 20)) for w in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+
+        assert all(worker.exitcode == 0 for worker in workers)
+        assert len(CookieStore(path).load()) == 80
+
+
+class TestConsent:
+    """Test recording the cookie consent decision"""
+
+    def test_consent_recorded(self):
+        """The marker or the consent platform's cookie counts as answered"""
+        from thuis_cookies import consent_cookie, has_consent
+
+        assert not has_consent([cookie("session")])
+        assert has_consent([cookie("session"), consent_cookie("weigeren")])
+        assert has_consent([cookie("consentUUID")])
+
+    def test_expired_consent(self):
+        """An expired marker asks again"""
+        from thuis_cookies import CONSENT_MAX_AGE, consent_cookie, has_consent
+
+        marker = consent_cookie("weigeren", now=time.time() - CONSENT_MAX_AGE - 1)
+
+        assert not has_consent([marker])
+
+    def test_marker_expiry(self):
+        """The marker expires with the platform's cookies, at most after the max age"""
+        from thuis_cookies import CONSENT_MAX_AGE, consent_expiry
+
+        now = time.time()
+
+        assert (
+            consent_expiry([cookie("consentUUID", expires=now + 60)], now) == now + 60
+        )
+        assert consent_expiry([cookie("session", expires=now + 60)], now) == (
+            now + CONSENT_MAX_AGE
+        )
@@ -0,0 +1,74 @@
+"""Test that the core and CLI entry points import without heavy dependencies"""
+
+import sys
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+HEAVY_MODULES = ("playwright", "playwright_stealth", "requests")
+
+
+def imported_modules(statement: str) -> set:
+    """Run statements in a fresh interpreter and return the heavy modules loaded"""
+    code = (
+        f"import sys\n{statement}\n"
+        f"print('HEAVY:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+    marker = [line for line in result.stdout.splitlines() if line.startswith("HEAVY:")]
+    assert marker, result.stderr
+    return set(filter(None, marker[-1][len("HEAVY:") :].split(",")))
+
+
+class TestLightweightImports:
+    """Test lazy loading of Playwright, stealth and requests"""
+
+    def test_core_has_no_heavy_imports(self):
+        """thuis_core should only use the standard library"""
+        assert imported_modules("import thuis_core") == set()
+
+    def test_thuis_import_is_lazy(self):
+        """Importing thuis should not load Playwright or requests"""
+        assert imported_modules("import thuis") == set()
+
+    def test_help_is_lazy(self):
+        """--help should not load Playwright or requests"""
+        statement = (
+            "import thuis\n"
+            "sys.argv = ['thuis.py', '--help']\n"
+            "try:\n"
+            "    thuis.main()\n"
+            "except SystemExit:\n"
+            "    pass"
+        )
+
+        assert imported_modules(statement) == set()
+
+    def test_import_has_no_logging_side_effect(self):
+        """Importing thuis should not attach handlers to the root logger"""
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import logging, thuis; print(len(logging.getLogger().handlers))",
+            ],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert result.stdout.strip() == "0"
+
+    def test_thuis_reexports_core(self):
+        """Existing imports from thuis should keep working"""
+        import thuis
+        import thuis_core
+
+        assert thuis.parse_episode_info is thuis_core.parse_episode_info
+        assert thuis.detect_url_type is thuis_core.detect_url_type
+        assert thuis.filter_episodes_to_download is (
+            thuis_core.filter_episodes_to_download
+        )
@@ -0,0 +1,123 @@
+"""Test disk-space-aware scheduling"""
+
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+GB = 1024**3
+
+
+@pytest.fixture
+def free_space(monkeypatch):
+    """Fake free space; a list so tests can change it between polls"""
+    import thuis_disk
+
+    space = [10 * GB]
+    monkeypatch.setattr(thuis_disk, "free_bytes", lambda path: space[0])
+    return space
+
+
+def make_scheduler(tmp_path, messages, sleeps, **kwargs):
+    from thuis_disk import DiskSpaceScheduler
+
+    kwargs.setdefault("headroom", 2 * GB)
+    return DiskSpaceScheduler(
+        tmp_path,
+        poll_interval=30,
+        log=messages.append,
+        sleep=sleeps.append,
+        **kwargs,
+    )
+
+
+class TestDiskSpaceScheduler:
+    """Test admission of downloads against free space"""
+
+    def test_estimate_size(self):
+        """Size should be bandwidth in bytes per second times duration"""
+        from thuis_disk import estimate_size
+
+        assert estimate_size(8_000_000, 1500) == 1_500_000_000
+
+    def test_reserve_when_it_fits(self, tmp_path, free_space):
+        """A download that fits with headroom should start at once"""
+        messages, sleeps = [], []
+        scheduler = make_scheduler(tmp_path, messages, sleeps)
+
+        assert scheduler.reserve(5 * GB) is True
+        assert sleeps == []
+        assert scheduler.available() == 3 * GB
+
+        scheduler.release(5 * GB)
+        assert scheduler.available() == 8 * GB
+
+    def test_pause_until_space_frees(self, tmp_path, free_space):
+        """The queue should pause and resume once space is freed"""
+        messages, sleeps = [], []
+        scheduler = make_scheduler(tmp_path, messages, sleeps)
+        free_space[0] = 3 * GB
+
+        def free_up(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                free_space[0] = 10 * GB
+
+        scheduler.sleep = free_up
+
+        assert scheduler.reserve(5 * GB) is True
+        assert sleeps == [30, 30]
+        assert any("Wachten op schijfruimte" in m for m in messages)
+
+    def test_give_up_after_max_wait(self, tmp_path, free_space):
+        """Without space the download should not start"""
+        messages, sleeps = [], []
+        scheduler = make_scheduler(tmp_path, messages, sleeps, max_wait=90)
+        free_space[0] = 3 * GB
+
+        assert scheduler.reserve(5 * GB) is False
+        assert sleeps == [30, 30, 30]
+        assert scheduler.reserved == 0
+
+    def test_check_total_warns(self, tmp_path, free_space):
+        """A season that does not fit should be reported up front"""
+        messages, sleeps = [], []
+        scheduler = make_scheduler(tmp_path, messages, sleeps)
+
+        scheduler.check_total(1 * GB, 20)
+
+        assert "20 afleveringen" in messages[0]
+
+
+class TestEstimateStreamSize:
+    """Test size estimates from the HLS playlists"""
+
+    def test_estimate_from_fake_origin(self, monkeypatch):
+        """Estimate should match bandwidth times playlist duration"""
+        import thuis
+        from benchmarks import fake_vrt
+
+        monkeypatch.setattr(fake_vrt, "generate_segments", lambda *args: None)
+        monkeypatch.setattr(thuis, "_http_session", None)
+        with fake_vrt.FakeVRT(segments=10, segment_size=188 * 1000) as origin:
+            estimate = thuis.estimate_stream_size(origin.master_url, "")
+
+        assert estimate == 10 * 188 * 1000
+
+
+class TestDiskFullDownload:
+    """Test that a transfer cut short by a full disk is not a success"""
+
+    def test_disk_full_partial_is_failure(self, tmp_path):
+        """The partial file should be removed and reported as failed"""
+        from thuis import check_download_output
+
+        path = tmp_path / "thuis-s31a1.mp4"
+        path.write_bytes(b"x" * 1024)
+
+        success, error = check_download_output(path, 1, 10.0, disk_full=True)
+
+        assert success is False
+        assert "schijfruimte" in error
+        assert not path.exists()
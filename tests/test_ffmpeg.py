@@ -0,0 +1,139 @@
+"""Test the cached ffmpeg capability probe"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+PROTOCOLS_OUTPUT = """Supported file protocols:
+Input:
+  file
+  http
+  https
+  tcp
+Output:
+  file
+  rtmp
+"""
+
+DEMUXERS_OUTPUT = """File formats:
+ D. = Demuxing supported
+ .E = Muxing supported
+ --
+ D  hls             Apple HTTP Live Streaming
+ D  mov,mp4,m4a,3gp,3g2,mj2 QuickTime / MOV
+ D  mpegts          MPEG-TS (MPEG-2 Transport Stream)
+"""
+
+
+def make_binary(directory: Path, name: str = "ffmpeg") -> Path:
+    path = directory / name
+    path.write_text("#!/bin/sh\n")
+    path.chmod(0o755)
+    return path
+
+
+class TestParsing:
+    """Test parsing of ffmpeg's listing output"""
+
+    def test_parse_version(self):
+        """Should read the version from the first line"""
+        from thuis_ffmpeg import parse_version, version_tuple
+
+        version = parse_version("ffmpeg version 6.1.1-3ubuntu5 Copyright (c) 2000")
+
+        assert version == "6.1.1-3ubuntu5"
+        assert version_tuple(version) == (6, 1)
+        assert version_tuple("N-112233-gabcdef") is None
+
+    def test_parse_protocols(self):
+        """Only input protocols should be listed"""
+        from thuis_ffmpeg import parse_protocols
+
+        assert parse_protocols(PROTOCOLS_OUTPUT) == ["file", "http", "https", "tcp"]
+
+    def test_parse_demuxers(self):
+        """Comma separated demuxer aliases should be split"""
+        from thuis_ffmpeg import parse_demuxers
+
+        demuxers = parse_demuxers(DEMUXERS_OUTPUT)
+
+        assert "hls" in demuxers
+        assert "mp4" in demuxers
+        assert "mpegts" in demuxers
+        assert "=" not in demuxers
+
+
+class TestProbeCache:
+    """Test caching by binary path and mtime"""
+
+    def fake_probe(self, calls):
+        def run_probe(ffmpeg, ffprobe):
+            calls.append(ffmpeg)
+            return {
+                "version": "6.1",
+                "protocols": ["https"],
+                "demuxers": ["hls"],
+                "ffprobe": ffprobe,
+            }
+
+        return run_probe
+
+    def test_probe_is_cached(self, tmp_path, monkeypatch):
+        """A second probe of the same binary should not start ffmpeg"""
+        import thuis_ffmpeg
+
+        calls = []
+        monkeypatch.setattr(thuis_ffmpeg, "run_probe", self.fake_probe(calls))
+        binary = make_binary(tmp_path)
+        cache_file = tmp_path / "capabilities.json"
+
+        first = thuis_ffmpeg.probe_ffmpeg(str(binary), cache_file)
+        second = thuis_ffmpeg.probe_ffmpeg(str(binary), cache_file)
+
+        assert len(calls) == 1
+        assert first == second
+        assert first["version"] == "6.1"
+
+    def test_changed_binary_is_probed_again(self, tmp_path, monkeypatch):
+        """A new mtime should invalidate the cache entry"""
+        import thuis_ffmpeg
+
+        calls = []
+        monkeypatch.setattr(thuis_ffmpeg, "run_probe", self.fake_probe(calls))
+        binary = make_binary(tmp_path)
+        cache_file = tmp_path / "capabilities.json"
+
+        thuis_ffmpeg.probe_ffmpeg(str(binary), cache_file)
+        stat = binary.stat()
+        os.utime(binary, (stat.st_atime, stat.st_mtime + 10))
+        thuis_ffmpeg.probe_ffmpeg(str(binary), cache_file)
+
+        assert len(calls) == 2
+
+    def test_missing_binary(self, tmp_path):
+        """No ffmpeg should give None"""
+        from thuis_ffmpeg import probe_ffmpeg
+
+        assert probe_ffmpeg(str(tmp_path / "ffmpeg"), None) is None
+
+
+class TestOptions:
+    """Test options chosen from capabilities"""
+
+    def test_missing_capabilities(self):
+        """Builds without https or hls should be reported"""
+        from thuis_ffmpeg import missing_capabilities
+
+        caps = {"protocols": ["file", "http"], "demuxers": ["hls"]}
+
+        assert missing_capabilities(caps) == ["protocol https"]
+
+    def test_reconnect_on_network_error_needs_4_4(self):
+        """Older builds should not get unknown options"""
+        from thuis_ffmpeg import input_options
+
+        assert "-reconnect_on_network_error" not in input_options({"version": "4.2.7"})
+        assert "-reconnect_on_network_error" in input_options({"version": "6.1"})
+        assert "-reconnect" in input_options(None)
@@ -0,0 +1,153 @@
+"""Test HLS playlist parsing and audio-only selection"""
+
+import sys
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+MASTER = """#EXTM3U
+#EXT-X-VERSION:4
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac-lo",NAME="Nederlands",LANGUAGE="nl",DEFAULT=YES,URI="audio/lo.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac-hi",NAME="Audiodescriptie",LANGUAGE="nl",DEFAULT=NO,URI="audio/ad.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac-hi",NAME="Nederlands",LANGUAGE="nl",DEFAULT=YES,URI="audio/hi.m3u8"
+#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="NL",URI="subs/nl.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2",AUDIO="aac-lo"
+video/360.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2",AUDIO="aac-hi"
+https://cdn.example/video/1080.m3u8
+"""
+
+MUXED = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000
+video/360.m3u8
+"""
+
+
+class TestParsing:
+    """Test master playlist parsing"""
+
+    def test_attributes_with_quoted_commas(self):
+        """Quoted values may contain commas"""
+        from thuis_hls import parse_attributes
+
+        attrs = parse_attributes('BANDWIDTH=800000,CODECS="avc1.4d401e,mp4a.40.2"')
+
+        assert attrs == {"BANDWIDTH": "800000", "CODECS": "avc1.4d401e,mp4a.40.2"}
+
+    def test_master_playlist(self):
+        """Variants and renditions should have absolute URIs"""
+        from thuis_hls import parse_master_playlist
+
+        master = parse_master_playlist(MASTER, "https://vod.example/x/master.m3u8")
+
+        assert [v["bandwidth"] for v in master["variants"]] == [800000, 5000000]
+        assert master["variants"][0]["uri"] == "https://vod.example/x/video/360.m3u8"
+        assert master["variants"][1]["uri"] == "https://cdn.example/video/1080.m3u8"
+        assert master["media"][0]["uri"] == "https://vod.example/x/audio/lo.m3u8"
+        assert master["media"][0]["default"] is True
+
+
+class TestAudioSelection:
+    """Test which audio rendition --audio-only downloads"""
+
+    def test_default_of_best_variant_group(self):
+        """The DEFAULT rendition of the best variant's audio group wins"""
+        from thuis_hls import parse_master_playlist, select_audio_rendition
+
+        rendition = select_audio_rendition(parse_master_playlist(MASTER))
+
+        assert rendition["uri"] == "audio/hi.m3u8"
+
+    def test_muxed_audio(self):
+        """Without audio renditions there is nothing to select"""
+        from thuis_hls import parse_master_playlist, select_audio_rendition
+
+        assert select_audio_rendition(parse_master_playlist(MUXED)) is None
+
+
+class PlaylistHandler(BaseHTTPRequestHandler):
+    playlists = {}
+
+    def do_GET(self):
+        body = type(self).playlists.get(self.path, "").encode()
+        self.send_response(200 if body else 404)
+        self.send_header("Content-Type", "application/vnd.apple.mpegurl")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def playlist_server(monkeypatch):
+    import thuis
+
+    monkeypatch.setattr(thuis, "_http_session", None)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PlaylistHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class TestResolveAudioStream:
+    """Test fetching the master playlist for --audio-only"""
+
+    def test_audio_rendition_url(self, playlist_server):
+        """Should return the absolute URL of the audio playlist"""
+        from thuis import resolve_audio_stream
+
+        PlaylistHandler.playlists = {"/hls/master.m3u8": MASTER}
+
+        url = resolve_audio_stream(f"{playlist_server}/hls/master.m3u8", "")
+
+        assert url == f"{playlist_server}/hls/audio/hi.m3u8"
+
+    def test_muxed_falls_back_to_master(self, playlist_server):
+        """Muxed streams should be downloaded from the master URL"""
+        from thuis import resolve_audio_stream
+
+        PlaylistHandler.playlists = {"/hls/master.m3u8": MUXED}
+        master_url = f"{playlist_server}/hls/master.m3u8"
+
+        assert resolve_audio_stream(master_url, "") == master_url
+
+
+class TestAudioFilenames:
+    """Test that m4a downloads are treated as episodes"""
+
+    def test_generate_m4a_filename(self):
+        """Audio downloads should get the m4a extension"""
+        from thuis_core import generate_filename
+
+        info = {"program": "thuis", "season": "31", "episode": "6017"}
+
+        assert generate_filename(info, "m4a") == "thuis-s31a6017.m4a"
+
+    def test_start_episode_filter_m4a(self):
+        """--start should work for m4a files as well"""
+        from thuis_core import filter_episodes_to_download
+
+        episodes = ["thuis-s31a5.m4a", "thuis-s31a10.m4a"]
+
+        assert filter_episodes_to_download(episodes, [], 8) == ["thuis-s31a10.m4a"]
+
+    def test_existing_m4a(self, tmp_path):
+        """Existing m4a files should be skipped on the next run"""
+        from thuis import get_existing_episodes
+
+        (tmp_path / "thuis-s31a5.m4a").write_bytes(b"")
+        (tmp_path / "thuis-s31a6.mp4").write_bytes(b"")
+
+        assert sorted(get_existing_episodes(tmp_path)) == [
+            "thuis-s31a5.m4a",
+            "thuis-s31a6.mp4",
+        ]
@@ -0,0 +1,168 @@
+"""Test shared HTTP session (pooling, timeouts, retry)"""
+
+import sys
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers with the queued status codes, then 200 with JSON"""
+
+    statuses = []
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        status = type(self).statuses.pop(0) if type(self).statuses else 200
+        body = json.dumps({"title": "test", "targetUrls": []}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_server():
+    FlakyHandler.statuses = []
+    FlakyHandler.hits = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+class TestHTTPSession:
+    """Test retry and timeout behaviour of the HTTP client"""
+
+    def test_retries_transient_502(self, flaky_server):
+        """A transient 502 should be retried instead of failing"""
+        from thuis_http import create_http_session
+
+        server, url = flaky_server
+        FlakyHandler.statuses = [502, 503]
+
+        session = create_http_session(backoff_factor=0)
+        resp = session.get(url)
+
+        assert resp.status_code == 200
+        assert FlakyHandler.hits == 3
+
+    def test_no_retry_on_404(self, flaky_server):
+        """Client errors should not be retried"""
+        from thuis_http import create_http_session
+
+        server, url = flaky_server
+        FlakyHandler.statuses = [404]
+
+        session = create_http_session(backoff_factor=0)
+        resp = session.get(url)
+
+        assert resp.status_code == 404
+        assert FlakyHandler.hits == 1
+
+    def test_gives_up_after_retries(self, flaky_server):
+        """Should return the last error response once retries are exhausted"""
+        from thuis_http import create_http_session
+
+        server, url = flaky_server
+        FlakyHandler.statuses = [502] * 10
+
+        session = create_http_session(retries=2, backoff_factor=0)
+        resp = session.get(url)
+
+        assert resp.status_code == 502
+        assert FlakyHandler.hits == 3
+
+    def test_default_timeout(self, monkeypatch):
+        """Every request should get the default (connect, read) timeout"""
+        from thuis_http import create_http_session, HTTP_TIMEOUT
+        import requests
+
+        seen = {}
+
+        def fake_request(self, method, url, **kwargs):
+            seen.update(kwargs)
+
+        monkeypatch.setattr(requests.Session, "request", fake_request)
+
+        create_http_session().get("http://example.invalid/")
+
+        assert seen["timeout"] == HTTP_TIMEOUT
+
+    def test_shared_session(self):
+        """get_http_session should reuse one pooled session"""
+        from thuis import get_http_session
+
+        assert get_http_session() is get_http_session()
+
+    def test_backoff_jitter(self):
+        """Backoff should stay within half and full exponential backoff"""
+        from thuis_http import JitteredRetry
+
+        retry = JitteredRetry(total=5, backoff_factor=1).increment(
+            method="GET", url="/"
+        )
+        retry = retry.increment(method="GET", url="/")
+
+        for _ in range(20):
+            backoff = retry.get_backoff_time()
+            assert 1.0 <= backoff <= 2.0
+
+
+class TestStreamInfo:
+    """Test media-services response handling"""
+
+    def test_fetch_stream_info(self, flaky_server, monkeypatch):
+        """Should return parsed JSON after a transient error"""
+        import thuis
+        from thuis_http import create_http_session
+
+        server, url = flaky_server
+        FlakyHandler.statuses = [502]
+        monkeypatch.setattr(
+            thuis, "_http_session", create_http_session(backoff_factor=0)
+        )
+
+        data = thuis.fetch_stream_info(url, "session=abc")
+
+        assert data == {"title": "test", "targetUrls": []}
+
+    def test_fetch_stream_info_error(self, flaky_server, monkeypatch):
+        """Should return None when the API keeps failing"""
+        import thuis
+        from thuis_http import create_http_session
+
+        server, url = flaky_server
+        FlakyHandler.statuses = [403]
+        monkeypatch.setattr(
+            thuis, "_http_session", create_http_session(backoff_factor=0)
+        )
+
+        assert thuis.fetch_stream_info(url, "") is None
+
+    def test_get_hls_url(self):
+        """Should pick the HLS target URL"""
+        from thuis import get_hls_url
+
+        data = {
+            "targetUrls": [
+                {"type": "dash", "url": "https://example.com/a.mpd"},
+                {"type": "hls", "url": "https://example.com/a.m3u8"},
+            ]
+        }
+
+        assert get_hls_url(data) == "https://example.com/a.m3u8"
+        assert get_hls_url({}) is None
@@ -0,0 +1,531 @@
+"""Test the persistent download queue"""
+
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+SEASON_URL = "https://www.vrt.be/vrtmax/a-z/thuis/31/"
+EPISODE_URL = "https://www.vrt.be/vrtmax/a-z/thuis/31/thuis-s31a6017/"
+
+
+class TestJobQueue:
+    """Test claiming, finishing and retrying jobs"""
+
+    def test_jobs_run_in_order(self, tmp_path):
+        """The oldest queued job is claimed first"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        first = queue.enqueue(SEASON_URL, start_episode=10)
+        queue.enqueue(EPISODE_URL)
+
+        job = queue.claim()
+
+        assert job["id"] == first["id"]
+        assert job["state"] == "running"
+        assert job["attempts"] == 1
+        assert job["start_episode"] == 10
+        assert queue.counts() == {"queued": 1, "running": 1, "done": 0, "failed": 0}
+
+    def test_failed_job_is_retried(self, tmp_path):
+        """A failed run is queued again, after a delay, until max_attempts"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db", max_attempts=2, retry_delay=0)
+        job = queue.enqueue(EPISODE_URL)
+
+        assert queue.finish(queue.claim()["id"], False, "HTTP 403") == "queued"
+        assert queue.finish(queue.claim()["id"], False, "HTTP 403") == "failed"
+        assert queue.claim() is None
+        assert queue.get(job["id"])["error"] == "HTTP 403"
+
+    def test_retry_waits(self, tmp_path):
+        """A job that just failed is not claimed again straight away"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db", retry_delay=60)
+        queue.enqueue(EPISODE_URL)
+        queue.finish(queue.claim()["id"], False)
+
+        assert queue.claim() is None
+
+    def test_progress(self, tmp_path):
+        """Byte and episode progress is stored with the job"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        job = queue.enqueue(SEASON_URL)
+        queue.claim(owner="host-a:1")
+        queue.progress(
+            job["id"], bytes_done=5_000_000, episodes_done=2, owner="host-a:1"
+        )
+        queue.progress(job["id"], bytes_done=7_000_000, owner="host-a:1")
+
+        stored = queue.get(job["id"])
+        assert stored["bytes_done"] == 7_000_000
+        assert stored["episodes_done"] == 2
+
+
+class TestRestart:
+    """Test that queued work survives a restart"""
+
+    def test_interrupted_jobs_are_resumed(self, tmp_path):
+        """Jobs of a stopped worker on this host are queued again on start"""
+        from thuis_jobs import JobQueue, worker_host
+
+        finished = subprocess.Popen([sys.executable, "-c", "pass"])
+        finished.wait()
+        before = JobQueue(tmp_path / "jobs.db")
+        running = before.enqueue(SEASON_URL)
+        waiting = before.enqueue(EPISODE_URL)
+        before.claim(owner=f"{worker_host()}:{finished.pid}")
+
+        # A new process opens the same database
+        after = JobQueue(tmp_path / "jobs.db")
+
+        assert after.recover() == 1
+        assert after.claim()["id"] == running["id"]
+        assert after.claim()["id"] == waiting["id"]
+        assert after.get(running["id"])["attempts"] == 2
+
+    def test_other_workers_keep_their_jobs(self, tmp_path):
+        """recover() leaves jobs of live workers and other hosts alone"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        queue.enqueue(SEASON_URL)
+        queue.enqueue(EPISODE_URL)
+        queue.claim()
+        queue.claim(owner="andere-host:1")
+
+        assert queue.recover() == 0
+        assert queue.counts()["running"] == 2
+
+    def test_concurrent_claims(self, tmp_path):
+        """Workers claiming at the same time never get the same job"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        for i in range(40):
+            queue.enqueue(f"{SEASON_URL}?{i}")
+        claimed = []
+
+        def worker():
+            while (job := JobQueue(tmp_path / "jobs.db").claim()) is not None:
+                claimed.append(job["id"])
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        assert sorted(claimed) == list(range(1, 41))
+
+
+class TestLeases:
+    """Test leases shared between workers on several hosts"""
+
+    def test_expired_lease_is_reclaimed(self, tmp_path):
+        """A job whose worker stopped renewing its lease moves to another"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        job = queue.enqueue(SEASON_URL)
+        queue.claim(owner="host-a:1", lease=0.05)
+
+        assert queue.claim(owner="host-b:1") is None
+        time.sleep(0.1)
+        reclaimed = queue.claim(owner="host-b:1")
+
+        assert reclaimed["id"] == job["id"]
+        assert reclaimed["owner"] == "host-b:1"
+        assert reclaimed["attempts"] == 2
+
+    def test_heartbeat_keeps_the_lease(self, tmp_path):
+        """Renewed leases are not reclaimed"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        job = queue.enqueue(SEASON_URL)
+        queue.claim(owner="host-a:1", lease=0.2)
+        for _ in range(3):
+            time.sleep(0.1)
+            assert queue.heartbeat(job["id"], owner="host-a:1", lease=0.2)
+
+        assert queue.claim(owner="host-b:1") is None
+
+    def test_expired_lease_counts_as_attempt(self, tmp_path):
+        """A job whose worker dies on every attempt fails in the end"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db", max_attempts=3)
+        job = queue.enqueue(EPISODE_URL)
+        for attempt in range(3):
+            assert queue.claim(owner=f"host-{attempt}:1", lease=0)["id"] == job["id"]
+
+        assert queue.claim(owner="host-x:1") is None
+        assert queue.get(job["id"])["state"] == "failed"
+        assert queue.get(job["id"])["error"] == "lease verlopen"
+
+    def test_recover_gives_up_after_last_attempt(self, tmp_path):
+        """An interrupted last attempt is not queued again"""
+        from thuis_jobs import JobQueue, worker_host
+
+        finished = subprocess.Popen([sys.executable, "-c", "pass"])
+        finished.wait()
+        queue = JobQueue(tmp_path / "jobs.db", max_attempts=1)
+        job = queue.enqueue(EPISODE_URL)
+        queue.claim(owner=f"{worker_host()}:{finished.pid}")
+
+        assert queue.recover() == 0
+        assert queue.get(job["id"])["state"] == "failed"
+
+    def test_lost_lease(self, tmp_path):
+        """The old owner learns from its heartbeat and cannot finish the job"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        job = queue.enqueue(SEASON_URL)
+        queue.claim(owner="host-a:1", lease=0)
+        queue.claim(owner="host-b:1")
+
+        assert not queue.heartbeat(job["id"], owner="host-a:1")
+        assert not queue.progress(job["id"], bytes_done=1, owner="host-a:1")
+        assert queue.finish(job["id"], True, owner="host-a:1") is None
+        assert queue.get(job["id"])["state"] == "running"
+        assert queue.finish(job["id"], True, owner="host-b:1") == "done"
+
+    def test_enqueue_skips_active_duplicates(self, tmp_path):
+        """An episode that is already queued or running is not added twice"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        first = queue.enqueue(EPISODE_URL, output="Thuis/a6017.mp4")
+        second = queue.enqueue(EPISODE_URL, output="Thuis/a6017.mp4")
+
+        assert second["id"] == first["id"]
+        assert queue.counts()["queued"] == 1
+
+    def test_enqueue_skips_done_episodes(self, tmp_path):
+        """A downloaded episode is not queued again by a later season split"""
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        first = queue.enqueue(EPISODE_URL, output="Thuis/a6017.mp4")
+        queue.finish(queue.claim(owner="host-a:1")["id"], True, owner="host-a:1")
+
+        again = queue.enqueue(EPISODE_URL, output="Thuis/a6017.mp4")
+        submitted = queue.enqueue(EPISODE_URL)
+
+        assert again["id"] == first["id"]
+        assert again["state"] == "done"
+        assert submitted["state"] == "queued"
+
+    def test_upgrades_existing_database(self, tmp_path):
+        """A jobs table without the lease columns gets them added"""
+        import sqlite3
+        from thuis_jobs import JobQueue
+
+        db = sqlite3.connect(tmp_path / "jobs.db")
+        db.execute(
+            "CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "url TEXT NOT NULL, start_episode INTEGER, "
+            "state TEXT NOT NULL DEFAULT 'queued', "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "bytes_done INTEGER NOT NULL DEFAULT 0, "
+            "episodes_done INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "run_after REAL NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        db.execute(
+            "INSERT INTO jobs (url, created_at, updated_at) VALUES (?, 0, 0)",
+            (SEASON_URL,),
+        )
+        db.commit()
+        db.close()
+
+        job = JobQueue(tmp_path / "jobs.db").claim(owner="host-a:1")
+
+        assert job["url"] == SEASON_URL
+        assert job["owner"] == "host-a:1"
+
+
+class FakeClient:
+    """Stands in for a started ThuisClient"""
+
+    def __init__(self, episodes=()):
+        self.episodes = list(episodes)
+        self.on_progress = None
+        self.cancelled = None
+        self.downloads = []
+
+    async def list_season(self, url, audio_only=False):
+        return self.episodes
+
+    async def download(self, url, output_path=None, **kwargs):
+        import asyncio
+
+        self.downloads.append((url, output_path))
+        self.cancelled = asyncio.Event()
+        await self.cancelled.wait()
+        return None
+
+    def cancel(self):
+        self.cancelled.set()
+
+    async def close(self):
+        pass
+
+
+def episode(number: int) -> dict:
+    return {
+        "url": f"https://www.vrt.be/vrtmax/a-z/thuis/31/thuis-s31a{number}/",
+        "filename": f"thuis-s31a{number}.mp4",
+    }
+
+
+class TestQueueWorker:
+    """Test the worker that runs queued jobs"""
+
+    async def test_season_is_split_into_episodes(self, monkeypatch, tmp_path):
+        """Episodes still to download become jobs any worker can claim"""
+        import thuis
+        from thuis_jobs import JobQueue
+
+        monkeypatch.setattr(thuis, "MEDIA_DIR", tmp_path)
+        (tmp_path / "Thuis").mkdir()
+        (tmp_path / "Thuis" / "thuis-s31a6016.mp4").touch()
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        worker = thuis.QueueWorker(queue, "a@b.be", "geheim", owner="host-a:1")
+        worker.client = FakeClient([episode(n) for n in (6015, 6016, 6017, 6018)])
+        queue.enqueue(SEASON_URL, start_episode=6016)
+
+        state = await worker.run_job(queue.claim(owner="host-a:1"))
+
+        assert state == "done"
+        queued = [job for job in queue.list() if job["state"] == "queued"]
+        assert sorted(job["output"] for job in queued) == [
+            "Thuis/thuis-s31a6017.mp4",
+            "Thuis/thuis-s31a6018.mp4",
+        ]
+
+    async def test_episode_on_disk_is_skipped(self, monkeypatch, tmp_path):
+        """An episode job whose output exists finishes without a download"""
+        import thuis
+        from thuis_jobs import JobQueue
+
+        monkeypatch.setattr(thuis, "MEDIA_DIR", tmp_path)
+        (tmp_path / "Thuis").mkdir()
+        (tmp_path / "Thuis" / "thuis-s31a6017.mp4").touch()
+        queue = JobQueue(tmp_path / "jobs.db")
+        worker = thuis.QueueWorker(queue, "a@b.be", "geheim", owner="host-a:1")
+        worker.client = client = FakeClient()
+        queue.enqueue(EPISODE_URL, output="Thuis/thuis-s31a6017.mp4")
+
+        state = await worker.run_job(queue.claim(owner="host-a:1"))
+
+        assert state == "done"
+        assert client.downloads == []
+
+    async def test_download_options_reach_the_client(self, monkeypatch, tmp_path):
+        """Browser and download options of the worker apply to its jobs"""
+        import thuis
+        from thuis_browser import BrowserWatchdog, RequestBlocker
+        from thuis_jobs import JobQueue
+
+        created = {}
+
+        class RecordingClient(FakeClient):
+            def __init__(self, *args, **kwargs):
+                super().__init__()
+                created.update(kwargs)
+
+            async def start(self):
+                pass
+
+            async def download(self, url, output_path=None, **kwargs):
+                self.downloads.append(kwargs)
+                return output_path
+
+        monkeypatch.setattr(thuis, "MEDIA_DIR", tmp_path)
+        monkeypatch.setattr(thuis, "ThuisClient", RecordingClient)
+        queue = JobQueue(tmp_path / "jobs.db")
+        watchdog, blocker = BrowserWatchdog(), RequestBlocker({"image"})
+        worker = thuis.QueueWorker(
+            queue,
+            "a@b.be",
+            "geheim",
+            watchdog=watchdog,
+            blocker=blocker,
+            output_format="fmp4",
+            audio_only=True,
+            owner="host-a:1",
+        )
+        queue.enqueue(EPISODE_URL, output="Thuis/thuis-s31a6017.m4a")
+
+        state = await worker.run_job(queue.claim(owner="host-a:1"))
+
+        assert state == "done"
+        assert created["watchdog"] is watchdog
+        assert created["blocker"] is blocker
+        assert worker.client.downloads[0]["output_format"] == "fmp4"
+        assert worker.client.downloads[0]["audio_only"] is True
+
+    async def test_lost_lease_stops_the_download(self, monkeypatch, tmp_path):
+        """A worker whose episode job was taken over stops its transfer"""
+        import thuis
+        from thuis_jobs import JobQueue
+
+        monkeypatch.setattr(thuis, "MEDIA_DIR", tmp_path)
+        queue = JobQueue(tmp_path / "jobs.db")
+        worker = thuis.QueueWorker(
+            queue, "a@b.be", "geheim", heartbeat_interval=0.05, owner="host-a:1"
+        )
+        worker.client = client = FakeClient()
+        queue.enqueue(EPISODE_URL, output="Thuis/thuis-s31a6017.mp4")
+        job = queue.claim(owner="host-a:1", lease=0)
+        # Another host takes over the job after the lease expired
+        queue.claim(owner="host-b:1")
+
+        state = await worker.run_job(job)
+
+        assert client.downloads == [
+            (EPISODE_URL, tmp_path / "Thuis" / "thuis-s31a6017.mp4")
+        ]
+        assert client.cancelled.is_set()
+        assert state is None
+        assert queue.get(job["id"])["owner"] == "host-b:1"
+
+    async def test_progress_is_stored(self, monkeypatch, tmp_path):
+        """Bytes of a finished episode end up with its job"""
+        import thuis
+        from thuis_jobs import JobQueue
+
+        monkeypatch.setattr(thuis, "MEDIA_DIR", tmp_path)
+        queue = JobQueue(tmp_path / "jobs.db")
+        worker = thuis.QueueWorker(queue, "a@b.be", "geheim", owner="host-a:1")
+        worker.client = client = FakeClient()
+
+        async def download(url, output_path=None, **kwargs):
+            client.on_progress({"url": url, "stage": "transfer", "bytes": 1000})
+            client.on_progress({"url": url, "stage": "done", "size": 4000})
+            return str(output_path)
+
+        client.download = download
+        queue.enqueue(EPISODE_URL, output="Thuis/thuis-s31a6017.mp4")
+        job = queue.claim(owner="host-a:1")
+
+        assert await worker.run_job(job) == "done"
+        assert queue.get(job["id"])["bytes_done"] == 4000
+        assert queue.get(job["id"])["episodes_done"] == 1
+
+    def test_wake_from_another_thread(self, monkeypatch, tmp_path):
+        """A job queued while the worker waits runs without the poll delay"""
+        import asyncio
+        import contextlib
+        import thuis
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        loop = asyncio.new_event_loop()
+        worker = thuis.QueueWorker(
+            queue, "a@b.be", "geheim", poll_interval=60, owner="host-a:1", loop=loop
+        )
+        # Woken before run() started: the first look at the queue covers it
+        worker.wake()
+        idle = threading.Semaphore(0)
+        claim = queue.claim
+
+        def claim_and_signal(*args):
+            job = claim(*args)
+            if job is None:
+                idle.release()
+            return job
+
+        async def run_job(job):
+            queue.finish(job["id"], True, owner=worker.owner)
+
+        monkeypatch.setattr(queue, "claim", claim_and_signal)
+        monkeypatch.setattr(worker, "run_job", run_job)
+        stopping = threading.Event()
+
+        async def main():
+            running = asyncio.create_task(worker.run())
+            await asyncio.to_thread(stopping.wait)
+            running.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await running
+
+        thread = threading.Thread(target=loop.run_until_complete, args=(main(),))
+        thread.start()
+        try:
+            # The early wake-up made the worker look twice
+            assert idle.acquire(timeout=5)
+            assert idle.acquire(timeout=5)
+            job = queue.enqueue(EPISODE_URL)
+            worker.wake()
+
+            deadline = time.monotonic() + 5
+            while queue.get(job["id"])["state"] != "done":
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+        finally:
+            stopping.set()
+            thread.join(timeout=5)
+            loop.close()
+
+    async def test_locked_queue_stops_the_download(self, monkeypatch, tmp_path):
+        """A lease that cannot be renewed stops the transfer before it expires"""
+        import sqlite3
+        import thuis
+        from thuis_jobs import JobQueue
+
+        monkeypatch.setattr(thuis, "MEDIA_DIR", tmp_path)
+        queue = JobQueue(tmp_path / "jobs.db")
+        worker = thuis.QueueWorker(
+            queue,
+            "a@b.be",
+            "geheim",
+            heartbeat_interval=0.05,
+            lease=0.3,
+            owner="host-a:1",
+        )
+        worker.client = client = FakeClient()
+        queue.enqueue(EPISODE_URL, output="Thuis/thuis-s31a6017.mp4")
+        job = queue.claim(owner="host-a:1", lease=0.3)
+
+        def locked(*args):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(queue, "heartbeat", locked)
+
+        await asyncio.wait_for(worker.run_job(job), 5)
+
+        assert client.cancelled.is_set()
+        assert queue.get(job["id"])["error"] == "lease verloren"
+
+    async def test_locked_queue_is_retried(self, monkeypatch, tmp_path):
+        """Queue calls wait for a lock held by another host"""
+        import sqlite3
+        import thuis
+        from thuis_jobs import JobQueue
+
+        monkeypatch.setattr(thuis, "QUEUE_RETRY_DELAY", 0.01)
+        worker = thuis.QueueWorker(JobQueue(tmp_path / "jobs.db"), "a@b.be", "geheim")
+        calls = []
+
+        def claim(owner):
+            calls.append(owner)
+            if len(calls) < 3:
+                raise sqlite3.OperationalError("database is locked")
+            return None
+
+        assert await worker._queue_call(claim, "host-a:1") is None
+        assert len(calls) == 3
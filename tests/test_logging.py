@@ -0,0 +1,126 @@
+"""Test the queue-based logging pipeline"""
+
+import json
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest.fixture
+def configured(tmp_path):
+    """Configure logging into tmp_path and restore afterwards"""
+    import thuis_logging
+
+    root = logging.getLogger()
+    level = root.level
+
+    def configure(**kwargs):
+        log_file = tmp_path / "test.log"
+        thuis_logging.configure_logging(log_file, **kwargs)
+        return log_file
+
+    yield configure
+
+    thuis_logging.stop_logging()
+    root.setLevel(level)
+
+
+class TestLoggingPipeline:
+    """Test queue handler, listener and formatters"""
+
+    def test_records_go_through_queue(self, configured):
+        """Records should reach the log file via the listener"""
+        import thuis_logging
+
+        log_file = configured(console=False)
+        logging.getLogger("test").info("hallo")
+        thuis_logging.stop_logging()
+
+        assert "INFO - hallo" in log_file.read_text()
+
+    def test_root_has_queue_handler(self, configured):
+        """Loggers should not write to files in the calling thread"""
+        from logging.handlers import QueueHandler
+
+        log_file = configured(console=False)
+
+        handlers = logging.getLogger().handlers
+        assert any(isinstance(h, QueueHandler) for h in handlers)
+        assert str(log_file) not in [getattr(h, "baseFilename", None) for h in handlers]
+
+    def test_json_lines_with_ids(self, configured):
+        """JSON lines should carry the job and episode ID"""
+        import thuis_logging
+
+        log_file = configured(console=False, json_lines=True, job_id="run-1")
+        with thuis_logging.log_context(episode_id="thuis-s31a6017"):
+            logging.getLogger("test").info("aflevering")
+        logging.getLogger("test").info("klaar")
+        thuis_logging.stop_logging()
+
+        first, second = [json.loads(line) for line in log_file.read_text().splitlines()]
+        assert first["message"] == "aflevering"
+        assert first["job_id"] == "run-1"
+        assert first["episode_id"] == "thuis-s31a6017"
+        assert "episode_id" not in second
+
+    def test_size_rotation(self, configured, tmp_path):
+        """The log file should be rotated at max_bytes"""
+        import thuis_logging
+
+        configured(console=False, max_bytes=200, backup_count=2)
+        for i in range(20):
+            logging.getLogger("test").info("regel %d", i)
+        thuis_logging.stop_logging()
+
+        assert (tmp_path / "test.log.1").exists()
+        assert not (tmp_path / "test.log.3").exists()
+
+    def test_console_output(self, configured, capsys):
+        """Messages should reach stdout, except file-only records"""
+        import thuis_logging
+
+        configured()
+        logging.getLogger("test").info("zichtbaar")
+        logging.getLogger("test").info("verborgen", extra={"console": False})
+        thuis_logging.stop_logging()
+
+        out = capsys.readouterr().out
+        assert "zichtbaar" in out
+        assert "verborgen" not in out
+
+    def test_flush_before_prompt(self, configured, capsys):
+        """flush_logging() writes queued messages and keeps logging"""
+        import thuis_logging
+
+        configured()
+        logging.getLogger("test").info("eerst")
+        thuis_logging.flush_logging()
+        assert "eerst" in capsys.readouterr().out
+
+        logging.getLogger("test").info("daarna")
+        thuis_logging.stop_logging()
+        assert "daarna" in capsys.readouterr().out
+
+    def test_web_app_logs_under_wsgi(self):
+        """Importing the app, as a WSGI server does, sets up its logging"""
+        import subprocess
+
+        code = (
+            "import logging, logging.handlers, app; "
+            "print(any(isinstance(h, logging.handlers.QueueHandler) "
+            "for h in logging.getLogger().handlers))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).parent.parent,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+
+        assert result.stdout.strip() == "True", result.stderr
@@ -1,8 +1,13 @@
 """Test login functionality"""
 
+import asyncio
 import sys
+import threading
+import time
 import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -78,3 +83,296 @@ class TestCredentials:
 def detect_login_success(url: str) -> bool:
     """Detect if login was successful based on URL"""
     return "login" not in url.lower()
+
+
+class FakeLoginPage:
+    """Login page that shows a password field, or redirects, after a delay"""
+
+    def __init__(self, password_field: bool, delay: float = 0.05):
+        self.password_field = password_field
+        self.delay = delay
+        self.url = "https://login.vrt.be/authorize"
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        if not self.password_field:
+            await asyncio.sleep(timeout / 1000)
+            raise TimeoutError("Timeout")
+        await asyncio.sleep(self.delay)
+        return "password-field"
+
+    async def wait_for_url(self, predicate, timeout=None):
+        if self.password_field:
+            await asyncio.sleep(timeout / 1000)
+            raise TimeoutError("Timeout")
+        await asyncio.sleep(self.delay)
+        self.url = "https://www.vrt.be/vrtmax/"
+
+
+class TestLoginWaits:
+    """Test that login steps wait for conditions, not fixed sleeps"""
+
+    async def test_password_field(self):
+        """The password field is returned as soon as it appears"""
+        from thuis import wait_for_password_field
+
+        start = time.monotonic()
+        field = await wait_for_password_field(FakeLoginPage(True), timeout=5000)
+
+        assert field == "password-field"
+        assert time.monotonic() - start < 1
+
+    async def test_already_logged_in(self):
+        """Leaving the login page ends the wait without a password field"""
+        from thuis import wait_for_password_field
+
+        start = time.monotonic()
+        field = await wait_for_password_field(FakeLoginPage(False), timeout=5000)
+
+        assert field is None
+        assert time.monotonic() - start < 1
+
+
+EMAIL_FORM = """<form method="post" action="/login/identifier">
+<input type="hidden" name="state" value="abc">
+<input type="email" name="email"><button type="submit">Volgende</button>
+</form>"""
+
+PASSWORD_FORM = """<form method="post" action="/login/password">
+<input type="hidden" name="state" value="abc">
+<input type="password" name="password"><button type="submit">Inloggen</button>
+</form>"""
+
+CAPTCHA_PAGE = """<form method="post" action="/login/identifier">
+<div class="g-recaptcha" data-sitekey="x"></div>
+<input type="email" name="email"></form>"""
+
+
+class StandInIdP(BaseHTTPRequestHandler):
+    """Local stand-in for login.vrt.be and the VRT MAX callback"""
+
+    password = "geheim"
+    captcha = False
+    posts = []
+
+    def send_page(self, body: str, status: int = 200, headers=()):
+        data = body.encode()
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def callback(self, extra=()):
+        location = "/vrtmax/sso/callback?code=c0de"
+        self.send_page("", 302, [("Location", location), *extra])
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/authorize":
+            if "idp_session=ok" in self.headers.get("Cookie", ""):
+                self.callback()
+            else:
+                self.send_page(EMAIL_FORM)
+        elif url.path == "/vrtmax/sso/callback":
+            cookie = "vrtnu-site_profile_at=token; Path=/; Max-Age=3600; HttpOnly"
+            self.send_page("", 302, [("Location", "/vrtmax/"), ("Set-Cookie", cookie)])
+        else:
+            self.send_page("VRT MAX")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        type(self).posts.append(self.path)
+        assert form["state"] == ["abc"]
+        if self.path == "/login/identifier":
+            self.send_page(CAPTCHA_PAGE if type(self).captcha else PASSWORD_FORM)
+        elif form["password"] == [type(self).password]:
+            self.callback([("Set-Cookie", "idp_session=ok; Path=/; Max-Age=86400")])
+        else:
+            self.send_page(PASSWORD_FORM)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def idp():
+    StandInIdP.captcha = False
+    StandInIdP.posts = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInIdP)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    yield {"base": base, "redirect_uri": f"{base}/vrtmax/sso/callback"}
+    server.shutdown()
+    server.server_close()
+
+
+class TestHTTPLogin:
+    """Test the browserless login against a stand-in identity server"""
+
+    def test_logs_in_and_returns_cookies(self, idp, tmp_path):
+        """Email and password forms are posted; storing is up to the caller"""
+        from thuis_login import http_login
+
+        cookies = http_login("a@b.be", "geheim", tmp_path / "cookies.json", **idp)
+
+        names = {c["name"] for c in cookies}
+        assert {"vrtnu-site_profile_at", "idp_session"} <= names
+        assert StandInIdP.posts == ["/login/identifier", "/login/password"]
+        assert all(c["expires"] > time.time() for c in cookies)
+        assert not (tmp_path / "cookies.json").exists()
+
+    def test_last_allowed_post_reaches_callback(self, idp, tmp_path, monkeypatch):
+        """A flow that ends on the last allowed post is a login"""
+        import thuis_login
+
+        monkeypatch.setattr(thuis_login, "MAX_STEPS", 2)
+
+        cookies = thuis_login.http_login(
+            "a@b.be", "geheim", tmp_path / "cookies.json", **idp
+        )
+
+        assert thuis_login.has_session(cookies)
+
+    def test_httponly_in_any_case(self):
+        """Servers spell the HttpOnly attribute in different cases"""
+        from requests.cookies import RequestsCookieJar, create_cookie
+        from thuis_login import jar_to_cookies
+
+        jar = RequestsCookieJar()
+        jar.set_cookie(create_cookie("a", "1", rest={"HttpOnly": None}))
+        jar.set_cookie(create_cookie("b", "2", rest={"httponly": None}))
+        jar.set_cookie(create_cookie("c", "3", rest={}))
+
+        flags = {c["name"]: c["httpOnly"] for c in jar_to_cookies(jar)}
+
+        assert flags == {"a": True, "b": True, "c": False}
+
+    def test_identity_session_is_reused(self, idp, tmp_path):
+        """A stored identity server session skips the forms"""
+        from thuis_cookies import CookieStore
+        from thuis_login import http_login
+
+        first = http_login("a@b.be", "geheim", tmp_path / "cookies.json", **idp)
+        CookieStore(tmp_path / "cookies.json").update(first)
+        StandInIdP.posts = []
+
+        cookies = http_login("a@b.be", "geheim", tmp_path / "cookies.json", **idp)
+
+        assert StandInIdP.posts == []
+        assert "vrtnu-site_profile_at" in {c["name"] for c in cookies}
+
+    def test_captcha_needs_the_browser(self, idp, tmp_path):
+        """A captcha raises InteractiveChallenge before the password is sent"""
+        from thuis_login import InteractiveChallenge, http_login
+
+        StandInIdP.captcha = True
+
+        with pytest.raises(InteractiveChallenge):
+            http_login("a@b.be", "geheim", tmp_path / "cookies.json", **idp)
+        assert StandInIdP.posts == ["/login/identifier"]
+        assert not (tmp_path / "cookies.json").exists()
+
+    def test_wrong_password(self, idp, tmp_path):
+        """The password form coming back means the login was refused"""
+        from thuis_login import LoginRejected, http_login
+
+        with pytest.raises(LoginRejected):
+            http_login("a@b.be", "fout", tmp_path / "cookies.json", **idp)
+
+    def test_hidden_code_is_not_a_challenge(self):
+        """The authorization code of a form_post page is no one-time code"""
+        from thuis_login import parse_forms
+
+        page = parse_forms(
+            '<form method="post" action="/callback">'
+            '<input type="hidden" name="code" value="abc">'
+            '<input type="hidden" name="state" value="xyz"></form>'
+        )
+        prompt = parse_forms('<form method="post"><input name="code"></form>')
+
+        assert page.challenge is None
+        assert page.forms[0]["fields"][0]["value"] == "abc"
+        assert prompt.challenge == "eenmalige code"
+
+
+class FakeVRTPage:
+    """Records visits; lands on the login page unless the session is good"""
+
+    def __init__(self, session_works: bool):
+        self.session_works = session_works
+        self.visited = []
+        self.url = "about:blank"
+
+    async def goto(self, url, wait_until=None):
+        self.visited.append(url)
+        if self.session_works:
+            self.url = url
+        else:
+            self.url = "https://login.vrt.be/authorize?client_id=vrtnu-site"
+
+
+class FakeCookieContext:
+    def __init__(self):
+        self.added = []
+
+    async def add_cookies(self, cookies):
+        self.added.extend(cookies)
+
+    async def cookies(self):
+        return list(self.added)
+
+
+class TestLoginFallback:
+    """Test how login() uses the HTTP login"""
+
+    def patch_http_login(self, monkeypatch, result):
+        import thuis
+
+        async def try_http_login(username, password):
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        saved = []
+        monkeypatch.setattr(thuis, "load_cookies", lambda: None)
+        monkeypatch.setattr(thuis, "save_cookies", saved.append)
+        monkeypatch.setattr(thuis, "try_http_login", try_http_login)
+        monkeypatch.setattr(
+            thuis.metrics, "LOGIN_DURATION", thuis.metrics.Histogram("login", "", [1])
+        )
+        return saved
+
+    async def test_http_session_is_checked(self, monkeypatch):
+        """HTTP login cookies are only trusted after VRT MAX accepts them"""
+        import thuis
+        from thuis_metrics import StageTimer
+
+        session = [{"name": "vrtnu-site_profile_at", "value": "x"}]
+        saved = self.patch_http_login(monkeypatch, session)
+        page, context, timings = FakeVRTPage(True), FakeCookieContext(), StageTimer()
+
+        assert await thuis.login(page, context, "a@b.be", "geheim", timings)
+        assert context.added == session
+        assert saved == [session]
+        assert page.visited == ["https://www.vrt.be/vrtmax/"]
+        assert "http_login" in timings.durations
+
+    async def test_rejected_password_is_not_retried(self, monkeypatch):
+        """Refused credentials do not go to the browser login form"""
+        import thuis
+        from thuis_login import LoginRejected
+        from thuis_metrics import StageTimer
+
+        self.patch_http_login(monkeypatch, LoginRejected("geweigerd"))
+        page = FakeVRTPage(False)
+
+        assert not await thuis.login(
+            page, FakeCookieContext(), "a@b.be", "fout", StageTimer()
+        )
+        assert page.visited == []
@@ -0,0 +1,210 @@
+"""Test Prometheus metrics registry and /metrics endpoint"""
+
+import sys
+import pytest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class TestRegistry:
+    """Test metric types and text exposition"""
+
+    def test_counter_render(self):
+        """Counter should render HELP, TYPE and value"""
+        from thuis_metrics import Registry
+
+        registry = Registry()
+        counter = registry.counter("test_total", "A test counter")
+        counter.inc()
+        counter.inc(2)
+
+        text = registry.render()
+
+        assert "# HELP test_total A test counter" in text
+        assert "# TYPE test_total counter" in text
+        assert "test_total 3\n" in text
+
+    def test_counter_rejects_negative(self):
+        """Counters can only go up"""
+        from thuis_metrics import Counter
+
+        with pytest.raises(ValueError):
+            Counter("test_total", "A test counter").inc(-1)
+
+    def test_gauge(self):
+        """Gauge should go up and down"""
+        from thuis_metrics import Gauge
+
+        gauge = Gauge("test_depth", "A test gauge")
+        gauge.set(5)
+        gauge.dec()
+        gauge.inc(0.5)
+
+        assert gauge.value == 4.5
+
+    def test_histogram_buckets(self):
+        """Histogram buckets should be cumulative"""
+        from thuis_metrics import Histogram
+
+        histogram = Histogram("test_seconds", "A test histogram", buckets=(1, 5))
+        histogram.observe(0.5)
+        histogram.observe(3)
+        histogram.observe(10)
+
+        text = histogram.render()
+
+        assert 'test_seconds_bucket{le="1"} 1' in text
+        assert 'test_seconds_bucket{le="5"} 2' in text
+        assert 'test_seconds_bucket{le="+Inf"} 3' in text
+        assert "test_seconds_sum 13.5" in text
+        assert "test_seconds_count 3" in text
+
+    def test_duplicate_registration(self):
+        """Registering the same name twice should fail"""
+        from thuis_metrics import Registry
+
+        registry = Registry()
+        registry.counter("test_total", "A test counter")
+
+        with pytest.raises(ValueError):
+            registry.counter("test_total", "Again")
+
+    def test_write_textfile(self, tmp_path):
+        """Should write the textfile without leaving temp files"""
+        from thuis_metrics import Registry
+
+        registry = Registry()
+        registry.counter("test_total", "A test counter").inc()
+
+        path = tmp_path / "thuis.prom"
+        registry.write_textfile(path)
+
+        assert "test_total 1" in path.read_text()
+        assert [p.name for p in tmp_path.iterdir()] == ["thuis.prom"]
+
+
+class TestMetricsEndpoint:
+    """Test /metrics in the web app"""
+
+    def test_metrics_endpoint(self, tmp_path, monkeypatch):
+        """Should serve the app's metrics with the queue depth of jobs.db"""
+        import app
+        from thuis_jobs import JobQueue
+
+        queue = JobQueue(tmp_path / "jobs.db")
+        queue.enqueue("https://www.vrt.be/vrtmax/a-z/thuis/31/thuis-s31a6017/")
+        queue.enqueue("https://www.vrt.be/vrtmax/a-z/thuis/31/thuis-s31a6018/")
+        monkeypatch.setattr(app, "downloads", app.DownloadService(queue, None, None))
+
+        response = app.app.test_client().get("/metrics")
+        text = response.get_data(as_text=True)
+
+        assert response.status_code == 200
+        assert response.mimetype == "text/plain"
+        assert "thuis_queue_depth 2" in text
+        assert "# TYPE thuis_episodes_completed_total counter" in text
+        assert "# TYPE thuis_active_workers gauge" in text
+
+
+class TestStageTimer:
+    """Test per-stage timing report"""
+
+    def test_percentile(self):
+        """Percentiles should interpolate between ranks"""
+        from thuis_metrics import percentile
+
+        values = [1, 2, 3, 4, 5]
+
+        assert percentile(values, 50) == 3
+        assert percentile(values, 90) == pytest.approx(4.6)
+        assert percentile([], 50) == 0.0
+
+    def test_stage_records_duration(self):
+        """Stage context manager should record one duration per use"""
+        from thuis_metrics import StageTimer
+
+        timings = StageTimer()
+        for _ in range(3):
+            with timings.stage("resolve"):
+                pass
+
+        assert len(timings.durations["resolve"]) == 3
+
+    def test_stage_records_on_error(self):
+        """A failing stage should still be recorded"""
+        from thuis_metrics import StageTimer
+
+        timings = StageTimer()
+        with pytest.raises(RuntimeError):
+            with timings.stage("login"):
+                raise RuntimeError("boom")
+
+        assert "login" in timings.durations
+
+    def test_summary(self):
+        """Summary should contain totals and percentiles per stage"""
+        from thuis_metrics import StageTimer
+
+        timings = StageTimer()
+        timings.record("resolve", 1.0)
+        timings.record("resolve", 3.0)
+        timings.record("ffmpeg_transfer", 60.0)
+
+        summary = timings.summary()
+
+        assert list(summary["stages"]) == ["resolve", "ffmpeg_transfer"]
+        assert summary["stages"]["resolve"]["count"] == 2
+        assert summary["stages"]["resolve"]["total"] == 4.0
+        assert summary["stages"]["resolve"]["p50"] == 2.0
+        assert summary["stages"]["ffmpeg_transfer"]["max"] == 60.0
+        assert summary["wall_seconds"] >= 0
+
+    def test_format_table(self):
+        """Table should list every stage"""
+        from thuis_metrics import StageTimer
+
+        timings = StageTimer()
+        timings.record("browser_launch", 1.5)
+
+        table = timings.format_table()
+
+        assert "browser_launch" in table
+        assert "1.50s" in table
+
+    def test_report_timings_json(self, tmp_path):
+        """--timings with a file should write the JSON summary"""
+        import json
+        from thuis import report_timings
+        from thuis_metrics import StageTimer
+
+        timings = StageTimer()
+        timings.record("media_services", 0.2)
+        path = tmp_path / "timings.json"
+
+        report_timings(timings, str(path))
+
+        data = json.loads(path.read_text())
+        assert data["stages"]["media_services"]["count"] == 1
+
+
+class TestDownloadOutputCheck:
+    """Test the post-check after an ffmpeg transfer"""
+
+    def test_complete_download(self, tmp_path):
+        """Returncode 0 with a file should succeed with its size"""
+        from thuis import check_download_output
+
+        path = tmp_path / "video.mp4"
+        path.write_bytes(b"x" * 1024)
+
+        assert check_download_output(path, 0, 1.0) == (True, 1024)
+
+    def test_missing_output(self, tmp_path):
+        """No output file should fail"""
+        from thuis import check_download_output
+
+        success, error = check_download_output(tmp_path / "missing.mp4", 1, 1.0)
+
+        assert success is False
+        assert error
@@ -0,0 +1,198 @@
+"""Test faststart remux post-processing"""
+
+import struct
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def atom(kind: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def write_mp4(path: Path, faststart: bool) -> Path:
+    ftyp = atom(b"ftyp", b"isom\x00\x00\x02\x00")
+    moov = atom(b"moov", b"\x00" * 32)
+    mdat = atom(b"mdat", b"\x11" * 1024)
+    path.write_bytes(ftyp + (moov + mdat if faststart else mdat + moov))
+    return path
+
+
+def fake_ffmpeg(directory: Path, fail: bool = False) -> str:
+    """ffmpeg stand-in that writes a faststart file to the last argument"""
+    script = directory / "ffmpeg"
+    if fail:
+        body = "sys.stderr.write('remux kapot')\nsys.exit(1)\n"
+    else:
+        faststart = atom(b"ftyp", b"isom") + atom(b"moov") + atom(b"mdat")
+        body = f"open(sys.argv[-1], 'wb').write({faststart!r})\n"
+    script.write_text(f"#!{sys.executable}\nimport sys\n{body}")
+    script.chmod(0o755)
+    return str(script)
+
+
+class TestFaststartDetection:
+    """Test the moov/mdat order check"""
+
+    def test_moov_after_mdat(self, tmp_path):
+        """A plain ffmpeg mp4 has moov at the end"""
+        from thuis_postprocess import has_faststart
+
+        assert not has_faststart(write_mp4(tmp_path / "a.mp4", faststart=False))
+
+    def test_moov_before_mdat(self, tmp_path):
+        """A faststart mp4 has moov before mdat"""
+        from thuis_postprocess import has_faststart
+
+        assert has_faststart(write_mp4(tmp_path / "a.mp4", faststart=True))
+
+    def test_truncated_file(self, tmp_path):
+        """A file without moov (interrupted download) is not faststart"""
+        from thuis_postprocess import has_faststart
+
+        path = tmp_path / "a.mp4"
+        path.write_bytes(atom(b"ftyp", b"isom") + atom(b"mdat", b"\x00" * 64)[:40])
+
+        assert not has_faststart(path)
+
+
+class TestRemux:
+    """Test the atomic remux"""
+
+    def test_remux_replaces_file(self, tmp_path):
+        """The remuxed file should replace the original"""
+        from thuis_postprocess import has_faststart, remux_faststart
+
+        path = write_mp4(tmp_path / "a.mp4", faststart=False)
+
+        result = remux_faststart(path, ffmpeg=fake_ffmpeg(tmp_path))
+
+        assert result["success"] is True
+        assert result["skipped"] is False
+        assert has_faststart(path)
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["a.mp4", "ffmpeg"]
+
+    def test_already_faststart_is_skipped(self, tmp_path):
+        """Files that are already faststart should not be remuxed"""
+        from thuis_postprocess import remux_faststart
+
+        path = write_mp4(tmp_path / "a.mp4", faststart=True)
+
+        result = remux_faststart(path, ffmpeg=str(tmp_path / "missing"))
+
+        assert result["skipped"] is True
+
+    def test_failed_remux_keeps_original(self, tmp_path):
+        """A failing ffmpeg should leave the download untouched"""
+        from thuis_postprocess import remux_faststart
+
+        path = write_mp4(tmp_path / "a.mp4", faststart=False)
+        original = path.read_bytes()
+
+        result = remux_faststart(path, ffmpeg=fake_ffmpeg(tmp_path, fail=True))
+
+        assert result["success"] is False
+        assert "remux kapot" in result["error"]
+        assert path.read_bytes() == original
+
+
+class TestPostProcessor:
+    """Test the bounded process pool"""
+
+    async def test_processes_all_files(self, tmp_path):
+        """Every submitted file should be processed and reported"""
+        from thuis_postprocess import PostProcessor, has_faststart
+
+        done = []
+        paths = [write_mp4(tmp_path / f"{i}.mp4", faststart=False) for i in range(4)]
+
+        with PostProcessor(
+            workers=2, max_pending=2, on_done=done.append, ffmpeg=fake_ffmpeg(tmp_path)
+        ) as postprocessor:
+            for path in paths:
+                await postprocessor.submit(path)
+
+        assert len(done) == 4
+        assert all(result["success"] for result in done)
+        assert all(has_faststart(path) for path in paths)
+
+    async def test_reserves_space_for_the_temp_copy(self, tmp_path):
+        """A pending remux holds disk space for its copy until it is done"""
+        from thuis_disk import DiskSpaceScheduler
+        from thuis_postprocess import PostProcessor
+
+        path = write_mp4(tmp_path / "a.mp4", faststart=False)
+        disk = DiskSpaceScheduler(tmp_path, headroom=0)
+
+        with PostProcessor(ffmpeg=fake_ffmpeg(tmp_path)) as postprocessor:
+            await postprocessor.submit(path, disk=disk)
+            assert disk.reserved == path.stat().st_size
+
+        assert disk.reserved == 0
+        assert postprocessor.results[0]["success"] is True
+
+    async def test_no_remux_without_space(self, tmp_path):
+        """Without room for the copy the file is left as it is"""
+        from thuis_disk import DiskSpaceScheduler
+        from thuis_postprocess import PostProcessor
+
+        path = write_mp4(tmp_path / "a.mp4", faststart=False)
+        original = path.read_bytes()
+        disk = DiskSpaceScheduler(tmp_path, headroom=2**62, max_wait=0, log=str)
+
+        with PostProcessor(ffmpeg=fake_ffmpeg(tmp_path)) as postprocessor:
+            await postprocessor.submit(path, disk=disk)
+
+        assert postprocessor.results[0]["error"] == "Onvoldoende schijfruimte"
+        assert path.read_bytes() == original
+        assert disk.reserved == 0
+
+
+class TestFragmentedOutput:
+    """Test play-while-downloading output and the final defragment"""
+
+    def test_partial_path(self):
+        """Partial files should not look like finished episodes"""
+        from thuis_core import filter_episodes_to_download
+        from thuis_postprocess import partial_path
+
+        output = Path("media/Thuis/thuis-s31a6017.mp4")
+
+        assert partial_path(output, None) == output
+        assert partial_path(output, "fmp4").name == "thuis-s31a6017.part.mp4"
+        assert partial_path(output, "ts").name == "thuis-s31a6017.part.ts"
+        assert filter_episodes_to_download(
+            ["thuis-s31a6017.mp4"], ["thuis-s31a6017.part.mp4"]
+        ) == ["thuis-s31a6017.mp4"]
+
+    def test_fragmented_is_not_faststart(self, tmp_path):
+        """An fmp4 file (empty moov + moof/mdat) still needs a remux"""
+        from thuis_postprocess import has_faststart
+
+        path = tmp_path / "a.part.mp4"
+        path.write_bytes(
+            atom(b"ftyp", b"isom")
+            + atom(b"moov")
+            + atom(b"moof")
+            + atom(b"mdat", b"\x00" * 64)
+        )
+
+        assert not has_faststart(path)
+
+    def test_defragment_to_destination(self, tmp_path):
+        """The remux should write the final file and remove the partial one"""
+        from thuis_postprocess import has_faststart, remux_faststart
+
+        source = tmp_path / "a.part.ts"
+        source.write_bytes(b"\x47" * 188)
+        destination = tmp_path / "a.mp4"
+
+        result = remux_faststart(
+            source, ffmpeg=fake_ffmpeg(tmp_path), destination=destination
+        )
+
+        assert result["success"] is True
+        assert result["path"] == str(destination)
+        assert has_faststart(destination)
+        assert not source.exists()
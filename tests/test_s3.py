@@ -0,0 +1,212 @@
+"""Test streaming output to S3-compatible object storage"""
+
+import os
+import sys
+import uuid
+import pytest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+MB = 1024 * 1024
+
+
+class FakeS3Client:
+    """In-memory stand-in for the boto3 S3 client calls Thuis uses"""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = str(len(self.uploads) + 1)
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        data = b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+        self.objects[(Bucket, Key)] = data
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(Key)
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(k for b, k in client.objects if k.startswith(Prefix))
+                for i in range(0, max(len(keys), 1), 2):
+                    yield {"Contents": [{"Key": k} for k in keys[i : i + 2]]}
+
+        return Paginator()
+
+
+def fake_ffmpeg(directory: Path, size: int, returncode: int = 0) -> str:
+    """ffmpeg stand-in writing size bytes to stdout and progress to stderr"""
+    script = directory / "ffmpeg"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "sys.stderr.write('out_time=00:00:01.000000\\nprogress=continue\\n')\n"
+        f"sys.stdout.buffer.write(b'\\x00' * {size})\n"
+        f"sys.exit({returncode})\n"
+    )
+    script.chmod(0o755)
+    return str(script)
+
+
+class TestS3Url:
+    """Test s3:// URL handling"""
+
+    def test_parse(self):
+        """Bucket and prefix should be split"""
+        from thuis_s3 import parse_s3_url
+
+        assert parse_s3_url("s3://archief/vrt/") == ("archief", "vrt/")
+        assert parse_s3_url("s3://archief") == ("archief", "")
+
+    def test_invalid(self):
+        """Non-S3 URLs should be rejected"""
+        from thuis_s3 import parse_s3_url
+
+        with pytest.raises(ValueError):
+            parse_s3_url("media/")
+
+    def test_keys(self):
+        """Directory targets append, object targets are used as-is"""
+        from thuis_s3 import S3Target
+
+        client = FakeS3Client()
+
+        assert S3Target("s3://a/vrt/", client).key_for("Thuis/x.mp4") == (
+            "vrt/Thuis/x.mp4"
+        )
+        assert S3Target("s3://a/vrt/x.mp4", client).key_for("y.mp4") == "vrt/x.mp4"
+
+
+class TestMultipartUpload:
+    """Test the multipart stream"""
+
+    def test_parts(self):
+        """Data should be split in parts of part_size, remainder last"""
+        from thuis_s3 import MIN_PART_SIZE, MultipartUpload
+
+        client = FakeS3Client()
+        upload = MultipartUpload(client, "a", "x.mp4", part_size=MIN_PART_SIZE)
+        for _ in range(12):
+            upload.write(b"\x01" * MB)
+        upload.complete()
+
+        assert len(client.objects[("a", "x.mp4")]) == 12 * MB
+        assert len(upload.parts) == 3
+
+    def test_rejected_stream_is_aborted(self):
+        """A failing writer should not leave an object behind"""
+        import io
+        from thuis_s3 import upload_stream
+
+        client = FakeS3Client()
+
+        def fail():
+            raise RuntimeError("ffmpeg faalde")
+
+        with pytest.raises(RuntimeError):
+            upload_stream(
+                io.BytesIO(b"\x00" * 100), client, "a", "x.mp4", before_complete=fail
+            )
+
+        assert client.objects == {}
+        assert client.aborted == ["x.mp4"]
+
+    def test_existing(self):
+        """Existing episodes should be listed across pages"""
+        from thuis_s3 import S3Target
+
+        client = FakeS3Client()
+        for name in ("a1.mp4", "a2.mp4", "a3.mp4"):
+            client.objects[("b", f"vrt/Thuis/{name}")] = b""
+        client.objects[("b", "vrt/Other/a9.mp4")] = b""
+
+        existing = S3Target("s3://b/vrt/", client).existing("Thuis")
+
+        assert existing == ["a1.mp4", "a2.mp4", "a3.mp4"]
+
+
+class TestDownloadToS3:
+    """Test the ffmpeg to S3 pipeline"""
+
+    def test_stream_upload(self, tmp_path, monkeypatch):
+        """ffmpeg stdout should end up in the object"""
+        import thuis
+        from thuis_s3 import S3Target
+
+        monkeypatch.setattr(
+            thuis,
+            "_ffmpeg_capabilities",
+            {"path": fake_ffmpeg(tmp_path, 7 * MB), "version": "6.1"},
+        )
+        client = FakeS3Client()
+        target = S3Target("s3://b/vrt/", client)
+
+        success, size = thuis.download_to_s3(
+            "http://example/master.m3u8", target, "vrt/x.mp4", "x"
+        )
+
+        assert success is True
+        assert size == 7 * MB
+        assert len(client.objects[("b", "vrt/x.mp4")]) == 7 * MB
+
+    def test_failed_ffmpeg_aborts(self, tmp_path, monkeypatch):
+        """A non-zero exit should abort the upload"""
+        import thuis
+        from thuis_s3 import S3Target
+
+        monkeypatch.setattr(
+            thuis,
+            "_ffmpeg_capabilities",
+            {"path": fake_ffmpeg(tmp_path, MB, returncode=1), "version": "6.1"},
+        )
+        client = FakeS3Client()
+
+        success, error = thuis.download_to_s3(
+            "http://example/master.m3u8", S3Target("s3://b/", client), "x.mp4", "x"
+        )
+
+        assert success is False
+        assert "returncode" in error
+        assert client.objects == {}
+
+
+@pytest.mark.skipif(
+    not os.getenv("S3_ENDPOINT_URL"), reason="S3_ENDPOINT_URL (MinIO) niet gezet"
+)
+class TestMinIO:
+    """Against a local MinIO, e.g.
+
+    docker run -p 9000:9000 minio/minio server /data
+    S3_ENDPOINT_URL=http://localhost:9000 AWS_ACCESS_KEY_ID=minioadmin \\
+        AWS_SECRET_ACCESS_KEY=minioadmin S3_TEST_BUCKET=thuis pytest tests/test_s3.py
+    """
+
+    def test_roundtrip(self):
+        """A streamed upload should be readable and listed"""
+        import io
+        from thuis_s3 import S3Target, upload_stream
+
+        target = S3Target(f"s3://{os.getenv('S3_TEST_BUCKET', 'thuis')}/test/")
+        key = target.key_for(f"Thuis/{uuid.uuid4().hex}.mp4")
+
+        upload_stream(io.BytesIO(b"\x00" * 6 * MB), target.client, target.bucket, key)
+
+        body = target.client.get_object(Bucket=target.bucket, Key=key)["Body"].read()
+        assert len(body) == 6 * MB
+        assert key.rsplit("/", 1)[1] in target.existing("Thuis")
+        target.client.delete_object(Bucket=target.bucket, Key=key)
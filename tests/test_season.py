@@ -1,5 +1,6 @@
 """Test season/episode download functionality"""
 
+import asyncio
 import sys
 import pytest
 import re
@@ -360,6 +361,71 @@ class TestEpisodeDiscovery:
         assert "6003" in result[2]
 
 
+class TestFastEpisodeDiscovery:
+    """Test single-pass discovery from all hrefs of a page"""
+
+    def test_extract_normalizes_urls(self):
+        """Query strings, fragments and missing slashes should not create duplicates"""
+        from thuis import extract_episode_urls
+
+        result = extract_episode_urls(
+            [
+                "/vrtmax/a-z/thuis/31/thuis-s31a6001/",
+                "/vrtmax/a-z/thuis/31/thuis-s31a6001",
+                "https://www.vrt.be/vrtmax/a-z/thuis/31/thuis-s31a6001/?autoplay=1",
+                "//www.vrt.be/vrtmax/a-z/thuis/31/thuis-s31a6001/#player",
+            ]
+        )
+
+        assert result == ["https://www.vrt.be/vrtmax/a-z/thuis/31/thuis-s31a6001/"]
+
+    def test_extract_skips_non_episodes(self):
+        """Navigation links and empty hrefs should be ignored"""
+        from thuis import extract_episode_urls
+
+        result = extract_episode_urls(
+            [None, "", "/vrtmax/a-z/thuis/", "https://example.com/thuis-s31a1/"]
+        )
+
+        assert result == []
+
+    async def test_async_discovery_single_evaluate(self):
+        """Should read all hrefs with one evaluate call"""
+        from thuis import discover_season_episodes_async
+        from benchmarks.bench_discovery import MockAsyncPage
+
+        page = MockAsyncPage(
+            [
+                "/vrtmax/a-z/thuis/31/thuis-s31a6002/",
+                "/vrtmax/a-z/thuis/31/thuis-s31a6001/",
+                "/vrtmax/a-z/thuis/31/thuis-s31a6001/",
+            ]
+        )
+
+        result = await discover_season_episodes_async(page)
+
+        assert page.calls == 1
+        assert len(result) == 2
+        assert "6001" in result[0]
+
+    async def test_large_page_matches_per_anchor_discovery(self):
+        """10k anchors should give the same episodes as the old per-anchor scan"""
+        from thuis import discover_season_episodes_async
+        from benchmarks.bench_discovery import (
+            MockAsyncPage,
+            discover_per_anchor,
+            make_hrefs,
+        )
+
+        hrefs = make_hrefs(10_000)
+
+        fast = await discover_season_episodes_async(MockAsyncPage(hrefs))
+        slow = await discover_per_anchor(MockAsyncPage(hrefs))
+
+        assert fast == slow
+        assert len(fast) == len(set(fast))
+
+
 class TestEdgeCases:
     """Test edge cases and error handling"""
 
@@ -427,20 +493,6 @@ class TestExistingEpisodes:
         assert result == []
 
 
-class TestRandomDelay:
-    """Test random_delay function"""
-
-    def test_random_delay_returns(self):
-        """Should complete without error"""
-        from thuis import random_delay
-
-        start = time.time()
-        random_delay(0.01, 0.02)
-        elapsed = time.time() - start
-
-        assert 0.005 <= elapsed <= 0.05
-
-
 class TestURLEdgeCases:
     """Test URL edge cases"""
 
@@ -580,3 +632,215 @@ class TestOutputPath:
         path = get_output_path(url)
 
         assert path.parent.exists()
+
+
+class FakeResponse:
+    def __init__(self, url, location=""):
+        self.url = url
+        self.headers = {"location": location} if location else {}
+
+
+class FakeResponseInfo:
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+
+    @property
+    def value(self):
+        return self.future
+
+
+class FakeEpisodePage:
+    """Page that emits the given responses while navigating"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.info = None
+        self.predicate = None
+
+    def expect_response(self, predicate, timeout=None):
+        page = self
+
+        class Waiter:
+            async def __aenter__(self):
+                page.info = FakeResponseInfo()
+                page.predicate = predicate
+                return page.info
+
+            async def __aexit__(self, *exc):
+                if not page.info.future.done():
+                    page.info.future.set_exception(TimeoutError("Timeout"))
+
+        return Waiter()
+
+    async def goto(self, url, wait_until=None, timeout=None):
+        for response in self.responses:
+            if self.predicate(response) and not self.info.future.done():
+                self.info.future.set_result(response)
+
+
+class TestStreamRedirect:
+    """Test waiting for the vualto redirect instead of sleeping"""
+
+    async def test_redirect_is_returned(self):
+        """The first vualto redirect becomes the media services URL"""
+        from thuis import MEDIA_SERVICES_URL, resolve_stream_redirect
+
+        page = FakeEpisodePage(
+            [
+                FakeResponse("https://www.vrt.be/vrtmax/a-z/thuis/31/"),
+                FakeResponse("https://x.vualto.com/videos/abc", "/media/abc?x=1"),
+            ]
+        )
+
+        redirect = await resolve_stream_redirect(page, "https://www.vrt.be/x/")
+
+        assert redirect == MEDIA_SERVICES_URL + "/media/abc?x=1"
+
+    async def test_missing_redirect(self):
+        """Without a vualto response the result is None, not an error"""
+        from thuis import resolve_stream_redirect
+
+        page = FakeEpisodePage([FakeResponse("https://x.vualto.com/videos/abc")])
+
+        assert await resolve_stream_redirect(page, "https://www.vrt.be/x/") is None
+
+    def test_redirect_location(self):
+        """Absolute locations are kept as they are"""
+        from thuis import stream_redirect_location
+
+        response = FakeResponse(
+            "https://x.vualto.com/videos/abc", "https://cdn.example/abc"
+        )
+
+        assert stream_redirect_location(response) == "https://cdn.example/abc"
+        assert stream_redirect_location(FakeResponse("https://www.vrt.be/")) is None
+
+
+class FakeButton:
+    def __init__(self, text):
+        self.text = text
+        self.clicked = False
+
+    async def inner_text(self):
+        return self.text
+
+    async def scroll_into_view_if_needed(self):
+        pass
+
+    async def click(self, force=False):
+        self.clicked = True
+
+
+class FakeFrame:
+    def __init__(self, url, buttons=()):
+        self.url = url
+        self.buttons = list(buttons)
+
+    async def wait_for_selector(self, selector, timeout=None):
+        return self.buttons[0] if self.buttons else None
+
+    async def query_selector_all(self, selector):
+        return self.buttons
+
+
+class FakeConsentContext:
+    def __init__(self, cookies=()):
+        self.jar = list(cookies)
+
+    async def cookies(self):
+        return list(self.jar)
+
+    async def add_cookies(self, cookies):
+        self.jar.extend(cookies)
+
+
+class FakeConsentPage:
+    """Page whose consent frame loads after a short delay"""
+
+    def __init__(self, context, frame=None, delay=0.05):
+        self.context = context
+        self.frames = []
+        self.frame = frame
+        self.delay = delay
+        self.waited = False
+
+    async def wait_for_event(self, event, predicate=None, timeout=None):
+        self.waited = True
+        if self.frame is None:
+            await asyncio.sleep(timeout / 1000)
+            raise TimeoutError("Timeout")
+        await asyncio.sleep(self.delay)
+        assert predicate(self.frame)
+        self.frames.append(self.frame)
+        return self.frame
+
+
+class TestCookieConsent:
+    """Test the consent dialog handling"""
+
+    async def test_recorded_consent_skips_dialog(self):
+        """A stored decision means the dialog is not waited for at all"""
+        from thuis import handle_cookie_consent
+        from thuis_cookies import consent_cookie
+
+        page = FakeConsentPage(FakeConsentContext([consent_cookie("weigeren")]))
+
+        assert await handle_cookie_consent(page) is False
+        assert not page.waited
+
+    async def test_refuses_and_records(self, tmp_path, monkeypatch):
+        """The refuse button is clicked and the decision is stored"""
+        from thuis import handle_cookie_consent
+        from thuis_cookies import CookieStore, has_consent
+
+        cookie_file = tmp_path / "cookies.json"
+        monkeypatch.setattr("thuis.COOKIE_FILE", cookie_file)
+        accept = FakeButton("Alles accepteren")
+        refuse = FakeButton("Weigeren")
+        frame = FakeFrame("https://cmp-sp.vrt.be/index.html", [accept, refuse])
+        context = FakeConsentContext()
+        page = FakeConsentPage(context, frame)
+
+        start = time.monotonic()
+        assert await handle_cookie_consent(page) is True
+
+        assert refuse.clicked and not accept.clicked
+        assert time.monotonic() - start < 1
+        assert has_consent(context.jar)
+        assert has_consent(CookieStore(cookie_file).load())
+
+    async def test_marker_expires_with_platform_cookie(self, tmp_path, monkeypatch):
+        """The marker does not outlive the consent platform's own cookie"""
+        from thuis import handle_cookie_consent
+        from thuis_cookies import CONSENT_MARKER
+
+        monkeypatch.setattr("thuis.COOKIE_FILE", tmp_path / "cookies.json")
+        context = FakeConsentContext()
+        expires = time.time() + 30 * 24 * 3600
+
+        class PlatformButton(FakeButton):
+            async def click(self, force=False):
+                self.clicked = True
+                context.jar.append(
+                    {"name": "consentUUID", "value": "x", "expires": expires}
+                )
+
+        frame = FakeFrame(
+            "https://cmp-sp.vrt.be/index.html", [PlatformButton("Weigeren")]
+        )
+
+        assert await handle_cookie_consent(FakeConsentPage(context, frame)) is True
+        marker = next(c for c in context.jar if c["name"] == CONSENT_MARKER)
+        assert marker["expires"] == expires
+
+
+class TestProgressTime:
+    """Test parsing ffmpeg -progress times"""
+
+    def test_parse_progress_time(self):
+        """out_time values become seconds, N/A becomes None"""
+        from thuis import parse_progress_time
+
+        assert parse_progress_time("00:01:23.500000") == 83.5
+        assert parse_progress_time("01:00:00.000000") == 3600.0
+        assert parse_progress_time("N/A") is None
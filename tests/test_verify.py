@@ -0,0 +1,188 @@
+"""Test the --verify library scan"""
+
+import json
+import sys
+from multiprocessing import Process
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def fake_ffprobe(directory: Path) -> str:
+    """ffprobe stand-in: the file content is its duration, calls are logged"""
+    directory.mkdir(exist_ok=True)
+    script = directory / "ffprobe"
+    calls = directory / "calls.log"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        f"open({str(calls)!r}, 'a').write(sys.argv[-1] + '\\n')\n"
+        "try:\n"
+        "    print(float(open(sys.argv[-1]).read()))\n"
+        "except ValueError:\n"
+        "    sys.stderr.write('Invalid data found when processing input')\n"
+        "    sys.exit(1)\n"
+    )
+    script.chmod(0o755)
+    return str(script)
+
+
+def probe_calls(directory: Path) -> list:
+    calls = directory / "calls.log"
+    return calls.read_text().splitlines() if calls.exists() else []
+
+
+def record_durations(directory: str, worker: int, count: int):
+    """Runs in a child process: record expected durations one at a time"""
+    from thuis_verify import record_expected_duration
+
+    for i in range(count):
+        record_expected_duration(Path(directory) / f"w{worker}-{i}.mp4", 1500.0)
+
+
+def statuses(results) -> dict:
+    return {Path(r["path"]).name: r["status"] for r in results}
+
+
+class TestCheckFile:
+    """Test the checks on a single file"""
+
+    def test_statuses(self, tmp_path):
+        """Each kind of problem should get its own status"""
+        from thuis_verify import verify_library
+
+        ffprobe = fake_ffprobe(tmp_path / "bin")
+        media = tmp_path / "media"
+        media.mkdir()
+        (media / "goed.mp4").write_text("1500.0")
+        (media / "leeg.mp4").write_bytes(b"")
+        (media / "kapot.mp4").write_text("geen video")
+        (media / "bezig.part.mp4").write_text("300.0")
+
+        results = verify_library(media, ffprobe=ffprobe, use_cache=False)
+
+        assert statuses(results) == {
+            "bezig.part.mp4": "onvolledig",
+            "goed.mp4": "ok",
+            "kapot.mp4": "corrupt",
+            "leeg.mp4": "leeg",
+        }
+
+    def test_truncated_against_expected_duration(self, tmp_path):
+        """A file much shorter than its playlist should be flagged"""
+        from thuis_verify import record_expected_duration, verify_library
+
+        ffprobe = fake_ffprobe(tmp_path / "bin")
+        media = tmp_path / "media" / "Thuis"
+        media.mkdir(parents=True)
+        (media / "a1.mp4").write_text("1200.0")
+        (media / "a2.mp4").write_text("1498.0")
+        record_expected_duration(media / "a1.mp4", 1500.0)
+        record_expected_duration(media / "a2.mp4", 1500.0)
+
+        results = verify_library(media.parent, ffprobe=ffprobe, use_cache=False)
+
+        assert statuses(results) == {"a1.mp4": "afgekapt", "a2.mp4": "ok"}
+        assert results[0]["expected"] == 1500.0
+
+    def test_concurrent_workers_keep_all_durations(self, tmp_path):
+        """Workers recording into one directory do not drop each other's entries"""
+        from thuis_verify import EXPECTED_FILE
+
+        workers = [
+            Process(target=record_durations, args=(str(tmp_path), w, 20))
+            for w in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+
+        assert all(worker.exitcode == 0 for worker in workers)
+        assert len(json.loads((tmp_path / EXPECTED_FILE).read_text())) == 80
+
+    def test_removed_file(self, tmp_path):
+        """A file deleted during the scan is left out of the results"""
+        from thuis_verify import check_file
+
+        assert check_file(str(tmp_path / "weg.mp4")) is None
+
+    def test_hidden_temp_files_are_skipped(self, tmp_path):
+        """A remux's temp copy is not reported, a partial download is"""
+        from thuis_verify import find_media_files
+
+        (tmp_path / "Thuis").mkdir()
+        (tmp_path / "Thuis" / "a1.mp4").write_text("1500.0")
+        (tmp_path / "Thuis" / ".a1.faststart.mp4").write_text("10.0")
+        (tmp_path / "Thuis" / "a2.part.mp4").write_text("10.0")
+
+        names = [path.name for path in find_media_files(tmp_path)]
+
+        assert names == ["a1.mp4", "a2.part.mp4"]
+
+
+class TestCache:
+    """Test that reruns only probe changed files"""
+
+    def test_unchanged_files_are_not_probed_again(self, tmp_path):
+        """The second run should reuse cached results"""
+        from thuis_verify import CACHE_FILE, verify_library
+
+        bin_dir = tmp_path / "bin"
+        ffprobe = fake_ffprobe(bin_dir)
+        media = tmp_path / "media"
+        media.mkdir()
+        (media / "a1.mp4").write_text("1500.0")
+        (media / "a2.mp4").write_text("1500.0")
+
+        first = verify_library(media, ffprobe=ffprobe, workers=2)
+        second = verify_library(media, ffprobe=ffprobe, workers=2)
+
+        assert len(probe_calls(bin_dir)) == 2
+        assert first == second
+        assert (media / CACHE_FILE).exists()
+
+    def test_changed_and_removed_files(self, tmp_path):
+        """A changed file is probed again, a removed one leaves the cache"""
+        from thuis_verify import CACHE_FILE, verify_library
+
+        bin_dir = tmp_path / "bin"
+        ffprobe = fake_ffprobe(bin_dir)
+        media = tmp_path / "media"
+        media.mkdir()
+        (media / "a1.mp4").write_text("1500.0")
+        (media / "a2.mp4").write_text("1500.0")
+        verify_library(media, ffprobe=ffprobe)
+
+        (media / "a1.mp4").write_text("geen video")
+        (media / "a2.mp4").unlink()
+        results = verify_library(media, ffprobe=ffprobe)
+
+        assert statuses(results) == {"a1.mp4": "corrupt"}
+        assert len(probe_calls(bin_dir)) == 3
+        cache = json.loads((media / CACHE_FILE).read_text())
+        assert list(cache) == ["a1.mp4"]
+
+
+class TestReport:
+    """Test the summary printed by --verify"""
+
+    def test_report_lists_problems(self):
+        """Only problems are listed, followed by the counts"""
+        from thuis_verify import format_report
+
+        report = format_report(
+            [
+                {"path": "media/a1.mp4", "status": "ok"},
+                {
+                    "path": "media/a2.mp4",
+                    "status": "afgekapt",
+                    "duration": 1200.0,
+                    "expected": 1500.0,
+                },
+            ]
+        )
+
+        assert "a1.mp4" not in report
+        assert "afgekapt" in report and "1200s van 1500s" in report
+        assert report.endswith("Gecontroleerd: 2 bestanden (1 afgekapt, 1 ok)")
@@ -15,161 +15,250 @@ import argparse
 import json
 import os
 import random
-import re
 import sys
 import time
+import sqlite3
 import subprocess
+import threading
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict, Tuple
 from dotenv import load_dotenv
-import requests
-from playwright.async_api import async_playwright
-from playwright_stealth import stealth as playwright_stealth
 import logging
 
+import thuis_metrics as metrics
+import thuis_ffmpeg
+import thuis_hls
+import thuis_disk
+import thuis_verify
+import thuis_browser
+import thuis_login
+from thuis_metrics import StageTimer
+from thuis_jobs import HEARTBEAT_INTERVAL, LEASE_DURATION, JobQueue, worker_id
+from thuis_logging import configure_logging, flush_logging, log_context, set_episode_id
+from thuis_browser import BrowserWatchdog, PagePool, RequestBlocker, open_session
+from thuis_cookies import (
+    consent_cookie,
+    consent_expiry,
+    get_store as get_cookie_store,
+    has_consent,
+)
+from thuis_s3 import S3Target, is_s3_url, upload_stream
+from thuis_postprocess import FRAGMENTED_FORMATS, PostProcessor, partial_path
+from thuis_core import (
+    ALL_HREFS_SCRIPT,
+    EPISODE_EXTENSIONS,
+    MEDIA_SERVICES_URL,
+    USER_AGENT,
+    build_cookie_header,
+    detect_login_success,
+    detect_url_type,
+    extract_episode_urls,
+    filter_episodes_to_download,
+    generate_filename,
+    get_hls_url,
+    parse_episode_info,
+    parse_progress_time,
+)
+
+# Re-exported for the benchmarks and tests that use them through thuis
+from thuis_core import BASE_URL, discover_season_episodes  # noqa: F401
+
+# Playwright, playwright_stealth and requests are imported where they are
+# used, so --help, --setup and imports from the web app stay fast.
+
 CONFIG_FILE = Path(__file__).parent / ".env"
 COOKIE_FILE = Path(__file__).parent / "cookies.json"
 LOG_FILE = Path(__file__).parent / "thuis.log"
-USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 MEDIA_DIR = Path("media")
-BASE_URL = "https://www.vrt.be"
+JOBS_FILE = Path(__file__).parent / "jobs.db"
+
+# Milliseconds to wait for login form steps and for an episode's stream redirect
+LOGIN_TIMEOUT = 15000
+RESOLVE_TIMEOUT = 30000
+
+# Cookie consent dialog (Sourcepoint), loaded in a frame from this host
+CONSENT_FRAME_HOST = "cmp-sp.vrt.be"
+CONSENT_TIMEOUT = 8000
+
+# Stream URLs carry a token; a resolved episode is reused this long (s)
+STREAM_CACHE_TTL = 600
+# New episodes appear on a season page; a listing is reused this long (s)
+SEASON_CACHE_TTL = 600
+
+# A locked shared queue is retried after 1, 2, 4... s, at most this far apart
+QUEUE_RETRY_DELAY = 1.0
+QUEUE_RETRY_MAX_DELAY = 15.0
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler(LOG_FILE)],
-)
 logger = logging.getLogger(__name__)
 
 
+def setup_logging(json_lines: bool = False):
+    """Log to thuis.log and the console; called by main() instead of at import time."""
+    configure_logging(LOG_FILE, json_lines=json_lines)
+
+
 def log(msg: str, flush: bool = True):
-    """Log message to file and console"""
-    logger.info(msg)
-    if flush:
-        print(msg, flush=True)
+    """Log message to file and console (file only with flush=False)"""
+    logger.info(msg, extra={"console": flush})
 
 
-def random_delay(min_sec: float = 1.0, max_sec: float = 3.0):
-    """Sleep for a random duration to mimic human behavior."""
-    delay = random.uniform(min_sec, max_sec)
-    time.sleep(delay)
+def ask(prompt: str) -> str:
+    """input() after the messages logged so far have been written"""
+    flush_logging()
+    return input(prompt)
 
 
-def detect_login_success(url: str) -> bool:
-    """Detect if login was successful based on URL"""
-    return "login" not in url.lower()
+_http_session = None
 
 
-def save_cookies(cookies: List, path: Path = COOKIE_FILE):
-    """Save cookies to a JSON file."""
-    with open(path, "w") as f:
-        json.dump(cookies, f)
+def get_http_session():
+    """Return the shared HTTP session, creating it on first use."""
+    global _http_session
+    if _http_session is None:
+        from thuis_http import create_http_session
 
+        _http_session = create_http_session()
+    return _http_session
 
-def load_cookies(path: Path = COOKIE_FILE) -> Optional[List]:
-    """Load cookies from a JSON file if it exists."""
-    if path.exists():
-        with open(path, "r") as f:
-            return json.load(f)
-    return None
+
+def build_request_headers(cookie_header: str) -> Dict[str, str]:
+    """Headers for requests against VRT media-services."""
+    return {
+        "User-Agent": USER_AGENT,
+        "Cookie": cookie_header,
+        "Referer": "https://www.vrt.be/",
+    }
 
 
-def detect_url_type(url: str) -> str:
-    """Detect if URL is a single episode, season, or trailer.
+def fetch_stream_info(redirect_url: str, cookie_header: str) -> Optional[Dict]:
+    """Fetch stream metadata (title, targetUrls) from media-services.
 
-    Returns: 'single', 'season', or 'trailer'
+    Returns:
+        Parsed JSON response, or None if the API could not be reached
+        or did not answer with 200 after retries
     """
-    url = url.rstrip("/")
+    import requests
+
+    try:
+        resp = get_http_session().get(
+            redirect_url, headers=build_request_headers(cookie_header)
+        )
+    except requests.RequestException as e:
+        log(f"    FOUT: API niet bereikbaar: {e}")
+        return None
 
-    if "/trailer/" in url:
-        return "trailer"
+    if resp.status_code != 200:
+        log(f"    FOUT: API gaf status {resp.status_code}")
+        return None
 
-    url_parts = url.split("/")
+    return resp.json()
 
-    last_part = url_parts[-1]
-    second_last = url_parts[-2] if len(url_parts) >= 2 else ""
 
-    if re.match(r"^[a-z]+-s\d+[a]\d+$", last_part):
-        return "single"
+def fetch_playlist(url: str, cookie_header: str):
+    """GET an HLS playlist over the shared session.
 
-    if last_part.isdigit():
-        return "season"
+    Returns:
+        The response, or None if it could not be fetched
+    """
+    import requests
 
-    return "single"
+    try:
+        resp = get_http_session().get(url, headers=build_request_headers(cookie_header))
+    except requests.RequestException as e:
+        log(f"  ⚠ Playlist niet bereikbaar: {e}")
+        return None
+    return resp if resp.status_code == 200 else None
 
 
-def parse_episode_info(url: str) -> Dict:
-    """Parse episode information from URL.
+def resolve_audio_stream(stream_url: str, cookie_header: str) -> str:
+    """URL of the audio-only rendition of an HLS stream.
 
-    Returns dict with keys: program, season, episode, type
+    Falls back to the master URL when the playlist cannot be fetched or
+    has no separate audio rendition; ffmpeg then maps only the audio track.
     """
-    url = url.rstrip("/")
-
-    if "?" in url:
-        url, query = url.split("?", 1)
-        match = re.search(r"seizoen-(\d+)", query)
-        if match:
-            url_parts = url.rstrip("/").split("/")
-            program = (
-                url_parts[-1]
-                if url_parts[-1]
-                else (url_parts[-2] if len(url_parts) >= 2 else "video")
-            )
-            result = {
-                "program": program,
-                "season": match.group(1),
-                "episode": "",
-                "type": "episode",
-            }
-            return result
+    resp = fetch_playlist(stream_url, cookie_header)
+    if resp is None or not thuis_hls.is_master_playlist(resp.text):
+        return stream_url
 
-    url_parts = url.split("/")
+    rendition = thuis_hls.select_audio_rendition(
+        thuis_hls.parse_master_playlist(resp.text, resp.url)
+    )
+    if not rendition:
+        log("  Geen aparte audiostream, audio uit de volledige stream")
+        return stream_url
 
-    result = {"program": "", "season": "", "episode": "", "type": "episode"}
+    log(f"  Audiostream: {rendition['name'] or rendition['group_id']}")
+    return rendition["uri"]
 
-    if "/trailer/" in url:
-        result["type"] = "trailer"
-        for part in reversed(url_parts):
-            if part and "trailer" not in part and part != "a-z" and part != "vrtmax":
-                result["program"] = part.replace("-trailer", "")
-                break
-        return result
 
-    last_part = url_parts[-1]
-    season_part = url_parts[-2] if len(url_parts) >= 2 else ""
+def probe_stream(stream_url: str, cookie_header: str) -> Optional[Dict]:
+    """Bandwidth and duration of the stream ffmpeg will download.
 
-    match = re.match(r"^([a-z-]+)-s(\d+)a(\d+)$", last_part)
-    if match:
-        result["program"] = match.group(1)
-        result["season"] = match.group(2)
-        result["episode"] = match.group(3)
-    else:
-        if last_part.isdigit():
-            result["program"] = url_parts[-2] if len(url_parts) >= 2 else "video"
-            result["season"] = last_part
-        else:
-            result["program"] = last_part
+    For a master playlist the variant ffmpeg picks is used (average
+    bandwidth when advertised, else peak); an audio rendition playlist has
+    no bandwidth and is estimated at DEFAULT_AUDIO_BANDWIDTH.
 
-    return result
+    Returns:
+        {"bandwidth": bits/s, "duration": seconds}, or None if the
+        playlists could not be read
+    """
+    resp = fetch_playlist(stream_url, cookie_header)
+    if resp is None:
+        return None
+
+    text = resp.text
+    bandwidth = thuis_disk.DEFAULT_AUDIO_BANDWIDTH
+    if thuis_hls.is_master_playlist(text):
+        variant = thuis_hls.select_variant(
+            thuis_hls.parse_master_playlist(text, resp.url)
+        )
+        bandwidth = variant["average_bandwidth"] or variant["bandwidth"]
+        resp = fetch_playlist(variant["uri"], cookie_header)
+        if resp is None:
+            return None
+        text = resp.text
+
+    duration = thuis_hls.playlist_duration(text)
+    if not duration:
+        return None
+    return {"bandwidth": bandwidth, "duration": duration}
 
 
-def generate_filename(info: Dict) -> str:
-    """Generate filename from episode info.
+def estimate_stream_size(stream_url: str, cookie_header: str) -> Optional[int]:
+    """Expected download size from variant bandwidth and playlist duration.
 
-    Format: {program}-s{season}a{episode}.mp4
+    Returns:
+        Size in bytes, or None if the playlists could not be read
     """
-    program = info.get("program", "video")
+    return stream_size(probe_stream(stream_url, cookie_header))
 
-    if info.get("type") == "trailer":
-        return f"{program}-trailer.mp4"
 
-    season = info.get("season", "")
-    episode = info.get("episode", "")
+def stream_size(stream: Optional[Dict]) -> Optional[int]:
+    """Size in bytes of a probe_stream() result, None if unknown."""
+    if not stream or not stream["bandwidth"]:
+        return None
+    return thuis_disk.estimate_size(stream["bandwidth"], stream["duration"])
 
-    if season and episode:
-        return f"{program}-s{season}a{episode}.mp4"
 
-    return f"{program}.mp4"
+def save_cookies(cookies: List, path: Path = COOKIE_FILE):
+    """Save cookies to a JSON file (locked, atomic)."""
+    get_cookie_store(path).save(cookies)
+
+
+def load_cookies(path: Path = COOKIE_FILE) -> Optional[List]:
+    """Load unexpired cookies from a JSON file if it exists."""
+    return get_cookie_store(path).load()
+
+
+async def refresh_cookies(context, path: Optional[Path] = None) -> str:
+    """Store the browser's current cookies and return them as a Cookie header.
+
+    Merged into the shared store, so other workers pick up refreshed
+    session cookies too.
+    """
+    cookies = await context.cookies()
+    get_cookie_store(path or COOKIE_FILE).update(cookies)
+    return build_cookie_header(cookies)
 
 
 def get_output_path(url: str, program_name: str = None) -> Path:
@@ -192,44 +281,11 @@ def get_output_path(url: str, program_name: str = None) -> Path:
     return program_dir / filename
 
 
-def filter_episodes_to_download(
-    all_episodes: List[str], existing_files: List[str] = None, start_episode: int = None
-) -> List[str]:
-    """Filter episodes to download based on existing files and start episode.
-
-    Args:
-        all_episodes: List of episode filenames
-        existing_files: List of already downloaded filenames
-        start_episode: Episode number to start from
-
-    Returns:
-        List of episodes to download
-    """
-    existing = set(existing_files) if existing_files else set()
-
-    episodes_to_download = []
-
-    for episode in all_episodes:
-        if episode in existing:
-            continue
-
-        if start_episode:
-            match = re.search(r"a(\d+)\.mp4$", episode)
-            if match:
-                ep_num = int(match.group(1))
-                if ep_num < start_episode:
-                    continue
-
-        episodes_to_download.append(episode)
+async def discover_season_episodes_async(page) -> List[str]:
+    """Discover all episode URLs from a Playwright page.
 
-    return episodes_to_download
-
-
-BASE_URL = "https://www.vrt.be"
-
-
-def discover_season_episodes(page) -> List[str]:
-    """Discover all episode URLs from a season page.
+    All hrefs are read with a single evaluate call instead of one
+    get_attribute round-trip per anchor.
 
     Args:
         page: Playwright page object on the season URL
@@ -237,20 +293,8 @@ def discover_season_episodes(page) -> List[str]:
     Returns:
         List of episode URLs
     """
-    episode_urls = []
-
-    links = page.query_selector_all("a")
-
-    for link in links:
-        href = link.get_attribute("href")
-        if href and "/vrtmax/a-z/" in href:
-            if re.search(r"[a-z]+-s\d+a\d+", href):
-                if href.startswith("/"):
-                    href = BASE_URL + href
-                if href not in episode_urls:
-                    episode_urls.append(href)
-
-    return sorted(episode_urls)
+    hrefs = await page.evaluate(ALL_HREFS_SCRIPT)
+    return extract_episode_urls(hrefs)
 
 
 def get_existing_episodes(program_dir: Path) -> List[str]:
@@ -265,85 +309,197 @@ def get_existing_episodes(program_dir: Path) -> List[str]:
     if not program_dir.exists():
         return []
 
-    return [f.name for f in program_dir.glob("*.mp4")]
+    return [
+        f.name
+        for extension in EPISODE_EXTENSIONS
+        for f in program_dir.glob(f"*.{extension}")
+    ]
+
+
+async def find_consent_frame(page, timeout: float = CONSENT_TIMEOUT):
+    """The consent dialog's frame, waiting for it to load if needed."""
+    for frame in page.frames:
+        if CONSENT_FRAME_HOST in str(frame.url):
+            return frame
+    try:
+        return await page.wait_for_event(
+            "framenavigated",
+            predicate=lambda frame: CONSENT_FRAME_HOST in str(frame.url),
+            timeout=timeout,
+        )
+    except Exception:
+        return None
 
 
 async def handle_cookie_consent(page) -> bool:
     """Handle cookie consent dialog if present.
 
+    Skipped when the session cookies already record a decision. Otherwise
+    waits for the consent frame to appear instead of polling, refuses (or
+    accepts if refusing is not offered) and stores the decision with the
+    session cookies.
+
     Args:
         page: Playwright page object
 
     Returns:
         True if cookie dialog was handled, False if not found
     """
-    await asyncio.sleep(3)
-
-    for attempt in range(3):
-        try:
-            frames = page.frames
-            cmp_frame = None
-            for frame in frames:
-                if "cmp-sp.vrt.be" in str(frame.url):
-                    cmp_frame = frame
-                    break
-
-            if cmp_frame:
-                btn = None
+    context = page.context
+    if has_consent(await context.cookies()):
+        return False
 
-                reject_buttons = await cmp_frame.query_selector_all("button")
-                for b in reject_buttons:
-                    text = await b.inner_text()
-                    if text and "weigeren" in text.lower():
-                        btn = b
-                        break
-                    elif text and "accepteren" in text.lower():
-                        btn = b
+    frame = await find_consent_frame(page)
+    if frame is None:
+        return False
 
-                if btn:
-                    await btn.scroll_into_view_if_needed()
-                    await asyncio.sleep(0.5)
-                    await btn.click(force=True)
-                    await asyncio.sleep(2)
-                    return True
-        except Exception:
-            pass
+    try:
+        await frame.wait_for_selector("button", timeout=CONSENT_TIMEOUT)
+        btn = None
+        decision = None
+        for b in await frame.query_selector_all("button"):
+            text = (await b.inner_text() or "").lower()
+            if "weigeren" in text:
+                btn, decision = b, "weigeren"
+                break
+            elif "accepteren" in text:
+                btn, decision = b, "accepteren"
+        if not btn:
+            return False
 
-        await asyncio.sleep(2)
+        await btn.scroll_into_view_if_needed()
+        await btn.click(force=True)
+    except Exception:
+        return False
 
-    return False
+    # The marker lapses with the platform's cookies it stands for
+    expires = consent_expiry(await context.cookies())
+    await context.add_cookies([consent_cookie(decision, expires=expires)])
+    await refresh_cookies(context)
+    return True
 
 
 def setup():
     """Interactieve configuratie voor eerste keer"""
-    print("=" * 50, flush=True)
-    print("Thuis - Eerste keer setup", flush=True)
-    print("=" * 50, flush=True)
-    print("\nJe VRT MAX credentials worden opgeslagen in .env", flush=True)
-    print("WAARSCHUWING: Wachtwoord wordt ongecodeerd opgeslagen!\n", flush=True)
+    log("=" * 50)
+    log("Thuis - Eerste keer setup")
+    log("=" * 50)
+    log("\nJe VRT MAX credentials worden opgeslagen in .env")
+    log("WAARSCHUWING: Wachtwoord wordt ongecodeerd opgeslagen!\n")
 
-    username = input("VRT MAX email: ").strip()
-    password = input("VRT MAX wachtwoord: ").strip()
+    username = ask("VRT MAX email: ").strip()
+    password = ask("VRT MAX wachtwoord: ").strip()
 
     if not username or not password:
-        print("ERROR: Email en wachtwoord zijn verplicht", flush=True)
+        log("ERROR: Email en wachtwoord zijn verplicht")
         sys.exit(1)
 
     with open(CONFIG_FILE, "w") as f:
         f.write(f"VRT_USERNAME={username}\n")
         f.write(f"VRT_PASSWORD={password}\n")
 
-    print(f"\nCredentials opgeslagen in {CONFIG_FILE}", flush=True)
-    print("Je kan nu video's downloaden!", flush=True)
+    log(f"\nCredentials opgeslagen in {CONFIG_FILE}")
+    log("Je kan nu video's downloaden!")
+
+
+_ffmpeg_capabilities = None
+
+
+def get_ffmpeg_capabilities() -> Optional[Dict]:
+    """ffmpeg capabilities, probed once per binary and cached on disk"""
+    global _ffmpeg_capabilities
+    if _ffmpeg_capabilities is None:
+        _ffmpeg_capabilities = thuis_ffmpeg.probe_ffmpeg()
+    return _ffmpeg_capabilities
 
 
 def check_ffmpeg():
     """Controleer of ffmpeg geïnstalleerd is"""
-    try:
-        result = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True)
-        return result.returncode == 0
-    except FileNotFoundError:
-        return False
+    return get_ffmpeg_capabilities() is not None
+
+
+def record_transfer(size: int, elapsed: float):
+    """Record bytes and throughput of a finished ffmpeg transfer."""
+    metrics.BYTES_DOWNLOADED.inc(size)
+    if elapsed > 0:
+        metrics.FFMPEG_THROUGHPUT.observe(size / elapsed)
+
+
+def check_download_output(
+    output_path: Path, returncode: int, elapsed: float, disk_full: bool = False
+):
+    """Check the ffmpeg result and the written file after a transfer.
+
+    A partial file left by a full disk is removed and reported as a
+    failure, so the next run downloads the episode again.
+
+    Returns:
+        (True, size in bytes) or (False, error message)
+    """
+    if returncode == 0 and output_path.exists():
+        size = output_path.stat().st_size
+        size_mb = size / 1024 / 1024
+        log(f"✓ Download voltooid: {size_mb:.2f} MB")
+        record_transfer(size, elapsed)
+        return True, size
+
+    log(f"⚠ FFmpeg gestopt na {elapsed:.1f}s, returncode: {returncode}")
+
+    if disk_full:
+        error = "Onvoldoende schijfruimte, onvolledig bestand verwijderd"
+        output_path.unlink(missing_ok=True)
+        log(f"✗ Fout: {error}")
+        return False, error
+
+    # Check if we got partial download
+    if output_path.exists() and output_path.stat().st_size > 0:
+        size = output_path.stat().st_size
+        size_mb = size / 1024 / 1024
+        log(f"⚠ Partial download: {size_mb:.2f} MB")
+        record_transfer(size, elapsed)
+        return True, size
+
+    error = "Onbekende fout"
+    log(f"✗ Fout: {error[:500]}")
+    return False, error
+
+
+def build_ffmpeg_command(
+    stream_url: str,
+    output: str,
+    user_agent: str = None,
+    cookies: str = None,
+    output_format: Optional[str] = None,
+    audio_only: bool = False,
+    progress: str = "pipe:1",
+) -> List[str]:
+    """ffmpeg command line for a stream copy of stream_url to output."""
+    capabilities = get_ffmpeg_capabilities()
+    cmd = [capabilities["path"] if capabilities else "ffmpeg", "-y"]
+
+    # Build headers string for FFmpeg
+    headers_parts = []
+    if user_agent:
+        headers_parts.append(f"User-Agent: {user_agent}")
+    if cookies:
+        headers_parts.append(f"Cookie: {cookies}")
+    headers_parts.append("Referer: https://www.vrt.be/")
+
+    if headers_parts:
+        headers_str = "\r\n".join(headers_parts) + "\r\n"
+        cmd.extend(["-headers", headers_str])
+        log(f"Headers: {headers_str.replace(chr(13), '').replace(chr(10), ' ')}")
+
+    # Reconnect options are input options and must precede -i
+    cmd.extend(thuis_ffmpeg.input_options(capabilities))
+    cmd.extend(["-i", stream_url])
+    if audio_only:
+        cmd.extend(["-map", "0:a:0", "-vn"])
+    cmd.extend(["-c", "copy", "-progress", progress])
+    if output_format:
+        cmd.extend(FRAGMENTED_FORMATS[output_format])
+    cmd.append(output)
+    return cmd
 
 
 def download_with_ffmpeg(
@@ -353,6 +509,12 @@ def download_with_ffmpeg(
     timeout: int = 300,
     user_agent: str = None,
     cookies: str = None,
+    timings: Optional[StageTimer] = None,
+    output_format: Optional[str] = None,
+    audio_only: bool = False,
+    min_free_bytes: Optional[int] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+    stop: Optional[threading.Event] = None,
 ):
     """Download video met ffmpeg
 
@@ -363,43 +525,27 @@ def download_with_ffmpeg(
         timeout: Max seconds to wait for download
         user_agent: User-Agent header
         cookies: Cookie header string
+        timings: Optional stage timer for the transfer and post-check
+        output_format: "fmp4" or "ts" to write a file that can be played
+            while it is downloading (see FRAGMENTED_FORMATS)
+        audio_only: Keep only the first audio track (for .m4a output)
+        min_free_bytes: Stop ffmpeg when free disk space drops below this
+        on_progress: Called with the seconds of video written so far
+        stop: Stop ffmpeg when this event is set
     """
+    timings = timings or StageTimer()
     log(f"Downloaden: {title}")
     log(f"Stream URL: {stream_url}")
     log(f"Output: {output_path}")
     log(f"Timeout: {timeout} seconden")
 
-    cmd = ["ffmpeg", "-y"]
-
-    # Build headers string for FFmpeg
-    headers_parts = []
-    if user_agent:
-        headers_parts.append(f"User-Agent: {user_agent}")
-    if cookies:
-        headers_parts.append(f"Cookie: {cookies}")
-    headers_parts.append("Referer: https://www.vrt.be/")
-
-    if headers_parts:
-        headers_str = "\r\n".join(headers_parts) + "\r\n"
-        cmd.extend(["-headers", headers_str])
-        log(f"Headers: {headers_str.replace(chr(13), '').replace(chr(10), ' ')}")
-
-    cmd.extend(
-        [
-            "-i",
-            stream_url,
-            "-c",
-            "copy",
-            "-progress",
-            "pipe:1",
-            "-reconnect",
-            "1",
-            "-reconnect_streamed",
-            "1",
-            "-reconnect_delay_max",
-            "5",
-            str(output_path),
-        ]
+    cmd = build_ffmpeg_command(
+        stream_url,
+        str(output_path),
+        user_agent=user_agent,
+        cookies=cookies,
+        output_format=output_format,
+        audio_only=audio_only,
     )
 
     try:
@@ -410,6 +556,8 @@ def download_with_ffmpeg(
 
         start_time = time.time()
         last_progress = time.time()
+        last_disk_check = start_time
+        disk_full = False
 
         while True:
             # Check timeout
@@ -432,267 +580,629 @@ def download_with_ffmpeg(
                     if "out_time=" in line:
                         time_str = line.split("=")[1].strip()
                         log(f"  Progress: {time_str}")
+                        seconds = parse_progress_time(time_str)
+                        if on_progress and seconds is not None:
+                            on_progress(seconds)
                     last_progress = time.time()
 
+            if stop is not None and stop.is_set():
+                log("⚠ Download gestopt, FFmpeg wordt gestopt")
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                break
+
+            if min_free_bytes and time.time() - last_disk_check > 5:
+                last_disk_check = time.time()
+                if thuis_disk.free_bytes(output_path.parent) < min_free_bytes:
+                    log("⚠ Schijf bijna vol, FFmpeg wordt gestopt")
+                    disk_full = True
+                    process.terminate()
+                    try:
+                        process.wait(timeout=5)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                    break
+
         returncode = process.wait()
 
-        if returncode == 0 and output_path.exists():
-            size = output_path.stat().st_size
-            size_mb = size / 1024 / 1024
-            log(f"✓ Download voltooid: {size_mb:.2f} MB")
-            return True, size
-        else:
-            elapsed = time.time() - start_time
-            log(f"⚠ FFmpeg gestopt na {elapsed:.1f}s, returncode: {returncode}")
+        elapsed = time.time() - start_time
+        timings.record("ffmpeg_transfer", elapsed)
 
-            # Check if we got partial download
-            if output_path.exists() and output_path.stat().st_size > 0:
-                size = output_path.stat().st_size
-                size_mb = size / 1024 / 1024
-                log(f"⚠ Partial download: {size_mb:.2f} MB")
-                return True, size
+        # ffmpeg also stops by itself when a write fails on a full disk
+        if returncode != 0 and not disk_full:
+            floor = max(min_free_bytes or 0, thuis_disk.DISK_FULL_BYTES)
+            disk_full = thuis_disk.free_bytes(output_path.parent) < floor
 
-            error = process.stderr.read() if process.stderr else "Onbekende fout"
-            log(f"✗ Fout: {error[:500]}")
-            return False, error
+        with timings.stage("post_check"):
+            return check_download_output(output_path, returncode, elapsed, disk_full)
 
     except Exception as e:
         log(f"✗ Uitzondering: {str(e)}")
         return False, str(e)
 
 
-async def download_video(
-    video_url: str,
-    username: str,
-    password: str,
-    output_path: Optional[Path] = None,
-    headless: bool = True,
+def download_to_s3(
+    stream_url: str,
+    target: S3Target,
+    key: str,
+    title: str,
+    timeout: int = 300,
+    user_agent: str = None,
+    cookies: str = None,
+    timings: Optional[StageTimer] = None,
+    audio_only: bool = False,
+    on_progress: Optional[Callable[[float], None]] = None,
+    stop: Optional[threading.Event] = None,
 ):
-    """Download een VRT MAX video"""
+    """Stream a download into object storage without a local copy
 
-    print(f"Video: {video_url}\n", flush=True)
+    ffmpeg writes fragmented MP4 to stdout (a pipe cannot be seeked back
+    to write a regular moov), which goes straight into a multipart upload.
+    Progress comes in on stderr and is passed to on_progress in seconds.
+    Setting stop terminates ffmpeg, which aborts the upload.
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless)
-        context = await browser.new_context(
-            viewport={"width": 1920, "height": 1080}, user_agent=USER_AGENT
-        )
-        page = await context.new_page()
-
-        # Stap 1: Inloggen
-        print("Stap 1: Inloggen...", flush=True)
-
-        redirect_uri = "https://www.vrt.be/vrtmax/sso/callback"
-        login_url = (
-            f"https://login.vrt.be/authorize?response_type=code"
-            f"&client_id=vrtnu-site&redirect_uri={redirect_uri}"
-            f"&scope=openid%20profile%20email%20video"
-        )
+    Returns:
+        (True, size in bytes) or (False, error message)
+    """
+    timings = timings or StageTimer()
+    log(f"Downloaden: {title}")
+    log(f"Output: {target.uri(key)}")
+
+    cmd = build_ffmpeg_command(
+        stream_url,
+        "pipe:1",
+        user_agent=user_agent,
+        cookies=cookies,
+        output_format="fmp4",
+        audio_only=audio_only,
+        progress="pipe:2",
+    )
+    cmd[1:1] = ["-loglevel", "error"]
+
+    log("FFmpeg starten...")
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def read_progress():
+        for raw in process.stderr:
+            line = raw.decode(errors="replace").strip()
+            if line.startswith("out_time="):
+                time_str = line.split("=", 1)[1]
+                log(f"  Progress: {time_str}")
+                seconds = parse_progress_time(time_str)
+                if on_progress and seconds is not None:
+                    on_progress(seconds)
+            if stop is not None and stop.is_set():
+                process.terminate()
 
-        await page.goto(login_url, wait_until="networkidle")
-        await asyncio.sleep(3)
+    progress_thread = threading.Thread(target=read_progress, daemon=True)
+    progress_thread.start()
+    timer = threading.Timer(timeout, process.terminate)
+    timer.start()
 
-        await page.fill('input[type="email"]', username)
-        await page.click('button[type="submit"]')
-        await asyncio.sleep(3)
+    def check_exit():
+        returncode = process.wait()
+        if returncode != 0:
+            raise RuntimeError(f"FFmpeg gestopt, returncode: {returncode}")
 
-        pw = await page.query_selector('input[type="password"]')
-        if pw:
-            await pw.fill(password)
-            await page.click('button[type="submit"]')
-            await asyncio.sleep(8)
+    start_time = time.time()
+    try:
+        size = upload_stream(
+            process.stdout,
+            target.client,
+            target.bucket,
+            key,
+            before_complete=check_exit,
+        )
+    except Exception as e:
+        process.kill()
+        process.wait()
+        log(f"✗ Upload afgebroken, onvolledig object verwijderd: {e}")
+        return False, str(e)
+    finally:
+        timer.cancel()
+        progress_thread.join(timeout=5)
+        timings.record("ffmpeg_transfer", time.time() - start_time)
+
+    elapsed = time.time() - start_time
+    log(f"✓ Upload voltooid: {size / 1024 / 1024:.2f} MB")
+    record_transfer(size, elapsed)
+    return True, size
+
+
+def stream_redirect_location(response) -> Optional[str]:
+    """Media services URL from the vualto redirect of an episode page."""
+    if "/videos/" not in response.url or "vualto" not in response.url:
+        return None
+    location = response.headers.get("location", "")
+    if not location:
+        return None
+    return MEDIA_SERVICES_URL + location if location.startswith("/") else location
+
+
+async def resolve_stream_redirect(
+    page, url: str, timeout: float = RESOLVE_TIMEOUT
+) -> Optional[str]:
+    """Open an episode page and return its stream redirect.
+
+    Returns as soon as the vualto response passes instead of waiting for
+    the page to go idle; None if it does not arrive within timeout ms.
+    """
+    try:
+        async with page.expect_response(
+            lambda response: stream_redirect_location(response) is not None,
+            timeout=timeout,
+        ) as response_info:
+            await page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+        return stream_redirect_location(await response_info.value)
+    except Exception as e:
+        log(f"    Geen stream redirect: {str(e).splitlines()[0]}")
+        return None
 
-        if "login" in page.url.lower():
-            print("FOUT: Inloggen mislukt", flush=True)
-            return False
 
-        print("  Ingelogd!\n", flush=True)
-
-        # Stap 2: Naar VRT MAX
-        print("Stap 2: Stream ophalen...", flush=True)
-        await page.goto("https://www.vrt.be/vrtmax/", wait_until="networkidle")
-        await asyncio.sleep(3)
-
-        # Stap 3: Stream URL
-        redirect_url = None
-
-        async def handle_response(response):
-            nonlocal redirect_url
-            if "/videos/" in response.url and "vualto" in response.url:
-                location = response.headers.get("location", "")
-                if location:
-                    redirect_url = (
-                        "https://media-services-public.vrt.be" + location
-                        if location.startswith("/")
-                        else location
-                    )
+async def wait_for_password_field(page, timeout: float = LOGIN_TIMEOUT):
+    """The password field, or None once the login page is left without one.
 
-        page.on("response", handle_response)
+    The login form may skip the password step for a known session, so this
+    waits for whichever happens first.
+    """
+    field = asyncio.ensure_future(
+        page.wait_for_selector(
+            'input[type="password"]', state="visible", timeout=timeout
+        )
+    )
+    left = asyncio.ensure_future(
+        page.wait_for_url(lambda url: "login" not in url.lower(), timeout=timeout)
+    )
+    done, pending = await asyncio.wait(
+        {field, left}, return_when=asyncio.FIRST_COMPLETED
+    )
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    if field in done and not field.exception():
+        return field.result()
+    return None
 
-        await page.goto(video_url, wait_until="networkidle")
-        await asyncio.sleep(8)
 
-        if not redirect_url:
-            log("FOUT: Kon stream URL niet ophalen")
-            return False
+async def try_http_login(username: str, password: str) -> Optional[List[Dict]]:
+    """Log in without the browser; None when the browser has to do it.
 
-        cookies = await context.cookies()
-        cookie_header = "; ".join(
-            [f"{c.get('name', '')}={c.get('value', '')}" for c in cookies]
+    Raises:
+        thuis_login.LoginRejected: The credentials were refused; the
+            browser would be refused too
+    """
+    try:
+        return await asyncio.to_thread(
+            thuis_login.http_login, username, password, COOKIE_FILE
         )
+    except thuis_login.LoginRejected:
+        raise
+    except thuis_login.InteractiveChallenge as e:
+        log(f"{e}, inloggen via de browser...")
+    except Exception as e:
+        log(f"Inloggen zonder browser mislukt ({e}), inloggen via de browser...")
+    return None
 
-        headers = {
-            "User-Agent": USER_AGENT,
-            "Cookie": cookie_header,
-            "Referer": "https://www.vrt.be/",
-        }
 
-        resp = requests.get(redirect_url, headers=headers)
+async def login(
+    page,
+    context,
+    username: str,
+    password: str,
+    timings: StageTimer,
+    use_http: bool = True,
+) -> bool:
+    """Log in to VRT MAX, reusing stored cookies while they still work.
 
-        if resp.status_code != 200:
-            print(f"FOUT: API gaf status {resp.status_code}", flush=True)
-            return False
+    A context attached from the browser daemon usually already holds a
+    valid session, in which case this only confirms it. Expired sessions
+    are refreshed over plain HTTP first, with the login form in the
+    browser as the fallback.
 
-        data = resp.json()
-        title = data.get("title", "video")
-        print(f"  Titel: {title}\n", flush=True)
+    Returns:
+        False if logging in failed
+    """
+    login_start = time.monotonic()
 
-        stream_url = None
-        for tu in data.get("targetUrls", []):
-            if tu.get("type") == "hls":
-                stream_url = tu.get("url")
-                break
+    saved_cookies = load_cookies()
+    if saved_cookies:
+        log("Opgeslagen cookies gevonden, proberen...")
+        try:
+            await context.add_cookies(saved_cookies)
+            await page.goto("https://www.vrt.be/vrtmax/", wait_until="networkidle")
+            if detect_login_success(page.url):
+                log("✓ Ingelogd met opgeslagen cookies!")
+            else:
+                log("Cookies verlopen, opnieuw inloggen...")
+                saved_cookies = None
+        except Exception as e:
+            log(f"Fout bij laden cookies: {e}")
+            saved_cookies = None
 
-        if not stream_url:
-            print("FOUT: Geen HLS stream gevonden", flush=True)
+    http_cookies = None
+    if not saved_cookies and use_http:
+        try:
+            http_cookies = await try_http_login(username, password)
+        except thuis_login.LoginRejected as e:
+            log(f"FOUT: Inloggen mislukt: {e}")
             return False
+        if http_cookies:
+            # Passing the callback is no proof: check the session works
+            await context.add_cookies(http_cookies)
+            await page.goto("https://www.vrt.be/vrtmax/", wait_until="networkidle")
+            if detect_login_success(page.url):
+                save_cookies(await context.cookies())
+                log("✓ Ingelogd zonder browser en cookies opgeslagen!")
+            else:
+                log("Sessie van inloggen zonder browser werkt niet, via de browser...")
+                http_cookies = None
 
-        # Stap 4: Downloaden
-        print("Stap 3: Downloaden...", flush=True)
-
-        if not output_path:
-            output_dir = Path("media")
-            output_dir.mkdir(exist_ok=True)
-            safe_title = "".join(c for c in title if c.isalnum() or c in " -_").strip()
-            output_path = output_dir / f"{safe_title}.mp4"
-
-        success, result = download_with_ffmpeg(
-            stream_url, output_path, title, user_agent=USER_AGENT, cookies=cookie_header
+    if not saved_cookies and not http_cookies:
+        await page.goto(thuis_login.authorize_url(), wait_until="domcontentloaded")
+        email = await page.wait_for_selector(
+            'input[type="email"]', state="visible", timeout=LOGIN_TIMEOUT
         )
+        await email.fill(username)
+        await page.click('button[type="submit"]')
 
-        if success:
-            size_mb = int(result) / 1024 / 1024
-            print(f"\n  SUCCES!", flush=True)
-            print(f"  Opgeslagen: {output_path}", flush=True)
-            print(f"  Grootte: {size_mb:.2f} MB", flush=True)
-            return True
-        else:
-            error_msg = str(result)
-            print(f"  FOUT: {error_msg[:200]}", flush=True)
-            return False
+        pw = await wait_for_password_field(page)
+        log(f"Password field found: {pw is not None}")
+        if pw:
+            await pw.fill(password)
+            await page.click('button[type="submit"]')
 
-        await browser.close()
+            try:
+                await page.wait_for_url(
+                    lambda url: "login" not in url.lower(), timeout=LOGIN_TIMEOUT
+                )
+            except Exception as e:
+                log(f"Wait for URL timeout: {e}")
+        else:
+            log("Geen password field gevonden, mogelijk al ingelogd")
 
+        log(f"URL na login poging: {page.url}")
 
-async def download_season(
-    season_url: str,
-    username: str,
-    password: str,
-    start_episode: int = None,
-    force: bool = False,
-    headless: bool = True,
-    dry_run: bool = False,
-    interactive: bool = False,
-):
-    """Download all episodes from a season"""
+        if not detect_login_success(page.url):
+            log("FOUT: Inloggen mislukt")
+            return False
 
-    url_type = detect_url_type(season_url)
-    if url_type != "season":
-        log(f"FOUT: URL is geen seizoens-URL: {season_url}")
-        return False
+        cookies = await context.cookies()
+        save_cookies(cookies)
+        log("✓ Ingelogd en cookies opgeslagen!")
+
+    login_elapsed = time.monotonic() - login_start
+    metrics.LOGIN_DURATION.observe(login_elapsed)
+    if saved_cookies:
+        stage = "cookie_restore"
+    elif http_cookies:
+        stage = "http_login"
+    else:
+        stage = "login"
+    timings.record(stage, login_elapsed)
+    return True
 
-    info = parse_episode_info(season_url)
-    program = info.get("program", "video").capitalize()
-    season = info.get("season", "")
 
-    log(f"Seizoen downloaden: {program} S{season}")
+async def browser_login(username: str, password: str, headless: bool = True) -> bool:
+    """Log in with the login form in the browser and store the cookies."""
+    from playwright.async_api import async_playwright
+    import playwright_stealth
 
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless)
-        context = await browser.new_context(
-            viewport={"width": 1920, "height": 1080}, user_agent=USER_AGENT
-        )
-        page = await context.new_page()
+        session = await open_session(p, headless, USER_AGENT, log=log)
+        try:
+            page = await session.new_page()
+            await playwright_stealth.Stealth().apply_stealth_async(page)
+            return await login(
+                page, session.context, username, password, StageTimer(), use_http=False
+            )
+        finally:
+            await session.close()
 
-        stealth = playwright_stealth.Stealth()
-        await stealth.apply_stealth_async(page)
 
-        log("Stap 1: Inloggen...")
+def refresh_login(username: str, password: str, headless: bool = True) -> bool:
+    """--login: renew the stored session, without a browser when possible."""
+    start = time.monotonic()
+    try:
+        cookies = asyncio.run(try_http_login(username, password))
+    except thuis_login.LoginRejected as e:
+        log(f"FOUT: Inloggen mislukt: {e}")
+        return False
+    if cookies and thuis_login.has_session(cookies):
+        get_cookie_store(COOKIE_FILE).update(cookies)
+        log(f"✓ Ingelogd zonder browser ({time.monotonic() - start:.1f}s)")
+        return True
+    if cookies:
+        log("Geen VRT MAX sessie na inloggen zonder browser, via de browser...")
+    return asyncio.run(browser_login(username, password, headless))
 
-        saved_cookies = load_cookies()
-        if saved_cookies:
-            log("Opgeslagen cookies gevonden, proberen...")
-            try:
-                await context.add_cookies(saved_cookies)
-                await page.goto("https://www.vrt.be/vrtmax/", wait_until="networkidle")
-                random_delay(1, 2)
-                if "login" not in page.url.lower():
-                    log("✓ Ingelogd met opgeslagen cookies!")
-                else:
-                    log("Cookies verlopen, opnieuw inloggen...")
-                    saved_cookies = None
-            except Exception as e:
-                log(f"Fout bij laden cookies: {e}")
-                saved_cookies = None
 
-        if not saved_cookies:
-            redirect_uri = "https://www.vrt.be/vrtmax/sso/callback"
-            login_url = (
-                f"https://login.vrt.be/authorize?response_type=code"
-                f"&client_id=vrtnu-site&redirect_uri={redirect_uri}"
-                f"&scope=openid%20profile%20email%20video"
-            )
+class ThuisError(Exception):
+    """A ThuisClient operation that cannot continue, e.g. a failed login."""
 
-            await page.goto(login_url, wait_until="networkidle")
-            random_delay(1, 2)
 
-            await page.fill('input[type="email"]', username)
-            await page.click('button[type="submit"]')
-            random_delay(1, 3)
+class ThuisClient:
+    """Async API over one logged-in VRT MAX browser session.
 
-            pw = await page.query_selector('input[type="password"]')
-            log(f"Password field found: {pw is not None}")
-            if pw:
-                await pw.fill(password)
-                await page.click('button[type="submit"]')
+    Keeps the browser, the session, a pool of resolve pages and the shared
+    HTTP session across calls, and caches resolved streams and season
+    listings, so an application that embeds Thuis pays for the browser
+    start and the login once instead of per download. download_video()
+    and download_season() are thin wrappers around it; app.py keeps one
+    client for all downloads started from the web UI.
 
-                try:
-                    await page.wait_for_url(
-                        lambda url: "login" not in url.lower(), timeout=15000
-                    )
-                except Exception as e:
-                    log(f"Wait for URL timeout: {e}")
+        async with ThuisClient(username, password) as client:
+            for episode in await client.list_season(season_url):
+                await client.download(episode["url"], filename=...)
 
-                random_delay(2, 4)
-            else:
-                log("Geen password field gevonden, mogelijk al ingelogd")
+    Progress callbacks get a dict with "url" and "stage" ("resolve",
+    "transfer", "done" or "failed"); transfer events add "seconds" written,
+    the expected "duration" and, for local files, the "bytes" on disk;
+    done events the "output" and "size".
 
-            log(f"URL na login poging: {page.url}")
+    Args:
+        username: VRT MAX email
+        password: VRT MAX password
+        headless: Run the browser without a window
+        timings: Stage timer shared by all calls
+        watchdog: Restarts the browser between resolves when it grows
+        blocker: Request blocker, attached after logging in
+        on_progress: Default progress callback for download()
+    """
 
-            if "login" in page.url.lower():
-                log("FOUT: Inloggen mislukt")
-                await browser.close()
-                return False
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        headless: bool = True,
+        timings: Optional[StageTimer] = None,
+        watchdog: Optional[BrowserWatchdog] = None,
+        blocker: Optional[RequestBlocker] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+    ):
+        self.username = username
+        self.password = password
+        self.headless = headless
+        self.timings = timings or StageTimer()
+        self.watchdog = watchdog
+        self.blocker = blocker
+        self.on_progress = on_progress
+        self.session = None
+        self.pool: Optional[PagePool] = None
+        self._playwright = None
+        self._page = None
+        self._stealth = None
+        # Browser work is serialised; transfers run in threads meanwhile
+        self._lock = asyncio.Lock()
+        self._stop = threading.Event()
+        self._streams: Dict[str, Dict] = {}
+        # season URL -> (episode URLs, time listed)
+        self._seasons: Dict[str, Tuple[List[str], float]] = {}
+        # The consent dialog was answered or did not show in this session
+        self._consent_checked = False
+
+    async def __aenter__(self) -> "ThuisClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        """Start the browser (or attach to the daemon) and log in.
+
+        Raises:
+            ThuisError: Logging in failed
+        """
+        from playwright.async_api import async_playwright
+        from playwright_stealth import stealth as playwright_stealth
+
+        self._playwright = await async_playwright().start()
+        try:
+            with self.timings.stage("browser_launch"):
+                self.session = await open_session(
+                    self._playwright, self.headless, USER_AGENT, log=log
+                )
+                self._stealth = playwright_stealth.Stealth()
+                page = await self._main_page()
+
+            log("Stap 1: Inloggen...")
+            if not await login(
+                page, self.session.context, self.username, self.password, self.timings
+            ):
+                raise ThuisError("Inloggen mislukt")
+            log("  Ingelogd!\n")
+            if self.blocker:
+                await self.blocker.attach(self.session.context)
+
+            await page.goto("https://www.vrt.be/vrtmax/", wait_until="domcontentloaded")
+            with self.timings.stage("cookie_consent"):
+                await handle_cookie_consent(page)
+            self._consent_checked = True
+
+            # Stealth scripts are injected once per pooled page
+            self.pool = PagePool(
+                self.session, prepare=self._stealth.apply_stealth_async
+            )
+        except BaseException:
+            await self.close()
+            raise
+
+    async def close(self):
+        if self.session:
+            if self.blocker:
+                log(f"  {self.blocker.report()}")
+            if self.pool:
+                await self.pool.close()
+            await self.session.close()
+        if self._playwright:
+            await self._playwright.stop()
+        self.session = self.pool = self._playwright = self._page = None
+
+    def cancel(self):
+        """Stop the running transfer; its download() returns None.
+
+        Safe to call from any thread.
+        """
+        self._stop.set()
+
+    async def _main_page(self):
+        """Page for logging in and season pages, reopened after a restart."""
+        if self._page is None or self._page.is_closed():
+            self._page = await self.session.new_page()
+            await self._stealth.apply_stealth_async(self._page)
+        return self._page
+
+    async def _check_browser(self):
+        """Restart the browser when the watchdog says it grew too much.
+
+        Called before each resolve: no page is resolving then and ffmpeg
+        does not depend on the browser.
+        """
+        if not self.watchdog:
+            return
+        reason = self.watchdog.check()
+        if self.watchdog.rss is not None:
+            metrics.BROWSER_RSS.set(self.watchdog.rss)
+        if reason:
+            log(f"  Browser herstarten ({reason})")
+            await self.pool.close()
+            await self.session.restart()
+            if self.blocker:
+                await self.blocker.attach(self.session.context)
+            self.watchdog.reset()
+            metrics.BROWSER_RESTARTS.inc()
+
+    async def _redirect(self, page, url: str) -> Optional[str]:
+        redirect_url = await resolve_stream_redirect(page, url)
+        if self.watchdog:
+            self.watchdog.navigated()
+        return redirect_url
+
+    async def cookie_header(self) -> str:
+        """Cookie header of the session, after storing its cookies."""
+        return await refresh_cookies(self.session.context)
+
+    async def resolve(self, url: str) -> Optional[Dict]:
+        """Title, HLS URL and Cookie header for an episode.
+
+        Cached per episode for STREAM_CACHE_TTL; a failed redirect is
+        retried once with fresh cookies.
+
+        Returns:
+            {"url", "title", "stream_url", "cookie_header"}, or None
+        """
+        cached = self._streams.get(url)
+        if cached and time.monotonic() - cached["resolved_at"] < STREAM_CACHE_TTL:
+            return cached
+
+        async with self._lock:
+            await self._check_browser()
+            page = await self.pool.acquire()
+            try:
+                resolve_start = time.monotonic()
+                redirect_url = await self._redirect(page, url)
+                self.timings.record("resolve", time.monotonic() - resolve_start)
+                if not redirect_url:
+                    log("    FOUT: Kon stream URL niet ophalen, opnieuw proberen...")
+                    await self.cookie_header()
+                    redirect_url = await self._redirect(page, url)
+                if not redirect_url:
+                    log("    FOUT: Kon stream URL niet ophalen")
+                    return None
+                cookie_header = await self.cookie_header()
+            finally:
+                await self.pool.release(page)
+
+        with self.timings.stage("media_services"):
+            data = await asyncio.to_thread(
+                fetch_stream_info, redirect_url, cookie_header
+            )
+        if data is None:
+            return None
+        metrics.RESOLVE_DURATION.observe(time.monotonic() - resolve_start)
 
-            cookies = await context.cookies()
-            save_cookies(cookies)
-            log("✓ Ingelogd en cookies opgeslagen!")
+        stream_url = get_hls_url(data)
+        if not stream_url:
+            log("    FOUT: Geen HLS stream gevonden")
+            return None
+
+        stream = {
+            "url": url,
+            "title": data.get("title"),
+            "stream_url": stream_url,
+            "cookie_header": cookie_header,
+            "resolved_at": time.monotonic(),
+        }
+        # Drop expired entries, so a long-running client does not keep them all
+        self._streams = {
+            k: v
+            for k, v in self._streams.items()
+            if stream["resolved_at"] - v["resolved_at"] < STREAM_CACHE_TTL
+        }
+        self._streams[url] = stream
+        return stream
+
+    async def _stream_url(self, stream: Dict, audio_only: bool) -> str:
+        if not audio_only:
+            return stream["stream_url"]
+        if "audio_url" not in stream:
+            stream["audio_url"] = await asyncio.to_thread(
+                resolve_audio_stream, stream["stream_url"], stream["cookie_header"]
+            )
+        return stream["audio_url"]
+
+    async def probe(self, url: str, audio_only: bool = False) -> Optional[Dict]:
+        """Bandwidth and duration of the stream download() would fetch.
+
+        Returns:
+            See probe_stream(); None if unknown
+        """
+        stream = await self.resolve(url)
+        if not stream:
+            return None
+        key = "audio_probe" if audio_only else "probe"
+        if key not in stream:
+            stream_url = await self._stream_url(stream, audio_only)
+            stream[key] = await asyncio.to_thread(
+                probe_stream, stream_url, stream["cookie_header"]
+            )
+        return stream[key]
+
+    async def list_season(
+        self, season_url: str, audio_only: bool = False
+    ) -> List[Dict]:
+        """Episodes on a season page, in page order.
+
+        Cached per season for SEASON_CACHE_TTL, so episodes published later
+        are found by a client that keeps running.
+
+        Returns:
+            [{"url", "filename"}], empty if none were found
+        """
+        cached = self._seasons.get(season_url)
+        if cached is None or time.monotonic() - cached[1] >= SEASON_CACHE_TTL:
+            async with self._lock:
+                urls = await self._discover(season_url)
+            now = time.monotonic()
+            self._seasons = {
+                k: v for k, v in self._seasons.items() if now - v[1] < SEASON_CACHE_TTL
+            }
+            self._seasons[season_url] = (urls, now)
 
-        log("Stap 2: Afleveringen ophalen...")
-        await page.goto("https://www.vrt.be/vrtmax/", wait_until="domcontentloaded")
-        random_delay(1, 2)
-        await handle_cookie_consent(page)
+        extension = "m4a" if audio_only else "mp4"
+        return [
+            {
+                "url": url,
+                "filename": generate_filename(parse_episode_info(url), extension),
+            }
+            for url in self._seasons[season_url][0]
+        ]
 
+    async def _discover(self, season_url: str) -> List[str]:
+        page = await self._main_page()
         if "?" in season_url:
             season_url_with_params = season_url
         else:
@@ -703,62 +1213,291 @@ async def download_season(
                 f"https://www.vrt.be/vrtmax/a-z/{program}/?seizoen=seizoen-{season}"
             )
 
+        discovery_start = time.monotonic()
         await page.goto(season_url_with_params, wait_until="domcontentloaded")
-        random_delay(3, 5)
-        await handle_cookie_consent(page)
+        await asyncio.sleep(random.uniform(3, 5))
+        consent_elapsed = 0.0
+        # Without a dialog on the first page, waiting here again would
+        # only cost another CONSENT_TIMEOUT
+        if not self._consent_checked:
+            consent_start = time.monotonic()
+            await handle_cookie_consent(page)
+            consent_elapsed = time.monotonic() - consent_start
+            self.timings.record("cookie_consent", consent_elapsed)
+            self._consent_checked = True
 
         alle_seizoenen = await page.query_selector("text=Alle seizoenen")
         if alle_seizoenen:
             await alle_seizoenen.evaluate("el => el.click()")
-            random_delay(5, 8)
+            await asyncio.sleep(random.uniform(5, 8))
 
             for _ in range(15):
                 await page.evaluate("window.scrollBy(0, 1500)")
                 await asyncio.sleep(1)
 
-        episode_urls = await page.evaluate("""
-            () => {
-                const allLinks = document.querySelectorAll('a');
-                const urls = [];
-                const baseUrl = 'https://www.vrt.be';
-                allLinks.forEach(link => {
-                    const href = link.getAttribute('href');
-                    if (href && href.includes('/vrtmax/a-z/')) {
-                        if (href.match(/[a-z]+-s\\d+a\\d+/)) {
-                            if (href.startsWith('/')) {
-                                urls.push(baseUrl + href);
-                            } else {
-                                urls.push(href);
-                            }
-                        }
-                    }
-                });
-                return [...new Set(urls)].sort();
-            }
-        """)
+        episode_urls = await discover_season_episodes_async(page)
+
+        # Discovery covers the season page, without the consent dialog
+        self.timings.record(
+            "discovery", time.monotonic() - discovery_start - consent_elapsed
+        )
+        return episode_urls
+
+    async def download(
+        self,
+        url: str,
+        output_path: Optional[Path] = None,
+        filename: Optional[str] = None,
+        output_format: Optional[str] = None,
+        audio_only: bool = False,
+        disk: Optional[thuis_disk.DiskSpaceScheduler] = None,
+        s3_target: Optional[S3Target] = None,
+        postprocessor: Optional[PostProcessor] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+    ) -> Optional[str]:
+        """Resolve and download an episode.
+
+        Args:
+            url: Episode URL
+            output_path: Local file to write (default: MEDIA_DIR / filename)
+            filename: Name below the media directory or S3 prefix
+                (default: the episode title)
+            on_progress: Progress callback, instead of the client's default
+
+        Returns:
+            The local path or s3:// URI written, None if the download failed
+
+        Raises:
+            ThuisError: The disk stayed too full to start the download
+        """
+        callback = on_progress or self.on_progress
+
+        def emit(stage: str, **fields):
+            if callback:
+                callback({"url": url, "stage": stage, **fields})
+
+        def failed(error: str) -> None:
+            metrics.EPISODES_FAILED.inc()
+            emit("failed", error=error)
+
+        self._stop.clear()
+        emit("resolve")
+        stream = await self.resolve(url)
+        if not stream:
+            return failed("Kon stream niet ophalen")
+
+        title = stream["title"] or filename or "video"
+        log(f"  Titel: {title}\n")
+        stream_url = await self._stream_url(stream, audio_only)
+        if not filename:
+            safe_title = "".join(c for c in title if c.isalnum() or c in " -_").strip()
+            filename = f"{safe_title}.{'m4a' if audio_only else 'mp4'}"
+
+        # Playlist duration: size estimate now, verification later
+        probe = None if s3_target else await self.probe(url, audio_only)
+        duration = probe["duration"] if probe else None
+        estimate = stream_size(probe) if disk else None
+        if disk:
+            if estimate:
+                log(f"  Geschatte grootte: {thuis_disk.format_size(estimate)}")
+            # Pause until the episode fits; a queue should stop if it never does
+            if not await asyncio.to_thread(disk.reserve, estimate):
+                failed("Onvoldoende schijfruimte")
+                raise ThuisError("Onvoldoende schijfruimte")
+
+        loop = asyncio.get_running_loop()
+        download_path = None
+
+        def transfer_progress(seconds: float):
+            fields = {"seconds": seconds, "duration": duration}
+            if download_path:
+                try:
+                    fields["bytes"] = download_path.stat().st_size
+                except OSError:
+                    pass
+            # ffmpeg is read in a worker thread; callbacks run on the loop
+            loop.call_soon_threadsafe(lambda: emit("transfer", **fields))
 
-        if not episode_urls:
+        try:
+            if s3_target:
+                key = s3_target.key_for(filename)
+                output = s3_target.uri(key)
+                success, result = await asyncio.to_thread(
+                    download_to_s3,
+                    stream_url,
+                    s3_target,
+                    key,
+                    title,
+                    user_agent=USER_AGENT,
+                    cookies=stream["cookie_header"],
+                    timings=self.timings,
+                    audio_only=audio_only,
+                    on_progress=transfer_progress,
+                    stop=self._stop,
+                )
+            else:
+                output_path = output_path or MEDIA_DIR / filename
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                output = str(output_path)
+                download_path = partial_path(output_path, output_format)
+                if output_format:
+                    log(f"  Afspeelbaar tijdens download: {download_path}")
+                success, result = await asyncio.to_thread(
+                    download_with_ffmpeg,
+                    stream_url,
+                    download_path,
+                    title,
+                    user_agent=USER_AGENT,
+                    cookies=stream["cookie_header"],
+                    timings=self.timings,
+                    output_format=output_format,
+                    audio_only=audio_only,
+                    min_free_bytes=disk.abort_below if disk else None,
+                    on_progress=transfer_progress,
+                    stop=self._stop,
+                )
+        finally:
+            if disk:
+                disk.release(estimate)
+
+        if not success:
+            log(f"  FOUT: {str(result)[:200]}")
+            return failed(str(result))
+
+        metrics.EPISODES_COMPLETED.inc()
+        log(f"  Opgeslagen: {output}")
+        log(f"  Grootte: {int(result) / 1024 / 1024:.2f} MB")
+        if probe:
+            thuis_verify.record_expected_duration(output_path, probe["duration"])
+        # Remux in the pool while the next episode transfers
+        if postprocessor and not s3_target:
+            await postprocessor.submit(download_path, output_path, disk=disk)
+        emit("done", output=output, size=int(result))
+        return output
+
+
+async def download_video(
+    video_url: str,
+    username: str,
+    password: str,
+    output_path: Optional[Path] = None,
+    headless: bool = True,
+    timings: Optional[StageTimer] = None,
+    postprocessor: Optional[PostProcessor] = None,
+    output_format: Optional[str] = None,
+    audio_only: bool = False,
+    disk: Optional[thuis_disk.DiskSpaceScheduler] = None,
+    s3_target: Optional[S3Target] = None,
+    blocker: Optional[RequestBlocker] = None,
+    client: Optional[ThuisClient] = None,
+):
+    """Download een VRT MAX video
+
+    With a started client its browser and session are used and left open.
+    """
+    set_episode_id(video_url.split("?")[0].rstrip("/").rsplit("/", 1)[-1])
+    log(f"Video: {video_url}\n")
+
+    own_client = client is None
+    if own_client:
+        client = ThuisClient(
+            username, password, headless=headless, timings=timings, blocker=blocker
+        )
+    try:
+        if own_client:
+            await client.start()
+
+        log("Stap 2: Downloaden...")
+        output = await client.download(
+            video_url,
+            output_path=output_path,
+            output_format=output_format,
+            audio_only=audio_only,
+            disk=disk,
+            s3_target=s3_target,
+            postprocessor=postprocessor,
+        )
+        if output:
+            log(f"\n  SUCCES!")
+        return output is not None
+    except ThuisError:
+        return False
+    finally:
+        if own_client:
+            await client.close()
+
+
+async def download_season(
+    season_url: str,
+    username: str,
+    password: str,
+    start_episode: int = None,
+    force: bool = False,
+    headless: bool = True,
+    dry_run: bool = False,
+    interactive: bool = False,
+    metrics_file: Optional[Path] = None,
+    timings: Optional[StageTimer] = None,
+    postprocessor: Optional[PostProcessor] = None,
+    output_format: Optional[str] = None,
+    audio_only: bool = False,
+    disk: Optional[thuis_disk.DiskSpaceScheduler] = None,
+    s3_target: Optional[S3Target] = None,
+    watchdog: Optional[BrowserWatchdog] = None,
+    blocker: Optional[RequestBlocker] = None,
+    client: Optional[ThuisClient] = None,
+):
+    """Download all episodes from a season
+
+    With a started client its browser and session are used and left open.
+    """
+    url_type = detect_url_type(season_url)
+    if url_type != "season":
+        log(f"FOUT: URL is geen seizoens-URL: {season_url}")
+        return False
+
+    info = parse_episode_info(season_url)
+    program = info.get("program", "video").capitalize()
+    season = info.get("season", "")
+
+    log(f"Seizoen downloaden: {program} S{season}")
+
+    own_client = client is None
+    if own_client:
+        client = ThuisClient(
+            username,
+            password,
+            headless=headless,
+            timings=timings,
+            watchdog=watchdog,
+            blocker=blocker,
+        )
+    try:
+        if own_client:
+            await client.start()
+
+        log("Stap 2: Afleveringen ophalen...")
+        episodes = await client.list_season(season_url, audio_only=audio_only)
+
+        if not episodes:
             log(f"FOUT: Geen afleveringen gevonden")
             return False
 
-        log(f"Gevonden: {len(episode_urls)} afleveringen")
+        log(f"Gevonden: {len(episodes)} afleveringen")
 
         program_dir = MEDIA_DIR / program.capitalize()
-        program_dir.mkdir(parents=True, exist_ok=True)
-
-        existing_files = [] if force else get_existing_episodes(program_dir)
+        if s3_target:
+            existing_files = [] if force else s3_target.existing(program_dir.name)
+        else:
+            program_dir.mkdir(parents=True, exist_ok=True)
+            existing_files = [] if force else get_existing_episodes(program_dir)
 
         if existing_files:
             log(f"Reeds gedownload: {len(existing_files)}")
 
-        all_episodes = []
-        for url in episode_urls:
-            info = parse_episode_info(url)
-            filename = generate_filename(info)
-            all_episodes.append(filename)
-
+        episode_urls = {e["filename"]: e["url"] for e in episodes}
         episodes_to_download = filter_episodes_to_download(
-            all_episodes,
+            [e["filename"] for e in episodes],
             existing_files=existing_files if not force else None,
             start_episode=start_episode,
         )
@@ -771,157 +1510,444 @@ async def download_season(
 
         if dry_run:
             log(f"(Dry-run: geen downloads gestart)")
-            await browser.close()
             return True
 
         if interactive:
             log("")
-            answer = input(
+            answer = ask(
                 f"Download {len(episodes_to_download)} afleveringen starten? [y/N]: "
             )
             if answer.lower() != "y":
                 log("Download geannuleerd.")
-                await browser.close()
                 return False
             log("")
 
-        cookies = await context.cookies()
-        cookie_header = "; ".join(
-            [f"{c.get('name', '')}={c.get('value', '')}" for c in cookies]
-        )
-
-        headers = {
-            "User-Agent": USER_AGENT,
-            "Cookie": cookie_header,
-            "Referer": "https://www.vrt.be/",
-        }
-
-        log(f"Te downloaden: {len(episodes_to_download)} afleveringen")
-
         success_count = 0
         failed_count = 0
+        total_checked = False
 
         for i, filename in enumerate(episodes_to_download, 1):
-            episode_url = None
-            for url in episode_urls:
-                if parse_episode_info(url).get("episode") in filename:
-                    episode_url = url
-                    break
-
-            if not episode_url:
-                continue
-
-            episode_info = parse_episode_info(episode_url)
+            remaining = len(episodes_to_download) - i + 1
+            metrics.QUEUE_DEPTH.set(remaining)
+            set_episode_id(Path(filename).stem)
+            episode_url = episode_urls[filename]
             log(f"[{i}/{len(episodes_to_download)}] Downloaden: {filename}")
 
-            redirect_url = None
-
-            page_episode = await context.new_page()
-            stealth_ep = playwright_stealth.Stealth()
-            await stealth_ep.apply_stealth_async(page_episode)
-
-            async def handle_response(response):
-                nonlocal redirect_url
-                if "/videos/" in response.url and "vualto" in response.url:
-                    location = response.headers.get("location", "")
-                    if location:
-                        redirect_url = (
-                            "https://media-services-public.vrt.be" + location
-                            if location.startswith("/")
-                            else location
-                        )
+            if disk and not total_checked:
+                estimate = stream_size(await client.probe(episode_url, audio_only))
+                if estimate:
+                    disk.check_total(estimate, remaining)
+                    total_checked = True
 
-            page_episode.on("response", handle_response)
-
-            await page_episode.goto(episode_url, wait_until="networkidle")
-            random_delay(3, 6)
-
-            if not redirect_url:
-                print(f"    FOUT: Kon stream URL niet ophalen", flush=True)
+            try:
+                output = await client.download(
+                    episode_url,
+                    output_path=program_dir / filename,
+                    filename=f"{program_dir.name}/{filename}",
+                    output_format=output_format,
+                    audio_only=audio_only,
+                    disk=disk,
+                    s3_target=s3_target,
+                    postprocessor=postprocessor,
+                )
+            except ThuisError:
+                # The disk never freed up; the rest will not fit either
                 failed_count += 1
-                await page_episode.close()
+                break
 
-                # Probeer opnieuw met verse cookies
-                cookies = await context.cookies()
-                cookie_header = "; ".join(
-                    [f"{c.get('name', '')}={c.get('value', '')}" for c in cookies]
-                )
-                headers = {
-                    "User-Agent": USER_AGENT,
-                    "Cookie": cookie_header,
-                    "Referer": "https://www.vrt.be/",
-                }
-
-                # Nog een poging
-                await page_episode.goto(episode_url, wait_until="networkidle")
-                random_delay(3, 6)
-
-                if redirect_url:
-                    resp = requests.get(redirect_url, headers=headers)
-                else:
-                    await page_episode.close()
-                    continue
+            if output:
+                log(f"    ✓")
+                success_count += 1
             else:
-                # Verfris cookies voor elke episode
-                cookies = await context.cookies()
-                cookie_header = "; ".join(
-                    [f"{c.get('name', '')}={c.get('value', '')}" for c in cookies]
-                )
-                headers = {
-                    "User-Agent": USER_AGENT,
-                    "Cookie": cookie_header,
-                    "Referer": "https://www.vrt.be/",
-                }
-                resp = requests.get(redirect_url, headers=headers)
-
-            if resp.status_code != 200:
-                print(f"    FOUT: API gaf status {resp.status_code}", flush=True)
+                log(f"    ✗ FOUT")
                 failed_count += 1
-                await page_episode.close()
-                continue
 
-            data = resp.json()
-            title = data.get("title", filename)
+            if metrics_file:
+                metrics.REGISTRY.write_textfile(metrics_file)
 
-            stream_url = None
-            for tu in data.get("targetUrls", []):
-                if tu.get("type") == "hls":
-                    stream_url = tu.get("url")
-                    break
+            await asyncio.sleep(random.uniform(1, 3))
 
-            if not stream_url:
-                print(f"    FOUT: Geen HLS stream gevonden", flush=True)
-                failed_count += 1
-                await page_episode.close()
+        set_episode_id(None)
+        metrics.QUEUE_DEPTH.set(0)
+
+        log(f"\n  Resultaat: {success_count} gelukt, {failed_count} gefaald")
+        return success_count > 0
+    except ThuisError:
+        return False
+    finally:
+        if own_client:
+            await client.close()
+
+
+class QueueWorker:
+    """Works through a JobQueue on one ThuisClient.
+
+    Used by the web UI and by --worker. Several workers, on one host or on
+    hosts sharing the queue file, split the work: a season job is turned
+    into one job per episode, so each host claims episodes of its own.
+    While a job runs its lease is renewed every HEARTBEAT_INTERVAL; when
+    another worker has taken the job over the transfer is stopped.
+
+    The browser starts and logs in with the first job and stays up for the
+    next ones. Jobs run one at a time.
+
+    Args:
+        queue: The shared job queue
+        headless: Run the browser without a window
+        watchdog: Restarts the long-running browser when it grows too big
+        blocker: Request types not loaded while finding episodes
+        disk: Admits transfers only with enough free space
+        postprocessor: Faststart remux (or defragment) of finished episodes
+        output_format: Fragmented format to write while downloading
+        audio_only: Download only the audio as .m4a
+        poll_interval: Seconds between looks at a queue with nothing due
+        progress_interval: Seconds between byte progress updates of a job
+        heartbeat_interval: Seconds between lease renewals
+        lease: Seconds a claimed job stays leased without a heartbeat
+        owner: Worker ID in leases (default: thuis_jobs.worker_id())
+        loop: Event loop run() will run on, so wake() works from other
+            threads before run() has started
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        username: str,
+        password: str,
+        headless: bool = True,
+        watchdog: Optional[BrowserWatchdog] = None,
+        blocker: Optional[RequestBlocker] = None,
+        disk: Optional[thuis_disk.DiskSpaceScheduler] = None,
+        postprocessor: Optional[PostProcessor] = None,
+        output_format: Optional[str] = None,
+        audio_only: bool = False,
+        poll_interval: float = 30.0,
+        progress_interval: float = 5.0,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+        lease: float = LEASE_DURATION,
+        owner: Optional[str] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        self.queue = queue
+        self.username = username
+        self.password = password
+        self.headless = headless
+        self.watchdog = watchdog
+        self.blocker = blocker
+        self.disk = disk
+        self.postprocessor = postprocessor
+        self.output_format = output_format
+        self.audio_only = audio_only
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.lease = lease
+        self.owner = owner or worker_id()
+        self.client: Optional[ThuisClient] = None
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        # Last progress write; a locked database must not stall the loop
+        self._write: Optional[asyncio.Task] = None
+
+    async def run(self):
+        """Claim and run jobs until cancelled."""
+        self._loop = asyncio.get_running_loop()
+        try:
+            recovered = await self._queue_call(self.queue.recover)
+        except sqlite3.OperationalError as e:
+            log(f"FOUT: Wachtrij niet hersteld: {e}")
+            recovered = 0
+        if recovered:
+            log(f"{recovered} onderbroken download(s) opnieuw in de wachtrij")
+        metrics.ACTIVE_WORKERS.inc()
+        try:
+            while True:
+                try:
+                    job = await self._queue_call(
+                        self.queue.claim, self.owner, self.lease
+                    )
+                except sqlite3.OperationalError as e:
+                    # Still locked after the retries: look again after a poll
+                    log(f"FOUT: Wachtrij niet leesbaar: {e}")
+                    job = None
+                if job is None:
+                    # New jobs wake the worker; retries and expired leases
+                    # become due by themselves
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    continue
+                await self.run_job(job)
+        finally:
+            metrics.ACTIVE_WORKERS.dec()
+            await self._close_client()
+
+    def wake(self):
+        """Look at the queue now; safe to call from any thread."""
+        if self._loop is None:
+            # run() has not started and will look at the queue first anyway
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _get_client(self) -> ThuisClient:
+        if self.client is None:
+            client = ThuisClient(
+                self.username,
+                self.password,
+                headless=self.headless,
+                watchdog=self.watchdog,
+                blocker=self.blocker,
+            )
+            await client.start()
+            self.client = client
+        return self.client
+
+    async def _close_client(self):
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def _queue_call(self, method, *args, deadline: Optional[float] = None):
+        """Run a queue method in a thread, retrying while the database is locked.
+
+        Another host can hold the write lock on a shared queue for longer
+        than BUSY_TIMEOUT. Retries back off until deadline (monotonic time,
+        default one lease from now), then the error is raised.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.lease
+        delay = QUEUE_RETRY_DELAY
+        while True:
+            try:
+                return await asyncio.to_thread(method, *args)
+            except sqlite3.OperationalError as e:
+                if time.monotonic() + delay > deadline:
+                    raise
+                log(f"Wachtrij bezet ({e}), opnieuw over {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, QUEUE_RETRY_MAX_DELAY)
+
+    async def _heartbeat(self, job: Dict, lost: asyncio.Event):
+        """Renew the lease; stop the transfer once it is lost or about to be.
+
+        A renewal that keeps failing on a locked queue is retried until
+        one heartbeat before the lease runs out, so the transfer stops
+        before another worker can claim the job.
+        """
+        lease_until = time.monotonic() + self.lease
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                kept = await self._queue_call(
+                    self.queue.heartbeat,
+                    job["id"],
+                    self.owner,
+                    self.lease,
+                    deadline=lease_until - self.heartbeat_interval,
+                )
+            except sqlite3.OperationalError as e:
+                log(f"FOUT: Lease op download {job['id']} niet verlengd: {e}")
+                kept = False
+            if kept:
+                lease_until = time.monotonic() + self.lease
                 continue
+            log(f"Lease op download {job['id']} verloren, download gestopt")
+            lost.set()
+            if self.client:
+                self.client.cancel()
+            return
+
+    def _progress(self, job: Dict) -> Callable[[Dict], None]:
+        """Progress callback that stores the job's bytes and episodes.
+
+        Runs on the loop; the database writes run in threads.
+        """
+        done = {"bytes": 0, "episodes": 0, "saved": 0.0}
+
+        def progress(event: Dict):
+            current = 0
+            if event["stage"] == "done":
+                done["bytes"] += event["size"]
+                done["episodes"] += 1
+            elif event["stage"] == "transfer":
+                current = event.get("bytes", 0)
+                # A database write per ffmpeg progress line is too often
+                if time.monotonic() - done["saved"] < self.progress_interval:
+                    return
+            else:
+                return
+            done["saved"] = time.monotonic()
+            self._write = asyncio.create_task(
+                self._store_progress(
+                    self._write,
+                    job["id"],
+                    bytes_done=done["bytes"] + current,
+                    episodes_done=done["episodes"],
+                )
+            )
 
-            output_path = program_dir / filename
+        return progress
 
-            success, result = download_with_ffmpeg(
-                stream_url,
-                output_path,
-                title,
-                user_agent=USER_AGENT,
-                cookies=cookie_header,
+    async def _store_progress(self, previous: Optional[asyncio.Task], job_id, **fields):
+        """Write progress in a thread, after the previous write finished."""
+        if previous:
+            await previous
+        try:
+            await asyncio.to_thread(
+                self.queue.progress, job_id, owner=self.owner, **fields
             )
+        except Exception as e:
+            log(f"Voortgang van download {job_id} niet opgeslagen: {e}")
+
+    async def run_job(self, job: Dict) -> Optional[str]:
+        """Run one claimed job and record the result.
+
+        Returns:
+            The job's new state; None if another worker took it over
+        """
+        ok, error = False, None
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(job, lost))
+        with log_context(job_id=str(job["id"])):
+            log(f"Download {job['id']} gestart (poging {job['attempts']})")
+            output_path = MEDIA_DIR / job["output"] if job["output"] else None
+            try:
+                if output_path and output_path.exists():
+                    # Another host, or an earlier attempt, already wrote it
+                    log(f"{job['output']} staat al op schijf, overgeslagen")
+                    ok = True
+                else:
+                    client = await self._get_client()
+                    client.on_progress = self._progress(job)
+                    if detect_url_type(job["url"]) == "season":
+                        ok = await self._split_season(client, job)
+                    else:
+                        ok = await download_video(
+                            job["url"],
+                            self.username,
+                            self.password,
+                            output_path=output_path,
+                            postprocessor=self.postprocessor,
+                            output_format=self.output_format,
+                            audio_only=self.audio_only,
+                            disk=self.disk,
+                            client=client,
+                        )
+            except Exception as e:
+                error = str(e)
+                log(f"FOUT: Download {job['id']}: {e}")
+                # Start from a fresh browser and login for the next job
+                await self._close_client()
+            finally:
+                heartbeat.cancel()
+
+            if self._write:
+                await self._write
+                self._write = None
+            if lost.is_set():
+                error = error or "lease verloren"
+            try:
+                state = await self._queue_call(
+                    self.queue.finish, job["id"], ok, error, self.owner
+                )
+            except sqlite3.OperationalError as e:
+                # The lease runs out and another worker runs the job again
+                log(f"FOUT: Resultaat van download {job['id']} niet opgeslagen: {e}")
+                return None
+            log(f"Download {job['id']} {state or 'overgenomen'}: {job['url']}")
+        return state
+
+    async def _split_season(self, client: ThuisClient, job: Dict) -> bool:
+        """Queue a job per episode still to download.
+
+        Episodes on disk and before start_episode are left out; the rest
+        is claimed by whichever worker is free.
+        """
+        info = parse_episode_info(job["url"])
+        program = info.get("program", "video").capitalize()
+
+        episodes = await client.list_season(job["url"], audio_only=self.audio_only)
+        if not episodes:
+            log("FOUT: Geen afleveringen gevonden")
+            return False
 
-            if success:
-                print(f"    ✓", flush=True)
-                success_count += 1
-            else:
-                print(f"    ✗ FOUT", flush=True)
-                failed_count += 1
+        existing = get_existing_episodes(MEDIA_DIR / program)
+        wanted = set(
+            filter_episodes_to_download(
+                [e["filename"] for e in episodes],
+                existing_files=existing,
+                start_episode=job["start_episode"],
+            )
+        )
+        for episode in episodes:
+            if episode["filename"] in wanted:
+                await self._queue_call(
+                    self.queue.enqueue,
+                    episode["url"],
+                    None,
+                    f"{program}/{episode['filename']}",
+                )
+        log(f"{len(wanted)} van {len(episodes)} afleveringen in de wachtrij gezet")
+        return True
 
-            await page_episode.close()
 
-            random_delay(1, 3)
+def verify(directory: Path, workers: Optional[int] = None) -> bool:
+    """Check the library with ffprobe; True when every file is in order."""
+    if not directory.is_dir():
+        log(f"FOUT: Map {directory} bestaat niet")
+        return False
 
-        await browser.close()
+    capabilities = get_ffmpeg_capabilities() or {}
+    log(f"Controleren: {directory}")
+    results = thuis_verify.verify_library(
+        directory,
+        ffprobe=capabilities.get("ffprobe"),
+        ffmpeg=capabilities.get("path", "ffmpeg"),
+        workers=workers,
+    )
+    log(thuis_verify.format_report(results))
+    return all(r["status"] == thuis_verify.STATUS_OK for r in results)
+
+
+def create_postprocessor(
+    workers: int, validate: bool, timings: Optional[StageTimer]
+) -> PostProcessor:
+    """Process pool for the faststart remux (or defragment) of finished downloads."""
+    capabilities = get_ffmpeg_capabilities() or {}
+
+    def on_done(result: Dict):
+        name = Path(result["path"]).name if result.get("path") else "?"
+        if timings and "seconds" in result:
+            timings.record("faststart", result["seconds"])
+        if result.get("skipped"):
+            log(f"  Faststart: {name} (al in orde)")
+        elif result["success"]:
+            log(f"  ✓ Faststart: {name}")
+        else:
+            log(f"  ⚠ Faststart mislukt voor {name}: {result.get('error')}")
+
+    return PostProcessor(
+        workers=workers,
+        on_done=on_done,
+        ffmpeg=capabilities.get("path", "ffmpeg"),
+        validate=validate,
+        ffprobe=capabilities.get("ffprobe"),
+    )
 
-        print(
-            f"\n  Resultaat: {success_count} gelukt, {failed_count} gefaald", flush=True
-        )
-        return success_count > 0
+
+def report_timings(timings: StageTimer, destination: str):
+    """Print the stage timings, or write them as JSON when given a file."""
+    if destination == "-":
+        log("\nTijd per stap:")
+        log(timings.format_table())
+        return
+
+    with open(destination, "w") as f:
+        json.dump(timings.summary(), f, indent=2)
+    log(f"Timings opgeslagen: {destination}")
 
 
 def main():
@@ -937,6 +1963,8 @@ Voorbeelden:
   python thuis.py --setup
   python thuis.py "url" -o "output.mp4"
   python thuis.py "url" --no-headless
+  python thuis.py --enqueue "url" --queue /mnt/nas/thuis/jobs.db
+  python thuis.py --worker --queue /mnt/nas/thuis/jobs.db
         """,
     )
 
@@ -947,7 +1975,9 @@ Voorbeelden:
     parser.add_argument(
         "-p", "--password", default=os.getenv("VRT_PASSWORD"), help="VRT MAX wachtwoord"
     )
-    parser.add_argument("-o", "--output", help="Output bestand")
+    parser.add_argument(
+        "-o", "--output", help="Output bestand, of s3://bucket/prefix/ voor S3"
+    )
     parser.add_argument("--setup", action="store_true", help="Eerste keer configuratie")
     parser.add_argument(
         "--no-headless", action="store_true", help="Toon browser venster"
@@ -966,13 +1996,169 @@ Voorbeelden:
         action="store_true",
         help="Vraag bevestiging voor elke download",
     )
+    parser.add_argument(
+        "--timings",
+        nargs="?",
+        const="-",
+        metavar="BESTAND",
+        help="Toon tijd per stap na afloop, of schrijf een JSON-overzicht naar BESTAND",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="Schrijf Prometheus metrics naar dit bestand (textfile collector)",
+    )
+
+    parser.add_argument(
+        "--faststart",
+        action="store_true",
+        help="Zet de moov atom vooraan na elke download (snellere start bij streamen)",
+    )
+    parser.add_argument(
+        "--audio-only",
+        action="store_true",
+        help="Download enkel de audio als .m4a",
+    )
+    parser.add_argument(
+        "--fragmented",
+        nargs="?",
+        const="fmp4",
+        choices=sorted(FRAGMENTED_FORMATS),
+        help="Schrijf een bestand dat al afspeelbaar is tijdens de download "
+        "(fmp4 of ts) en remux het na afloop naar mp4",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Controleer het bestand na de remux",
+    )
+    parser.add_argument(
+        "--postprocess-workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Aantal processen voor nabewerking (standaard: 1)",
+    )
+    parser.add_argument(
+        "--disk-headroom",
+        type=float,
+        default=thuis_disk.DEFAULT_HEADROOM / thuis_disk.GB,
+        metavar="GB",
+        help="Vrije ruimte die na elke download moet overblijven (standaard: 2)",
+    )
+    parser.add_argument(
+        "--disk-wait",
+        type=float,
+        default=thuis_disk.DEFAULT_MAX_WAIT / 60,
+        metavar="MINUTEN",
+        help="Hoe lang de wachtrij pauzeert bij te weinig schijfruimte (standaard: 30)",
+    )
+    parser.add_argument(
+        "--browser-daemon",
+        action="store_true",
+        help="Houd een ingelogde Chromium open voor volgende runs (via CDP)",
+    )
+    parser.add_argument(
+        "--cdp-port",
+        type=int,
+        default=thuis_browser.DEFAULT_CDP_PORT,
+        metavar="POORT",
+        help=f"Poort van de browser daemon (standaard: {thuis_browser.DEFAULT_CDP_PORT})",
+    )
+    parser.add_argument(
+        "--block",
+        default=",".join(thuis_browser.BLOCKABLE),
+        metavar="TYPES",
+        help="Laad deze verzoeken niet bij het ophalen van afleveringen "
+        f"(standaard: {','.join(thuis_browser.BLOCKABLE)}; none = alles laden)",
+    )
+    parser.add_argument(
+        "--browser-max-rss",
+        type=float,
+        default=thuis_browser.DEFAULT_MAX_RSS / 1024**2,
+        metavar="MB",
+        help="Herstart de browser tussen afleveringen boven dit geheugengebruik "
+        "(standaard: 1024, 0 = uit)",
+    )
+    parser.add_argument(
+        "--browser-max-navigations",
+        type=int,
+        default=thuis_browser.DEFAULT_MAX_NAVIGATIONS,
+        metavar="N",
+        help="Herstart de browser na N paginabezoeken "
+        f"(standaard: {thuis_browser.DEFAULT_MAX_NAVIGATIONS}, 0 = uit)",
+    )
+    parser.add_argument(
+        "--login",
+        action="store_true",
+        help="Alleen inloggen en de cookies vernieuwen (zonder browser als het kan)",
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Werk de downloadwachtrij af tot Ctrl+C (ook met andere hosts samen)",
+    )
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="Zet de URL in de downloadwachtrij in plaats van hem te downloaden",
+    )
+    parser.add_argument(
+        "--queue",
+        default=os.getenv("THUIS_QUEUE") or str(JOBS_FILE),
+        metavar="BESTAND",
+        help="Downloadwachtrij voor --worker en --enqueue (standaard: jobs.db)",
+    )
+    parser.add_argument(
+        "--verify",
+        nargs="?",
+        const=str(MEDIA_DIR),
+        metavar="MAP",
+        help="Controleer alle afleveringen in MAP met ffprobe (standaard: media)",
+    )
+    parser.add_argument(
+        "--verify-workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Aantal processen voor --verify (standaard: aantal CPU's)",
+    )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        default=os.getenv("THUIS_LOG_JSON", "").lower() in ("1", "true", "yes"),
+        help="Schrijf thuis.log als JSON lines (met job- en aflevering-ID)",
+    )
 
     args = parser.parse_args()
+    setup_logging(json_lines=args.log_json)
 
     if args.setup:
         setup()
         return
 
+    if args.browser_daemon:
+        try:
+            asyncio.run(
+                thuis_browser.run_daemon(
+                    get_cookie_store(COOKIE_FILE),
+                    port=args.cdp_port,
+                    headless=not args.no_headless,
+                    user_agent=USER_AGENT,
+                    log=log,
+                )
+            )
+        except KeyboardInterrupt:
+            log("Browser daemon gestopt")
+        return
+
+    if args.enqueue:
+        if not args.url:
+            parser.print_help()
+            sys.exit(1)
+        job = JobQueue(Path(args.queue)).enqueue(args.url, args.start)
+        log(f"Download {job['id']} in de wachtrij: {args.url}")
+        return
+
     if not check_ffmpeg():
         print("FOUT: ffmpeg is niet geïnstalleerd", flush=True)
         print("Installeer ffmpeg eerst:", flush=True)
@@ -981,6 +2167,18 @@ Voorbeelden:
         print("  Windows: winget install ffmpeg", flush=True)
         sys.exit(1)
 
+    if args.verify:
+        sys.exit(0 if verify(Path(args.verify), args.verify_workers) else 1)
+
+    missing = thuis_ffmpeg.missing_capabilities(get_ffmpeg_capabilities())
+    if missing:
+        print(
+            f"FOUT: ffmpeg ondersteunt {', '.join(missing)} niet; "
+            "installeer een volledige ffmpeg build",
+            flush=True,
+        )
+        sys.exit(1)
+
     if not args.username or not args.password:
         print("Geen credentials gevonden.", flush=True)
         print("Gebruik: python thuis.py --setup", flush=True)
@@ -990,36 +2188,147 @@ Voorbeelden:
         )
         sys.exit(1)
 
+    if args.login:
+        sys.exit(
+            0
+            if refresh_login(args.username, args.password, not args.no_headless)
+            else 1
+        )
+
+    try:
+        blocker = RequestBlocker(thuis_browser.parse_block_types(args.block))
+    except ValueError as e:
+        print(f"FOUT: {e}", flush=True)
+        sys.exit(1)
+    watchdog = BrowserWatchdog(
+        max_rss=int(args.browser_max_rss * 1024**2),
+        max_navigations=args.browser_max_navigations,
+    )
+
+    if args.worker:
+        if args.output:
+            log(
+                "⚠ -o werkt niet met --worker (afleveringen gaan naar media/), genegeerd"
+            )
+        postprocessor = None
+        if args.faststart or args.fragmented:
+            postprocessor = create_postprocessor(
+                args.postprocess_workers, args.validate, None
+            )
+        worker = QueueWorker(
+            JobQueue(Path(args.queue)),
+            args.username,
+            args.password,
+            headless=not args.no_headless,
+            watchdog=watchdog,
+            blocker=blocker,
+            disk=thuis_disk.DiskSpaceScheduler(
+                MEDIA_DIR,
+                headroom=int(args.disk_headroom * thuis_disk.GB),
+                max_wait=args.disk_wait * 60,
+                log=log,
+            ),
+            postprocessor=postprocessor,
+            output_format=args.fragmented,
+            audio_only=args.audio_only,
+        )
+        log(f"Worker {worker.owner} op wachtrij {args.queue}")
+        try:
+            asyncio.run(worker.run())
+        except KeyboardInterrupt:
+            log("Worker gestopt")
+        finally:
+            if postprocessor:
+                postprocessor.close()
+        return
+
     if not args.url:
         parser.print_help()
         sys.exit(1)
 
     url_type = detect_url_type(args.url)
-    output_path = Path(args.output) if args.output else None
-
-    if url_type == "season":
-        success = asyncio.run(
-            download_season(
-                season_url=args.url,
-                username=args.username,
-                password=args.password,
-                start_episode=args.start,
-                force=args.force,
-                headless=not args.no_headless,
-                dry_run=args.dry_run,
-                interactive=args.interactive,
-            )
-        )
+    metrics_file = Path(args.metrics_file) if args.metrics_file else None
+    timings = StageTimer() if args.timings else None
+
+    s3_target = None
+    output_path = None
+    disk = None
+    postprocessor = None
+    if is_s3_url(args.output):
+        # A season always goes into a "directory" below the prefix
+        s3_url = args.output
+        if url_type == "season" and not s3_url.endswith("/"):
+            s3_url += "/"
+        try:
+            s3_target = S3Target(s3_url)
+        except (RuntimeError, ValueError) as e:
+            print(f"FOUT: {e}", flush=True)
+            sys.exit(1)
+        if args.faststart or args.fragmented:
+            log("⚠ --faststart en --fragmented werken niet met S3, genegeerd")
     else:
-        success = asyncio.run(
-            download_video(
-                video_url=args.url,
-                username=args.username,
-                password=args.password,
-                output_path=output_path,
-                headless=not args.no_headless,
-            )
+        output_path = Path(args.output) if args.output else None
+        disk = thuis_disk.DiskSpaceScheduler(
+            output_path.parent if output_path else MEDIA_DIR,
+            headroom=int(args.disk_headroom * thuis_disk.GB),
+            max_wait=args.disk_wait * 60,
+            log=log,
         )
+        if args.faststart or args.fragmented:
+            postprocessor = create_postprocessor(
+                args.postprocess_workers, args.validate, timings
+            )
+
+    metrics.ACTIVE_WORKERS.inc()
+    try:
+        if url_type == "season":
+            success = asyncio.run(
+                download_season(
+                    season_url=args.url,
+                    username=args.username,
+                    password=args.password,
+                    start_episode=args.start,
+                    force=args.force,
+                    headless=not args.no_headless,
+                    dry_run=args.dry_run,
+                    interactive=args.interactive,
+                    metrics_file=metrics_file,
+                    timings=timings,
+                    postprocessor=postprocessor,
+                    output_format=args.fragmented,
+                    audio_only=args.audio_only,
+                    disk=disk,
+                    s3_target=s3_target,
+                    watchdog=watchdog,
+                    blocker=blocker,
+                )
+            )
+        else:
+            success = asyncio.run(
+                download_video(
+                    video_url=args.url,
+                    username=args.username,
+                    password=args.password,
+                    output_path=output_path,
+                    headless=not args.no_headless,
+                    timings=timings,
+                    postprocessor=postprocessor,
+                    output_format=args.fragmented,
+                    audio_only=args.audio_only,
+                    disk=disk,
+                    s3_target=s3_target,
+                    blocker=blocker,
+                )
+            )
+    finally:
+        if postprocessor:
+            postprocessor.close()
+        metrics.ACTIVE_WORKERS.dec()
+        metrics.QUEUE_DEPTH.set(0)
+        if metrics_file:
+            metrics.REGISTRY.write_textfile(metrics_file)
+        if timings:
+            report_timings(timings, args.timings)
 
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,516 @@
+"""Browser management for Thuis.
+
+`thuis.py --browser-daemon` keeps one Chromium running with the VRT MAX
+session restored, reachable over CDP on a local port. CLI runs (including
+the ones the web UI starts) attach to it with connect_over_cdp instead of
+launching their own browser and logging in again; when no daemon is
+listening they launch a browser as before. Within a run, PagePool reuses
+a few prepared pages for all episodes, and BrowserWatchdog restarts a
+launched browser whose memory use keeps growing. RequestBlocker keeps
+images, fonts, player media and trackers from loading at all.
+
+Playwright is imported by the caller; nothing here imports it at module
+level.
+"""
+
+import asyncio
+import os
+import re
+import shutil
+import socket
+import tempfile
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from thuis_cookies import CookieStore
+
+DEFAULT_CDP_PORT = 9223
+# Endpoint of the daemon; "off" disables attaching
+CDP_ENV = "THUIS_BROWSER_CDP"
+
+VIEWPORT = {"width": 1920, "height": 1080}
+
+# How often the daemon syncs its cookies with the cookie store
+KEEPALIVE_INTERVAL = 300
+CONNECT_TIMEOUT = 5000
+
+# Recycle the browser above this memory use or number of navigations
+DEFAULT_MAX_RSS = 1024**3
+DEFAULT_MAX_NAVIGATIONS = 150
+# Process names of Chromium and its helpers (renderers, GPU, zygote)
+BROWSER_PROCESS_NAMES = ("chrom", "headless_shell")
+
+# Request blocking during discovery and resolve
+BLOCKABLE = ("image", "font", "media", "analytics")
+ANALYTICS_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "hotjar.com",
+    "scorecardresearch.com",
+    "chartbeat.com",
+    "chartbeat.net",
+    "cxense.com",
+    "nr-data.net",
+)
+# Segments and progressive files fetched by the web player (via XHR/MSE)
+MEDIA_URL = re.compile(r"\.(ts|m4s|m4a|m4v|aac|mp4|webm)(\?|$)", re.IGNORECASE)
+# Never blocked: the stream redirect is read from these responses
+ALWAYS_ALLOWED = ("vualto", "media-services-public.vrt.be")
+# Rough sizes of what a blocked request would have downloaded
+ESTIMATED_SIZE = {
+    "image": 60 * 1024,
+    "font": 40 * 1024,
+    "media": 1024**2,
+    "analytics": 30 * 1024,
+}
+
+# Navigations after which a pooled page is replaced by a fresh one
+PAGE_MAX_USES = 20
+HEALTH_CHECK_TIMEOUT = 5.0
+
+
+def cdp_endpoint() -> Optional[str]:
+    """The daemon endpoint to try, None when attaching is disabled."""
+    endpoint = os.getenv(CDP_ENV, "").strip()
+    if endpoint.lower() == "off":
+        return None
+    return endpoint or f"http://127.0.0.1:{DEFAULT_CDP_PORT}"
+
+
+def endpoint_reachable(endpoint: str, timeout: float = 0.5) -> bool:
+    """Cheap TCP check, so a missing daemon costs milliseconds, not a timeout."""
+    parsed = urlparse(endpoint)
+    try:
+        with socket.create_connection(
+            (parsed.hostname or "127.0.0.1", parsed.port or DEFAULT_CDP_PORT),
+            timeout=timeout,
+        ):
+            return True
+    except OSError:
+        return False
+
+
+class BrowserSession:
+    """Browser and context used by one run.
+
+    Args:
+        browser: Playwright browser (launched or connected over CDP)
+        context: Context to open pages in
+        attached: True when connected to the daemon; close() then only
+            closes this run's pages and disconnects
+    """
+
+    def __init__(
+        self,
+        browser,
+        context,
+        attached: bool = False,
+        relaunch: Optional[Callable[[], Awaitable[Tuple[object, object]]]] = None,
+    ):
+        self.browser = browser
+        self.context = context
+        self.attached = attached
+        self.relaunch = relaunch
+        self._pages: List = []
+
+    async def new_page(self):
+        page = await self.context.new_page()
+        if self.attached:
+            # Context options of the daemon do not apply to other clients
+            await page.set_viewport_size(VIEWPORT)
+        self._pages.append(page)
+        return page
+
+    async def close(self):
+        if self.attached:
+            for page in self._pages:
+                if not page.is_closed():
+                    await page.close()
+        self._pages.clear()
+        await self.browser.close()
+
+    async def restart(self):
+        """Replace the browser with a fresh one that has the same cookies.
+
+        Only for launched browsers; an attached run just closes its pages,
+        the daemon's memory is not this run's to reclaim.
+        """
+        if self.attached or self.relaunch is None:
+            for page in self._pages:
+                if not page.is_closed():
+                    await page.close()
+            self._pages.clear()
+            return
+
+        cookies = await self.context.cookies()
+        self._pages.clear()
+        await self.browser.close()
+        self.browser, self.context = await self.relaunch()
+        if cookies:
+            await self.context.add_cookies(cookies)
+
+
+async def open_session(
+    playwright,
+    headless: bool = True,
+    user_agent: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    log: Callable[[str], None] = print,
+) -> BrowserSession:
+    """Attach to the browser daemon, or launch a browser if there is none."""
+    endpoint = endpoint or cdp_endpoint()
+    if endpoint and endpoint_reachable(endpoint):
+        try:
+            browser = await playwright.chromium.connect_over_cdp(
+                endpoint, timeout=CONNECT_TIMEOUT
+            )
+            if browser.contexts:
+                log(f"Verbonden met browser daemon ({endpoint})")
+                return BrowserSession(browser, browser.contexts[0], attached=True)
+            await browser.close()
+        except Exception as e:
+            log(f"⚠ Browser daemon niet bruikbaar ({e}), eigen browser starten")
+
+    async def launch():
+        browser = await playwright.chromium.launch(headless=headless)
+        context = await browser.new_context(viewport=VIEWPORT, user_agent=user_agent)
+        return browser, context
+
+    browser, context = await launch()
+    return BrowserSession(browser, context, relaunch=launch)
+
+
+async def sync_cookies(context, store: CookieStore):
+    """Two-way sync: the context's cookies into the store and back.
+
+    Picks up a session another process refreshed while keeping the
+    daemon's own refreshed cookies.
+    """
+    store.update(await context.cookies())
+    cookies = store.load()
+    if cookies:
+        await context.add_cookies(cookies)
+
+
+async def run_daemon(
+    store: CookieStore,
+    port: int = DEFAULT_CDP_PORT,
+    headless: bool = True,
+    user_agent: Optional[str] = None,
+    keepalive: float = KEEPALIVE_INTERVAL,
+    log: Callable[[str], None] = print,
+):
+    """Run Chromium with the stored session until interrupted.
+
+    The default context of a persistent profile is what CDP clients see as
+    browser.contexts[0], so the cookies restored here are shared by every
+    run that attaches.
+    """
+    from playwright.async_api import async_playwright
+
+    profile = tempfile.mkdtemp(prefix="thuis-browser-")
+    args = [f"--remote-debugging-port={port}"]
+    if user_agent:
+        args.append(f"--user-agent={user_agent}")
+
+    try:
+        async with async_playwright() as p:
+            context = await p.chromium.launch_persistent_context(
+                profile,
+                headless=headless,
+                viewport=VIEWPORT,
+                user_agent=user_agent,
+                args=args,
+            )
+            try:
+                await sync_cookies(context, store)
+                log(f"Browser daemon actief op http://127.0.0.1:{port}")
+                log("Stoppen met Ctrl+C")
+                while True:
+                    await asyncio.sleep(keepalive)
+                    await sync_cookies(context, store)
+            finally:
+                store.update(await context.cookies())
+                await context.close()
+    finally:
+        shutil.rmtree(profile, ignore_errors=True)
+
+
+class PagePool:
+    """Pages prepared once and reused by navigating them.
+
+    Creating a page and injecting the stealth scripts for every episode
+    costs time and starts a new renderer each time. Pooled pages keep their
+    init scripts across navigations; a page that fails the health check or
+    reached max_uses is closed and replaced.
+
+    Args:
+        session: BrowserSession to open pages in
+        size: Number of pages in the pool
+        max_uses: Uses after which a page is recycled
+        prepare: Async callback run once for every new page
+    """
+
+    def __init__(
+        self,
+        session: BrowserSession,
+        size: int = 1,
+        max_uses: int = PAGE_MAX_USES,
+        prepare: Optional[Callable[[object], Awaitable[None]]] = None,
+    ):
+        self.session = session
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.prepare = prepare
+        self.created = 0
+        self.recycled = 0
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._open = 0
+        self._uses: Dict[int, int] = {}
+        self._listeners: Dict[int, Dict[str, Callable]] = {}
+
+    async def _new_page(self):
+        page = await self.session.new_page()
+        if self.prepare:
+            await self.prepare(page)
+        self._open += 1
+        self.created += 1
+        self._uses[id(page)] = 0
+        return page
+
+    async def _discard(self, page):
+        self._open -= 1
+        self._uses.pop(id(page), None)
+        if not page.is_closed():
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+    async def _healthy(self, page) -> bool:
+        if page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(page.evaluate("1"), HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def acquire(self, listeners: Optional[Dict[str, Callable]] = None):
+        """A ready page, with listeners (event -> handler) attached.
+
+        Waits for a page to be released when all size pages are in use.
+        """
+        if self._idle.empty() and self._open < self.size:
+            page = await self._new_page()
+        else:
+            page = await self._idle.get()
+            if not await self._healthy(page):
+                self.recycled += 1
+                await self._discard(page)
+                page = await self._new_page()
+
+        listeners = listeners or {}
+        for event, handler in listeners.items():
+            page.on(event, handler)
+        self._listeners[id(page)] = listeners
+        self._uses[id(page)] += 1
+        return page
+
+    async def release(self, page):
+        """Return a page: detach its listeners and park it on about:blank."""
+        for event, handler in self._listeners.pop(id(page), {}).items():
+            page.remove_listener(event, handler)
+
+        if page.is_closed() or self._uses.get(id(page), 0) >= self.max_uses:
+            if not page.is_closed():
+                self.recycled += 1
+            await self._discard(page)
+            return
+        try:
+            # Stops the player and frees the episode page's memory
+            await page.goto("about:blank")
+        except Exception:
+            await self._discard(page)
+            return
+        self._idle.put_nowait(page)
+
+    async def close(self):
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
+
+
+def parse_block_types(value: Optional[str]) -> Tuple[str, ...]:
+    """--block value ("image,font" or "none") to a tuple of categories.
+
+    Raises:
+        ValueError: On an unknown category
+    """
+    if not value or value.strip().lower() == "none":
+        return ()
+    types = tuple(t.strip().lower() for t in value.split(",") if t.strip())
+    unknown = [t for t in types if t not in BLOCKABLE]
+    if unknown:
+        raise ValueError(
+            f"Onbekend type voor --block: {', '.join(unknown)} "
+            f"(kies uit {', '.join(BLOCKABLE)} of none)"
+        )
+    return types
+
+
+class RequestBlocker:
+    """Playwright route handler that aborts non-essential requests.
+
+    Episode pages are loaded until the network is idle, so every image,
+    font, tracker and player segment would be fetched before the stream
+    redirect is available. Blocked requests are counted per category for
+    the report at the end of the run.
+
+    Args:
+        types: Categories to block, a subset of BLOCKABLE
+    """
+
+    def __init__(self, types: Tuple[str, ...] = BLOCKABLE):
+        self.types = tuple(types)
+        self.blocked: Dict[str, int] = {}
+
+    def category(self, url: str, resource_type: str) -> Optional[str]:
+        """The blocked category a request falls in, None to let it through."""
+        if any(allowed in url for allowed in ALWAYS_ALLOWED):
+            return None
+        host = urlparse(url).hostname or ""
+        if "analytics" in self.types and any(
+            host == h or host.endswith("." + h) for h in ANALYTICS_HOSTS
+        ):
+            return "analytics"
+        if resource_type in ("image", "font", "media") and resource_type in self.types:
+            return resource_type
+        if "media" in self.types and MEDIA_URL.search(urlparse(url).path):
+            return "media"
+        return None
+
+    async def handle(self, route):
+        request = route.request
+        category = self.category(request.url, request.resource_type)
+        if category is None:
+            await route.continue_()
+            return
+        self.blocked[category] = self.blocked.get(category, 0) + 1
+        await route.abort("blockedbyclient")
+
+    async def attach(self, context):
+        """Route every request of the context through the blocker."""
+        if self.types:
+            await context.route("**/*", self.handle)
+
+    @property
+    def saved_bytes(self) -> int:
+        return sum(ESTIMATED_SIZE[c] * n for c, n in self.blocked.items())
+
+    def report(self) -> str:
+        total = sum(self.blocked.values())
+        if not total:
+            return "Geblokkeerd: geen verzoeken"
+        counts = ", ".join(f"{c} {n}" for c, n in sorted(self.blocked.items()))
+        return (
+            f"Geblokkeerd: {total} verzoeken ({counts}), "
+            f"~{self.saved_bytes / 1024**2:.1f} MB bespaard (schatting)"
+        )
+
+
+def _process_table(proc: Path) -> Dict[int, Tuple[int, str]]:
+    """pid -> (parent pid, command name) from /proc/<pid>/stat."""
+    table = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The command name is in parentheses and may itself contain spaces
+        name = stat[stat.index("(") + 1 : stat.rindex(")")]
+        fields = stat[stat.rindex(")") + 2 :].split()
+        table[int(entry.name)] = (int(fields[1]), name)
+    return table
+
+
+def process_tree_rss(
+    root_pid: Optional[int] = None,
+    names: Tuple[str, ...] = BROWSER_PROCESS_NAMES,
+    proc: Path = Path("/proc"),
+) -> Optional[int]:
+    """Resident memory in bytes of the browser processes below root_pid.
+
+    Sums the RSS of every descendant whose name starts with one of names;
+    pages shared between Chromium processes are counted once per process,
+    so this errs on the high side. None where /proc is not available.
+    """
+    if not proc.is_dir():
+        return None
+    root_pid = os.getpid() if root_pid is None else root_pid
+    table = _process_table(proc)
+
+    children: Dict[int, List[int]] = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    pending = list(children.get(root_pid, []))
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        if not table[pid][1].startswith(names):
+            continue
+        try:
+            resident = int((proc / str(pid) / "statm").read_text().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        total += resident * page_size
+    return total
+
+
+class BrowserWatchdog:
+    """Decides when a long run should restart its browser.
+
+    Checked between episodes, so a restart never interrupts a page that is
+    resolving; ffmpeg transfers run outside the browser and are unaffected.
+
+    Args:
+        max_rss: Bytes of browser memory that trigger a restart (0: off)
+        max_navigations: Navigations that trigger a restart (0: off)
+        sample: Returns the current browser memory use in bytes
+    """
+
+    def __init__(
+        self,
+        max_rss: int = DEFAULT_MAX_RSS,
+        max_navigations: int = DEFAULT_MAX_NAVIGATIONS,
+        sample: Callable[[], Optional[int]] = process_tree_rss,
+    ):
+        self.max_rss = max_rss
+        self.max_navigations = max_navigations
+        self.sample = sample
+        self.navigations = 0
+        self.rss: Optional[int] = None
+        self.restarts = 0
+
+    def navigated(self, count: int = 1):
+        self.navigations += count
+
+    def check(self) -> Optional[str]:
+        """Reason to restart now, or None."""
+        self.rss = self.sample()
+        if self.max_rss and self.rss and self.rss >= self.max_rss:
+            return f"geheugen {self.rss / 1024**2:.0f} MB"
+        if self.max_navigations and self.navigations >= self.max_navigations:
+            return f"{self.navigations} navigaties"
+        return None
+
+    def reset(self):
+        self.navigations = 0
+        self.restarts += 1
@@ -0,0 +1,265 @@
+"""Shared cookie store for Thuis.
+
+cookies.json is used by the CLI, the web UI and every download they start,
+possibly at the same time. CookieStore serialises access with a lock file
+next to it, writes through a temp file and os.replace (readers never see a
+half-written file) and keeps the parsed cookies in memory until the file's
+mtime changes. Cookies whose expiry has passed are left out on load.
+
+Only uses the standard library, so app.py can import it cheaply.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# How long to wait for another process to release the lock
+LOCK_TIMEOUT = 10.0
+LOCK_POLL_INTERVAL = 0.05
+
+
+# Cookies that mean the cookie consent dialog was answered: the consent
+# platform's own, and the marker Thuis adds after clicking it
+CONSENT_COOKIES = ("consentUUID", "euconsent-v2")
+CONSENT_MARKER = "thuis_consent"
+CONSENT_DOMAIN = ".vrt.be"
+CONSENT_MAX_AGE = 180 * 24 * 3600
+
+
+class LockTimeout(TimeoutError):
+    """A lock file stayed locked by another process for too long."""
+
+
+class CookieLockTimeout(LockTimeout):
+    """The cookie file stayed locked by another process for too long."""
+
+
+def cookie_key(cookie: Dict) -> Tuple[str, str, str]:
+    """Identity of a cookie, as browsers use it: name, domain and path."""
+    return (cookie.get("name", ""), cookie.get("domain", ""), cookie.get("path", "/"))
+
+
+def is_expired(cookie: Dict, now: Optional[float] = None) -> bool:
+    """True once a persistent cookie is past its expiry.
+
+    Playwright marks session cookies with expires -1; those and cookies
+    without an expires field never expire here.
+    """
+    expires = cookie.get("expires")
+    if expires is None or expires < 0:
+        return False
+    return expires <= (time.time() if now is None else now)
+
+
+def has_consent(cookies: List[Dict], now: Optional[float] = None) -> bool:
+    """True when the cookies record an answer to the consent dialog."""
+    names = CONSENT_COOKIES + (CONSENT_MARKER,)
+    return any(c.get("name") in names and not is_expired(c, now) for c in cookies)
+
+
+def consent_expiry(cookies: List[Dict], now: Optional[float] = None) -> float:
+    """When a consent marker set now should expire.
+
+    With the consent platform's own cookies, so the dialog is expected
+    again as soon as the platform shows it again; at most CONSENT_MAX_AGE.
+    """
+    expiries = [
+        c["expires"]
+        for c in cookies
+        if c.get("name") in CONSENT_COOKIES and c.get("expires", -1) >= 0
+    ]
+    return min(expiries + [(time.time() if now is None else now) + CONSENT_MAX_AGE])
+
+
+def consent_cookie(
+    decision: str, now: Optional[float] = None, expires: Optional[float] = None
+) -> Dict:
+    """Marker cookie that records the consent decision with the session.
+
+    Args:
+        expires: Expiry (epoch seconds), default CONSENT_MAX_AGE from now
+    """
+    if expires is None:
+        expires = (time.time() if now is None else now) + CONSENT_MAX_AGE
+    return {
+        "name": CONSENT_MARKER,
+        "value": decision,
+        "domain": CONSENT_DOMAIN,
+        "path": "/",
+        "expires": expires,
+        "httpOnly": False,
+        "secure": True,
+        "sameSite": "Lax",
+    }
+
+
+def _try_lock(f, exclusive: bool) -> bool:
+    """Take the lock without blocking; False if another process holds it."""
+    if os.name == "nt":
+        # msvcrt only has exclusive locks on a byte range; the caller polls
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+    try:
+        fcntl.flock(f.fileno(), flags)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _unlock(f):
+    if os.name == "nt":
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def file_lock(
+    lock_path: Path,
+    exclusive: bool = True,
+    timeout: float = LOCK_TIMEOUT,
+    error: type = LockTimeout,
+) -> Iterator[None]:
+    """Hold a lock file, shared or exclusive, polling until timeout.
+
+    Raises:
+        error: Another process kept the lock for timeout seconds
+    """
+    lock_path = Path(lock_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+") as f:
+        deadline = time.monotonic() + timeout
+        while not _try_lock(f, exclusive):
+            if time.monotonic() >= deadline:
+                raise error(f"{lock_path} is vergrendeld door een ander proces")
+            time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+class CookieStore:
+    """Locked, atomically written cookies.json with an in-memory cache.
+
+    Args:
+        path: The cookie file
+        lock_timeout: Seconds to wait for a lock held by another process
+    """
+
+    def __init__(self, path: Path, lock_timeout: float = LOCK_TIMEOUT):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(f"{self.path.name}.lock")
+        self.lock_timeout = lock_timeout
+        self._cache: Optional[List[Dict]] = None
+        self._cache_key: Optional[Tuple[int, int]] = None
+
+    @contextmanager
+    def locked(self, exclusive: bool = True) -> Iterator[None]:
+        """Hold the lock file; shared for readers, exclusive for writers."""
+        with file_lock(
+            self.lock_path, exclusive, self.lock_timeout, error=CookieLockTimeout
+        ):
+            yield
+
+    def _stat_key(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read(self) -> Optional[List[Dict]]:
+        """All cookies in the file, from memory while its mtime is unchanged."""
+        key = self._stat_key()
+        if key is None:
+            self._cache, self._cache_key = None, None
+            return None
+        if key != self._cache_key:
+            with open(self.path) as f:
+                self._cache = json.load(f)
+            self._cache_key = key
+        return self._cache
+
+    def _write(self, cookies: List[Dict]):
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(cookies, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._cache = list(cookies)
+        self._cache_key = self._stat_key()
+
+    def load(self, include_expired: bool = False) -> Optional[List[Dict]]:
+        """Stored cookies, None if there is no cookie file.
+
+        Expired cookies are left out unless include_expired is set.
+        """
+        # Unchanged file: no lock or read needed
+        key = self._stat_key()
+        if key is None:
+            return None
+        if key != self._cache_key:
+            with self.locked(exclusive=False):
+                self._read()
+        cookies = self._cache or []
+        if include_expired:
+            return list(cookies)
+        now = time.time()
+        return [c for c in cookies if not is_expired(c, now)]
+
+    def save(self, cookies: List[Dict]):
+        """Replace all stored cookies."""
+        with self.locked():
+            self._write(cookies)
+
+    def update(self, cookies: List[Dict]):
+        """Merge fresh cookies into the store and drop expired ones.
+
+        Cookies are matched on name, domain and path, so a worker refreshing
+        its session does not discard cookies another process added.
+        """
+        with self.locked():
+            merged = {cookie_key(c): c for c in self._read() or []}
+            merged.update((cookie_key(c), c) for c in cookies)
+            now = time.time()
+            self._write([c for c in merged.values() if not is_expired(c, now)])
+
+    def clear(self):
+        with self.locked():
+            self.path.unlink(missing_ok=True)
+            self._cache, self._cache_key = None, None
+
+    def expires_at(self) -> Optional[float]:
+        """Earliest expiry (epoch seconds) of the stored persistent cookies."""
+        expiries = [
+            c["expires"] for c in self.load() or [] if c.get("expires", -1) >= 0
+        ]
+        return min(expiries) if expiries else None
+
+
+_stores: Dict[Path, CookieStore] = {}
+
+
+def get_store(path: Path) -> CookieStore:
+    """The CookieStore for path, shared within the process."""
+    path = Path(path).absolute()
+    if path not in _stores:
+        _stores[path] = CookieStore(path)
+    return _stores[path]
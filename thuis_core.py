@@ -0,0 +1,229 @@
+"""Core logic of Thuis without third-party dependencies.
+
+URL parsing, filename generation, episode filtering and link discovery.
+Importing this module is cheap, so the web app and quick CLI paths can use
+it without loading Playwright or requests.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+BASE_URL = "https://www.vrt.be"
+MEDIA_SERVICES_URL = "https://media-services-public.vrt.be"
+
+
+def detect_login_success(url: str) -> bool:
+    """Detect if login was successful based on URL"""
+    return "login" not in url.lower()
+
+
+def detect_url_type(url: str) -> str:
+    """Detect if URL is a single episode, season, or trailer.
+
+    Returns: 'single', 'season', or 'trailer'
+    """
+    url = url.rstrip("/")
+
+    if "/trailer/" in url:
+        return "trailer"
+
+    url_parts = url.split("/")
+
+    last_part = url_parts[-1]
+    second_last = url_parts[-2] if len(url_parts) >= 2 else ""
+
+    if re.match(r"^[a-z]+-s\d+[a]\d+$", last_part):
+        return "single"
+
+    if last_part.isdigit():
+        return "season"
+
+    return "single"
+
+
+def parse_episode_info(url: str) -> Dict:
+    """Parse episode information from URL.
+
+    Returns dict with keys: program, season, episode, type
+    """
+    url = url.rstrip("/")
+
+    if "?" in url:
+        url, query = url.split("?", 1)
+        match = re.search(r"seizoen-(\d+)", query)
+        if match:
+            url_parts = url.rstrip("/").split("/")
+            program = (
+                url_parts[-1]
+                if url_parts[-1]
+                else (url_parts[-2] if len(url_parts) >= 2 else "video")
+            )
+            result = {
+                "program": program,
+                "season": match.group(1),
+                "episode": "",
+                "type": "episode",
+            }
+            return result
+
+    url_parts = url.split("/")
+
+    result = {"program": "", "season": "", "episode": "", "type": "episode"}
+
+    if "/trailer/" in url:
+        result["type"] = "trailer"
+        for part in reversed(url_parts):
+            if part and "trailer" not in part and part != "a-z" and part != "vrtmax":
+                result["program"] = part.replace("-trailer", "")
+                break
+        return result
+
+    last_part = url_parts[-1]
+    season_part = url_parts[-2] if len(url_parts) >= 2 else ""
+
+    match = re.match(r"^([a-z-]+)-s(\d+)a(\d+)$", last_part)
+    if match:
+        result["program"] = match.group(1)
+        result["season"] = match.group(2)
+        result["episode"] = match.group(3)
+    else:
+        if last_part.isdigit():
+            result["program"] = url_parts[-2] if len(url_parts) >= 2 else "video"
+            result["season"] = last_part
+        else:
+            result["program"] = last_part
+
+    return result
+
+
+# Video downloads are mp4, --audio-only downloads m4a
+EPISODE_EXTENSIONS = ("mp4", "m4a")
+
+
+def generate_filename(info: Dict, extension: str = "mp4") -> str:
+    """Generate filename from episode info.
+
+    Format: {program}-s{season}a{episode}.{extension}
+    """
+    program = info.get("program", "video")
+
+    if info.get("type") == "trailer":
+        return f"{program}-trailer.{extension}"
+
+    season = info.get("season", "")
+    episode = info.get("episode", "")
+
+    if season and episode:
+        return f"{program}-s{season}a{episode}.{extension}"
+
+    return f"{program}.{extension}"
+
+
+def filter_episodes_to_download(
+    all_episodes: List[str], existing_files: List[str] = None, start_episode: int = None
+) -> List[str]:
+    """Filter episodes to download based on existing files and start episode.
+
+    Args:
+        all_episodes: List of episode filenames
+        existing_files: List of already downloaded filenames
+        start_episode: Episode number to start from
+
+    Returns:
+        List of episodes to download
+    """
+    existing = set(existing_files) if existing_files else set()
+
+    episodes_to_download = []
+
+    for episode in all_episodes:
+        if episode in existing:
+            continue
+
+        if start_episode:
+            match = re.search(r"a(\d+)\.(?:mp4|m4a)$", episode)
+            if match:
+                ep_num = int(match.group(1))
+                if ep_num < start_episode:
+                    continue
+
+        episodes_to_download.append(episode)
+
+    return episodes_to_download
+
+
+EPISODE_HREF_PATTERN = re.compile(r"[a-z]+-s\d+a\d+")
+
+
+# Returns the raw href of every anchor in one round-trip
+ALL_HREFS_SCRIPT = "() => Array.from(document.querySelectorAll('a[href]'), a => a.getAttribute('href'))"
+
+
+def normalize_episode_url(href: str) -> str:
+    """Make an episode href absolute, without query string or fragment."""
+    href = href.split("#", 1)[0].split("?", 1)[0]
+    if href.startswith("//"):
+        href = "https:" + href
+    elif href.startswith("/"):
+        href = BASE_URL + href
+    if not href.endswith("/"):
+        href += "/"
+    return href
+
+
+def extract_episode_urls(hrefs: Iterable[Optional[str]]) -> List[str]:
+    """Filter, normalize and deduplicate episode URLs in a single pass.
+
+    Args:
+        hrefs: Raw href attributes of all anchors on a page
+
+    Returns:
+        Sorted list of unique absolute episode URLs
+    """
+    episode_urls = set()
+
+    for href in hrefs:
+        if href and "/vrtmax/a-z/" in href and EPISODE_HREF_PATTERN.search(href):
+            episode_urls.add(normalize_episode_url(href))
+
+    return sorted(episode_urls)
+
+
+def discover_season_episodes(page) -> List[str]:
+    """Discover all episode URLs from a season page.
+
+    Args:
+        page: Page object with a synchronous query_selector_all
+
+    Returns:
+        List of episode URLs
+    """
+    links = page.query_selector_all("a")
+    return extract_episode_urls(link.get_attribute("href") for link in links)
+
+
+def build_cookie_header(cookies: List[Dict]) -> str:
+    """Build a Cookie header value from Playwright cookies."""
+    return "; ".join([f"{c.get('name', '')}={c.get('value', '')}" for c in cookies])
+
+
+def get_hls_url(data: Dict) -> Optional[str]:
+    """Return the HLS target URL from a media-services response."""
+    for tu in data.get("targetUrls", []):
+        if tu.get("type") == "hls":
+            return tu.get("url")
+    return None
+
+
+def parse_progress_time(value: str) -> Optional[float]:
+    """Seconds from an ffmpeg -progress out_time value (HH:MM:SS.micro).
+
+    Returns:
+        None for N/A, which ffmpeg reports before the first packet
+    """
+    match = re.fullmatch(r"(-?\d+):(\d{2}):(\d{2}(?:\.\d+)?)", value.strip())
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return max(int(hours) * 3600 + int(minutes) * 60 + float(seconds), 0.0)
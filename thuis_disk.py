@@ -0,0 +1,118 @@
+"""Disk space checks for Thuis downloads.
+
+Episode sizes are estimated from the HLS variant bandwidth and playlist
+duration. Before a transfer starts the scheduler reserves the estimate and
+waits (pausing the queue) until the download fits with the configured
+headroom left over.
+"""
+
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+GB = 1024**3
+
+DEFAULT_HEADROOM = 2 * GB
+DEFAULT_MAX_WAIT = 30 * 60
+POLL_INTERVAL = 30
+
+# Below this much free space a failed ffmpeg run is treated as disk full
+DISK_FULL_BYTES = 64 * 1024**2
+
+# Used for audio renditions, which have no BANDWIDTH of their own
+DEFAULT_AUDIO_BANDWIDTH = 192_000
+
+
+def free_bytes(path: Path) -> int:
+    """Free space on the filesystem of path (or its nearest existing parent)."""
+    path = Path(path).absolute()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return shutil.disk_usage(path).free
+
+
+def estimate_size(bandwidth: int, duration: float) -> int:
+    """Bytes for duration seconds at bandwidth bits per second."""
+    return int(bandwidth / 8 * duration)
+
+
+def format_size(size: float) -> str:
+    return f"{size / GB:.2f} GB"
+
+
+class DiskSpaceScheduler:
+    """Admits downloads only while they fit on disk with headroom to spare.
+
+    Args:
+        directory: Download directory
+        headroom: Bytes that must stay free after a download
+        max_wait: Seconds to pause for space before giving up
+        poll_interval: Seconds between free space checks while paused
+        log: Function for status messages
+        sleep: Injected for tests
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        headroom: int = DEFAULT_HEADROOM,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        poll_interval: float = POLL_INTERVAL,
+        log: Callable[[str], None] = print,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.directory = Path(directory)
+        self.headroom = headroom
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.log = log
+        self.sleep = sleep
+        self.reserved = 0
+
+    @property
+    def abort_below(self) -> int:
+        """Free space at which a running transfer is stopped."""
+        return max(self.headroom // 2, DISK_FULL_BYTES)
+
+    def available(self) -> int:
+        """Free bytes not yet reserved and not part of the headroom."""
+        return free_bytes(self.directory) - self.reserved - self.headroom
+
+    def check_total(self, estimate: int, count: int):
+        """Warn up front when the remaining episodes will not all fit."""
+        total = estimate * count
+        if total > self.available():
+            self.log(
+                f"⚠ Geschat {format_size(total)} nodig voor {count} afleveringen, "
+                f"{format_size(max(self.available(), 0))} beschikbaar; "
+                "downloads pauzeren wanneer de schijf vol raakt"
+            )
+
+    def reserve(self, estimate: Optional[int]) -> bool:
+        """Wait until estimate bytes fit, then reserve them.
+
+        Returns:
+            False if there was still not enough space after max_wait
+        """
+        estimate = estimate or 0
+        waited = 0.0
+        while self.available() < estimate:
+            if waited >= self.max_wait:
+                self.log(
+                    f"✗ Onvoldoende schijfruimte: {format_size(estimate)} nodig, "
+                    f"{format_size(max(self.available(), 0))} beschikbaar"
+                )
+                return False
+            if waited == 0:
+                self.log(
+                    f"⏸ Wachten op schijfruimte ({format_size(estimate)} nodig, "
+                    f"{format_size(max(self.available(), 0))} beschikbaar)"
+                )
+            self.sleep(self.poll_interval)
+            waited += self.poll_interval
+        self.reserved += estimate
+        return True
+
+    def release(self, estimate: Optional[int]):
+        self.reserved = max(self.reserved - (estimate or 0), 0)
@@ -0,0 +1,178 @@
+"""ffmpeg capability probe for Thuis.
+
+Records the ffmpeg version, its supported protocols and demuxers and whether
+ffprobe is available. The result is cached on disk, keyed by the resolved
+binary path and mtime, so batch runs do not start ffmpeg just to learn
+something that only changes when ffmpeg itself is replaced.
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CAPABILITIES_FILE = Path(__file__).parent / ".ffmpeg-capabilities.json"
+
+# Protocols and demuxers needed to download VRT MAX HLS streams
+REQUIRED_PROTOCOLS = ("https",)
+REQUIRED_DEMUXERS = ("hls",)
+
+
+def _run(cmd: List[str]) -> str:
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    return result.stdout if result.returncode == 0 else ""
+
+
+def _binary_key(path: Optional[str]) -> Optional[Dict]:
+    """Resolved path and mtime of a binary, used as cache key."""
+    if not path:
+        return None
+    resolved = os.path.realpath(path)
+    try:
+        mtime = os.stat(resolved).st_mtime
+    except OSError:
+        return None
+    return {"path": resolved, "mtime": mtime}
+
+
+def parse_version(output: str) -> Optional[str]:
+    """Version string from the first line of `ffmpeg -version`."""
+    match = re.match(r"\S+ version (\S+)", output)
+    return match.group(1) if match else None
+
+
+def version_tuple(version: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(major, minor) of a release version, None for git builds like N-1234."""
+    match = re.match(r"n?(\d+)\.(\d+)", version or "")
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def parse_protocols(output: str) -> List[str]:
+    """Input protocols from `ffmpeg -protocols`."""
+    protocols = []
+    section = None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.endswith(":") and line[:-1] in ("Input", "Output"):
+            section = line[:-1]
+        elif section == "Input" and line:
+            protocols.append(line)
+    return sorted(set(protocols))
+
+
+def parse_demuxers(output: str) -> List[str]:
+    """Demuxer names from `ffmpeg -demuxers`."""
+    demuxers = set()
+    for line in output.splitlines():
+        match = re.match(r"\s*D\S*\s+(\S+)\s", line)
+        if match and match.group(1) != "=":
+            demuxers.update(match.group(1).split(","))
+    return sorted(demuxers)
+
+
+def run_probe(ffmpeg: str, ffprobe: Optional[str]) -> Dict:
+    """Start ffmpeg to collect its capabilities (uncached)."""
+    return {
+        "version": parse_version(_run([ffmpeg, "-hide_banner", "-version"])),
+        "protocols": parse_protocols(_run([ffmpeg, "-hide_banner", "-protocols"])),
+        "demuxers": parse_demuxers(_run([ffmpeg, "-hide_banner", "-demuxers"])),
+        "ffprobe": ffprobe,
+    }
+
+
+def _load_cache(path: Path) -> Dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(path: Path, cache: Dict):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
+
+def probe_ffmpeg(
+    binary: str = "ffmpeg", cache_file: Optional[Path] = CAPABILITIES_FILE
+) -> Optional[Dict]:
+    """Capabilities of the ffmpeg on PATH, from cache when still valid.
+
+    Args:
+        binary: ffmpeg executable name or path
+        cache_file: JSON cache location, None disables caching
+
+    Returns:
+        Dict with path, version, protocols, demuxers and ffprobe (path or
+        None), or None if ffmpeg is not installed
+    """
+    key = _binary_key(shutil.which(binary))
+    if key is None:
+        return None
+    ffprobe_key = _binary_key(
+        shutil.which("ffprobe", path=os.path.dirname(key["path"]))
+        or shutil.which("ffprobe")
+    )
+
+    cache = _load_cache(cache_file) if cache_file else {}
+    entry = cache.get(key["path"])
+    if (
+        entry
+        and entry.get("mtime") == key["mtime"]
+        and entry.get("ffprobe_key") == ffprobe_key
+    ):
+        return entry
+
+    entry = run_probe(key["path"], ffprobe_key["path"] if ffprobe_key else None)
+    if not entry["version"]:
+        return None
+    entry.update(key)
+    entry["ffprobe_key"] = ffprobe_key
+
+    if cache_file:
+        cache[key["path"]] = entry
+        _save_cache(cache_file, cache)
+    return entry
+
+
+def missing_capabilities(capabilities: Dict) -> List[str]:
+    """Required protocols/demuxers this ffmpeg build lacks."""
+    missing = [
+        f"protocol {name}"
+        for name in REQUIRED_PROTOCOLS
+        if name not in capabilities.get("protocols", [])
+    ]
+    missing += [
+        f"demuxer {name}"
+        for name in REQUIRED_DEMUXERS
+        if name not in capabilities.get("demuxers", [])
+    ]
+    return missing
+
+
+def input_options(capabilities: Optional[Dict]) -> List[str]:
+    """HTTP input options supported by this ffmpeg build.
+
+    -reconnect_on_network_error exists since ffmpeg 4.4; git builds without
+    a release number are assumed to be recent.
+    """
+    options = [
+        "-reconnect",
+        "1",
+        "-reconnect_streamed",
+        "1",
+        "-reconnect_delay_max",
+        "5",
+    ]
+    version = version_tuple(capabilities.get("version")) if capabilities else None
+    if capabilities and (version is None or version >= (4, 4)):
+        options.extend(["-reconnect_on_network_error", "1"])
+    return options
@@ -0,0 +1,107 @@
+"""HLS playlist parsing for Thuis.
+
+Reads master playlists (variants and alternative renditions) and media
+playlists (segment durations). Only uses the standard library; fetching is
+left to the caller.
+"""
+
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+_ATTRIBUTE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_attributes(value: str) -> Dict[str, str]:
+    """Parse an attribute list like BANDWIDTH=800000,CODECS="avc1,mp4a"."""
+    return {
+        key: raw[1:-1] if raw.startswith('"') else raw
+        for key, raw in _ATTRIBUTE.findall(value)
+    }
+
+
+def is_master_playlist(text: str) -> bool:
+    return "#EXT-X-STREAM-INF" in text
+
+
+def parse_master_playlist(text: str, base_url: str = "") -> Dict[str, List[Dict]]:
+    """Variants (#EXT-X-STREAM-INF) and renditions (#EXT-X-MEDIA).
+
+    URIs are made absolute against base_url.
+
+    Returns:
+        {"variants": [{bandwidth, average_bandwidth, resolution, codecs,
+                       audio, uri}],
+         "media": [{type, group_id, name, language, default, uri}]}
+    """
+    variants = []
+    media = []
+    pending: Optional[Dict] = None
+
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attrs = parse_attributes(line.split(":", 1)[1])
+            pending = {
+                "bandwidth": int(attrs.get("BANDWIDTH", 0) or 0),
+                "average_bandwidth": int(attrs.get("AVERAGE-BANDWIDTH", 0) or 0),
+                "resolution": attrs.get("RESOLUTION"),
+                "codecs": attrs.get("CODECS"),
+                "audio": attrs.get("AUDIO"),
+            }
+        elif line.startswith("#EXT-X-MEDIA:"):
+            attrs = parse_attributes(line.split(":", 1)[1])
+            uri = attrs.get("URI")
+            media.append(
+                {
+                    "type": attrs.get("TYPE"),
+                    "group_id": attrs.get("GROUP-ID"),
+                    "name": attrs.get("NAME"),
+                    "language": attrs.get("LANGUAGE"),
+                    "default": attrs.get("DEFAULT") == "YES",
+                    "uri": urljoin(base_url, uri) if uri else None,
+                }
+            )
+        elif line and not line.startswith("#") and pending is not None:
+            pending["uri"] = urljoin(base_url, line)
+            variants.append(pending)
+            pending = None
+
+    return {"variants": variants, "media": media}
+
+
+def select_variant(master: Dict) -> Optional[Dict]:
+    """The variant ffmpeg downloads by default: the highest bandwidth."""
+    variants = master.get("variants", [])
+    return max(variants, key=lambda v: v["bandwidth"]) if variants else None
+
+
+def select_audio_rendition(master: Dict) -> Optional[Dict]:
+    """The audio rendition to download for --audio-only.
+
+    Prefers renditions of the audio group used by the selected variant,
+    then DEFAULT=YES. Returns None when the audio is only available muxed
+    into the video variants.
+    """
+    renditions = [
+        m for m in master.get("media", []) if m["type"] == "AUDIO" and m["uri"]
+    ]
+    if not renditions:
+        return None
+
+    variant = select_variant(master)
+    group = variant.get("audio") if variant else None
+    in_group = [m for m in renditions if m["group_id"] == group] or renditions
+    return next((m for m in in_group if m["default"]), in_group[0])
+
+
+def playlist_duration(text: str) -> float:
+    """Total duration in seconds of a media playlist (sum of #EXTINF)."""
+    total = 0.0
+    for line in text.splitlines():
+        if line.startswith("#EXTINF:"):
+            try:
+                total += float(line[len("#EXTINF:") :].split(",", 1)[0])
+            except ValueError:
+                continue
+    return total
@@ -0,0 +1,76 @@
+"""Shared HTTP client for Thuis.
+
+One requests.Session with keep-alive pooling, default (connect, read)
+timeouts and jittered retry on connection errors and 429/5xx.
+"""
+
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from thuis_core import USER_AGENT
+
+# (connect, read) timeouts in seconds and retry policy
+HTTP_TIMEOUT = (5, 30)
+HTTP_RETRIES = 4
+HTTP_BACKOFF = 0.5
+HTTP_POOL_SIZE = 10
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with jitter on the exponential backoff.
+
+    Spreads retries of parallel requests so they don't hit the origin
+    in lockstep after a transient error.
+    """
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+class HTTPSession(requests.Session):
+    """requests.Session that applies a default timeout to every request."""
+
+    def __init__(self, timeout=HTTP_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_http_session(
+    retries: int = HTTP_RETRIES,
+    backoff_factor: float = HTTP_BACKOFF,
+    pool_size: int = HTTP_POOL_SIZE,
+    timeout=HTTP_TIMEOUT,
+) -> HTTPSession:
+    """Create an HTTP session with keep-alive pooling, timeouts and retry.
+
+    Retries connection errors and 429/5xx responses with jittered
+    exponential backoff, honouring Retry-After.
+    """
+    retry = JitteredRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size
+    )
+
+    session = HTTPSession(timeout=timeout)
+    session.headers["User-Agent"] = USER_AGENT
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
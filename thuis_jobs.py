@@ -0,0 +1,383 @@
+"""Persistent download queue for Thuis.
+
+Downloads queued from the web UI or with --enqueue are rows in a SQLite
+table (jobs.db) with their state, attempts, byte progress and timestamps,
+so a restart of the app or the host loses nothing.
+
+Several workers, also on different hosts, can share one queue on a shared
+filesystem. A claimed job carries a lease: the worker's ID and an expiry
+that its heartbeat keeps pushing forward. A job whose lease expired (its
+worker crashed or lost the filesystem) is claimed again by another worker.
+The database uses SQLite's rollback journal, because WAL needs shared
+memory and only works between processes on one host.
+
+Every call opens its own connection, so the queue can be used from the
+Flask threads and the download worker at the same time. Only uses the
+standard library.
+"""
+
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# queued -> running -> done, or back to queued until max_attempts is reached
+STATES = ("queued", "running", "done", "failed")
+MAX_ATTEMPTS = 3
+# A failed job waits attempts * RETRY_DELAY seconds before its next run
+RETRY_DELAY = 60.0
+BUSY_TIMEOUT = 30.0
+
+# A worker renews its lease every HEARTBEAT_INTERVAL; others reclaim the
+# job LEASE_DURATION after the last renewal
+LEASE_DURATION = 120.0
+HEARTBEAT_INTERVAL = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    start_episode INTEGER,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    episodes_done INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    run_after REAL NOT NULL DEFAULT 0,
+    output TEXT,
+    owner TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+# Columns added after the first version of the table
+NEW_COLUMNS = (
+    ("output", "TEXT"),
+    ("owner", "TEXT"),
+    ("lease_expires", "REAL"),
+)
+
+
+class JobQueue:
+    """Download jobs in a SQLite database.
+
+    Args:
+        path: The database file
+        max_attempts: Runs before a failing job is given up
+        retry_delay: Seconds per attempt before a failed job runs again
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_attempts: int = MAX_ATTEMPTS,
+        retry_delay: float = RETRY_DELAY,
+    ):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._created = False
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        """Connection in autocommit mode; creates the database on first use."""
+        if not self._created:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            if not self._created:
+                db.execute("PRAGMA journal_mode=DELETE")
+                db.executescript(SCHEMA)
+                self._migrate(db)
+                self._created = True
+            yield db
+        finally:
+            db.close()
+
+    def _migrate(self, db: sqlite3.Connection):
+        """Add the columns of later versions to an existing jobs table."""
+        columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+        for column, definition in NEW_COLUMNS:
+            if column not in columns:
+                db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    def enqueue(
+        self,
+        url: str,
+        start_episode: Optional[int] = None,
+        output: Optional[str] = None,
+    ) -> Dict:
+        """Add a job, unless the URL is already queued or running.
+
+        An episode job (one with an output) is also not added again once
+        it is done, so a season queued a second time, from any host, only
+        gets jobs for the episodes no worker has downloaded yet.
+
+        Args:
+            output: Path below the media directory for an episode job
+
+        Returns:
+            The new job, or the existing one for the same URL
+        """
+        now = time.time()
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id FROM jobs WHERE url = ? AND (state IN "
+                    "('queued', 'running') OR (state = 'done' AND output = ?)) "
+                    "ORDER BY state = 'done' LIMIT 1",
+                    (url, output),
+                ).fetchone()
+                if row:
+                    job_id = row["id"]
+                else:
+                    job_id = db.execute(
+                        "INSERT INTO jobs (url, start_episode, output, created_at, "
+                        "updated_at) VALUES (?, ?, ?, ?, ?)",
+                        (url, start_episode, output, now, now),
+                    ).lastrowid
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return self._get(db, job_id)
+
+    def _get(self, db: sqlite3.Connection, job_id: int) -> Optional[Dict]:
+        row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._db() as db:
+            return self._get(db, job_id)
+
+    def list(self, limit: int = 100) -> List[Dict]:
+        """Most recent jobs first."""
+        with self._db() as db:
+            rows = db.execute(
+                "SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per state."""
+        with self._db() as db:
+            rows = db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+            found = dict(rows.fetchall())
+        return {state: found.get(state, 0) for state in STATES}
+
+    def claim(
+        self, owner: Optional[str] = None, lease: float = LEASE_DURATION
+    ) -> Optional[Dict]:
+        """Lease the oldest job that is due, or whose lease has expired.
+
+        BEGIN IMMEDIATE takes the write lock before reading, so two
+        workers never claim the same job. A job whose lease expired after
+        its last attempt has failed: its worker crashed or hung every time.
+
+        Args:
+            owner: Worker ID (default: worker_id())
+            lease: Seconds until the job may be reclaimed without a heartbeat
+        """
+        owner = owner or worker_id()
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                db.execute(
+                    "UPDATE jobs SET state = 'failed', error = 'lease verlopen', "
+                    "lease_expires = NULL, finished_at = ?, updated_at = ? "
+                    "WHERE state = 'running' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, now, self.max_attempts),
+                )
+                row = db.execute(
+                    "SELECT id FROM jobs WHERE (state = 'queued' AND run_after <= ?) "
+                    "OR (state = 'running' AND lease_expires < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                db.execute(
+                    "UPDATE jobs SET state = 'running', attempts = attempts + 1, "
+                    "owner = ?, lease_expires = ?, started_at = ?, updated_at = ?, "
+                    "error = NULL WHERE id = ?",
+                    (owner, now + lease, now, now, row["id"]),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return self._get(db, row["id"])
+
+    def heartbeat(
+        self, job_id: int, owner: Optional[str] = None, lease: float = LEASE_DURATION
+    ) -> bool:
+        """Extend the lease on a running job.
+
+        Returns:
+            False if the job is no longer leased to owner (it was reclaimed
+            after the lease expired); the worker should stop working on it
+        """
+        with self._db() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND state = 'running'",
+                (time.time() + lease, time.time(), job_id, owner or worker_id()),
+            )
+            return cursor.rowcount == 1
+
+    def progress(
+        self,
+        job_id: int,
+        bytes_done: Optional[int] = None,
+        episodes_done: Optional[int] = None,
+        owner: Optional[str] = None,
+    ) -> bool:
+        """Store the progress of a running job.
+
+        Returns:
+            False if the job is no longer leased to owner
+        """
+        with self._db() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET bytes_done = COALESCE(?, bytes_done), "
+                "episodes_done = COALESCE(?, episodes_done), updated_at = ? "
+                "WHERE id = ? AND owner = ? AND state = 'running'",
+                (bytes_done, episodes_done, time.time(), job_id, owner or worker_id()),
+            )
+            return cursor.rowcount == 1
+
+    def finish(
+        self,
+        job_id: int,
+        ok: bool,
+        error: Optional[str] = None,
+        owner: Optional[str] = None,
+    ) -> Optional[str]:
+        """Mark a run as done, or queue it again until max_attempts.
+
+        Returns:
+            The job's new state; None if it is leased to another worker now
+        """
+        owner = owner or worker_id()
+        with self._db() as db:
+            # The owner check and the update must see the same row, or a
+            # worker that just reclaimed the job would be overwritten
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                job = self._get(db, job_id)
+                if job is None or job["owner"] != owner or job["state"] != "running":
+                    db.execute("COMMIT")
+                    return None
+                if ok:
+                    state = "done"
+                elif job["attempts"] < self.max_attempts:
+                    state = "queued"
+                else:
+                    state = "failed"
+                retry_at = now + self.retry_delay * job["attempts"]
+                cursor = db.execute(
+                    "UPDATE jobs SET state = ?, error = ?, updated_at = ?, "
+                    "finished_at = ?, run_after = ?, lease_expires = NULL "
+                    "WHERE id = ? AND owner = ? AND state = 'running'",
+                    (
+                        state,
+                        error,
+                        now,
+                        now if state != "queued" else None,
+                        retry_at if state == "queued" else 0,
+                        job_id,
+                        owner,
+                    ),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return state if cursor.rowcount == 1 else None
+
+    def recover(self) -> int:
+        """Queue the jobs that stopped workers on this host left running.
+
+        A job leased by a process of this host that no longer exists was
+        interrupted and is queued at once, or failed if that was its last
+        attempt. Jobs of other hosts keep their lease; claim() takes them
+        over when it expires.
+
+        Returns:
+            Number of jobs put back in the queue
+        """
+        host = worker_host()
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT id, owner, attempts FROM jobs WHERE state = 'running'"
+                ).fetchall()
+                stale = [
+                    row
+                    for row in rows
+                    if row["owner"] is None
+                    or (
+                        row["owner"].rpartition(":")[0] == host
+                        and not pid_alive(int(row["owner"].rpartition(":")[2]))
+                    )
+                ]
+                now = time.time()
+                requeued = [r["id"] for r in stale if r["attempts"] < self.max_attempts]
+                given_up = [
+                    r["id"] for r in stale if r["attempts"] >= self.max_attempts
+                ]
+                db.executemany(
+                    "UPDATE jobs SET state = 'queued', updated_at = ?, run_after = 0, "
+                    "lease_expires = NULL, error = 'onderbroken' WHERE id = ?",
+                    [(now, job_id) for job_id in requeued],
+                )
+                db.executemany(
+                    "UPDATE jobs SET state = 'failed', updated_at = ?, finished_at = ?, "
+                    "lease_expires = NULL, error = 'onderbroken' WHERE id = ?",
+                    [(now, now, job_id) for job_id in given_up],
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return len(requeued)
+
+
+def worker_host() -> str:
+    """Name of this host in leases: THUIS_WORKER_ID, else the host name."""
+    return os.getenv("THUIS_WORKER_ID") or socket.gethostname()
+
+
+def worker_id() -> str:
+    """ID of this worker process in leases: host:pid."""
+    return f"{worker_host()}:{os.getpid()}"
+
+
+def pid_alive(pid: int) -> bool:
+    """True if a process with this ID exists on this host."""
+    if os.name == "nt":
+        # os.kill would terminate it; leave such jobs to lease expiry
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except (OSError, ValueError):
+        return False
+    return True
@@ -0,0 +1,184 @@
+"""Logging pipeline for Thuis.
+
+Log calls only put the record on a queue; a listener thread writes it to a
+rotating log file and the console. Records can carry a job and episode ID
+(set with log_context) and the file can be written as JSON lines.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+from pathlib import Path
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+
+_job_id = contextvars.ContextVar("job_id", default=None)
+_episode_id = contextvars.ContextVar("episode_id", default=None)
+
+_default_job_id: Optional[str] = None
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+@contextmanager
+def log_context(job_id: Optional[str] = None, episode_id: Optional[str] = None):
+    """Attach a job and/or episode ID to records logged in the with-block."""
+    tokens = []
+    if job_id is not None:
+        tokens.append((_job_id, _job_id.set(job_id)))
+    if episode_id is not None:
+        tokens.append((_episode_id, _episode_id.set(episode_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def set_episode_id(episode_id: Optional[str]):
+    """Attach an episode ID to records logged from now on in this context.
+
+    For loops where wrapping each iteration in log_context is impractical.
+    """
+    _episode_id.set(episode_id)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current job and episode ID onto the record.
+
+    Runs in the thread that logs, before the record is queued, so the IDs of
+    the caller's context are used.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.job_id = _job_id.get() or _default_job_id
+        record.episode_id = _episode_id.get()
+        return True
+
+
+class ConsoleFilter(logging.Filter):
+    """Skip records logged with extra={"console": False}."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return getattr(record, "console", True)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("job_id", "episode_id"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging(
+    log_file: Path,
+    console: bool = True,
+    json_lines: bool = False,
+    when: Optional[str] = None,
+    max_bytes: int = MAX_BYTES,
+    backup_count: int = BACKUP_COUNT,
+    level: int = logging.INFO,
+    job_id: Optional[str] = None,
+) -> QueueListener:
+    """Route the root logger through a queue to file and console handlers.
+
+    Args:
+        log_file: Log file, rotated by size or time
+        console: Also write messages to stdout
+        json_lines: Write the log file as JSON lines
+        when: Rotate by time (e.g. "midnight") instead of by size
+        max_bytes: Size at which the log file is rotated
+        backup_count: Number of rotated files to keep
+        level: Root log level
+        job_id: Default job ID for all records of this process
+
+    Returns:
+        The running listener; it is stopped (and the queue flushed) at exit
+    """
+    global _default_job_id, _listener, _queue_handler
+    stop_logging()
+    _default_job_id = job_id
+
+    log_file = Path(log_file)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    if when:
+        file_handler = TimedRotatingFileHandler(
+            log_file, when=when, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    file_handler.setFormatter(
+        JsonFormatter() if json_lines else logging.Formatter(LOG_FORMAT)
+    )
+    handlers = [file_handler]
+
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter("%(message)s"))
+        console_handler.addFilter(ConsoleFilter())
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = QueueHandler(log_queue)
+    _queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def flush_logging():
+    """Wait until the listener has written every queued record.
+
+    Call before input(), so a prompt shows up after the messages logged
+    before it.
+    """
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def stop_logging():
+    """Flush queued records, stop the listener and close its handlers."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,224 @@
+"""Browserless login for Thuis.
+
+Runs the login.vrt.be/authorize OAuth code flow with plain HTTP: fetch the
+login form, post the email and password forms, follow the redirects to the
+VRT MAX callback and return the resulting cookies; the caller stores them
+once VRT MAX accepts the session. Refreshing a session this way takes a second and no browser; a
+Playwright login needs ~200 MB and ~20 s.
+
+When the identity server asks for something a form post can't answer (a
+captcha, a one-time code, a page rendered by JavaScript) an
+InteractiveChallenge is raised and the caller falls back to the browser.
+
+requests is imported on first use, through thuis_http.
+"""
+
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlencode, urljoin
+
+from thuis_cookies import get_store
+
+LOGIN_BASE = "https://login.vrt.be"
+CLIENT_ID = "vrtnu-site"
+REDIRECT_URI = "https://www.vrt.be/vrtmax/sso/callback"
+SCOPE = "openid profile email video"
+
+# Cookie of a logged-in VRT MAX session
+SESSION_COOKIE = "vrtnu-site_profile_at"
+
+# Form posts before giving up; the real flow needs two (email, password)
+MAX_STEPS = 5
+
+# Markers of challenges only a person in a browser can answer
+CHALLENGE_CLASSES = ("g-recaptcha", "h-captcha", "cf-turnstile", "captcha")
+CHALLENGE_INPUTS = ("otp", "code", "totp", "mfa")
+CHALLENGE_TYPES = ("text", "tel", "number")
+
+
+class HTTPLoginError(Exception):
+    """The HTTP login could not be completed; log in with the browser."""
+
+
+class InteractiveChallenge(HTTPLoginError):
+    """The identity server wants a captcha, a code or JavaScript."""
+
+
+class LoginRejected(HTTPLoginError):
+    """The identity server showed the password form again."""
+
+
+def authorize_url(
+    base: str = LOGIN_BASE, redirect_uri: str = REDIRECT_URI, client_id=CLIENT_ID
+) -> str:
+    params = {
+        "response_type": "code",
+        "client_id": client_id,
+        "redirect_uri": redirect_uri,
+        "scope": SCOPE,
+    }
+    return f"{base}/authorize?{urlencode(params)}"
+
+
+class FormParser(HTMLParser):
+    """Collects the forms on a page and notices interactive challenges."""
+
+    def __init__(self):
+        super().__init__()
+        self.forms: List[Dict] = []
+        self.challenge: Optional[str] = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: v or "" for k, v in attrs}
+        classes = attrs.get("class", "").split()
+        for marker in CHALLENGE_CLASSES:
+            if marker in classes or marker in attrs.get("id", ""):
+                self.challenge = self.challenge or marker
+
+        if tag == "form":
+            self.forms.append(
+                {
+                    "action": attrs.get("action", ""),
+                    "method": attrs.get("method", "get").lower(),
+                    "fields": [],
+                }
+            )
+        elif tag in ("input", "button") and self.forms:
+            field_type = attrs.get("type", "text").lower()
+            name = attrs.get("name", "")
+            # A hidden "code" is the OAuth code of a form_post, not a prompt
+            if field_type in CHALLENGE_TYPES and (
+                attrs.get("autocomplete") == "one-time-code"
+                or name.lower() in CHALLENGE_INPUTS
+            ):
+                self.challenge = self.challenge or "eenmalige code"
+            if name and (tag == "input" or field_type == "submit"):
+                self.forms[-1]["fields"].append(
+                    {"name": name, "type": field_type, "value": attrs.get("value", "")}
+                )
+
+
+def parse_forms(html: str) -> FormParser:
+    parser = FormParser()
+    parser.feed(html)
+    return parser
+
+
+def fill_form(form: Dict, username: str, password: str) -> Dict[str, str]:
+    """Form data with the credentials filled in and hidden fields kept.
+
+    Raises:
+        HTTPLoginError: The form asks for neither email nor password
+    """
+    data = {}
+    filled = False
+    for field in form["fields"]:
+        if field["type"] == "password":
+            data[field["name"]] = password
+            filled = True
+        elif field["type"] == "email" or field["name"] in ("email", "username"):
+            data[field["name"]] = username
+            filled = True
+        elif field["type"] in ("hidden", "text", "submit"):
+            data[field["name"]] = field["value"]
+    if not filled:
+        raise HTTPLoginError("Onbekend formulier op de loginpagina")
+    return data
+
+
+def jar_to_cookies(jar) -> List[Dict]:
+    """requests cookies in the format Playwright and cookies.json use."""
+    return [
+        {
+            "name": c.name,
+            "value": c.value,
+            "domain": c.domain,
+            "path": c.path,
+            "expires": float(c.expires) if c.expires else -1,
+            "httpOnly": c.has_nonstandard_attr("HttpOnly")
+            or c.has_nonstandard_attr("httponly"),
+            "secure": c.secure,
+            "sameSite": "Lax",
+        }
+        for c in jar
+    ]
+
+
+def reached(response, redirect_uri: str) -> bool:
+    """True once the flow passed through the callback."""
+    return any(r.url.startswith(redirect_uri) for r in [*response.history, response])
+
+
+def has_session(cookies: List[Dict]) -> bool:
+    """True when the cookies hold a VRT MAX session."""
+    return any(c["name"] == SESSION_COOKIE and c["value"] for c in cookies)
+
+
+def http_login(
+    username: str,
+    password: str,
+    cookie_file: Path,
+    base: str = LOGIN_BASE,
+    redirect_uri: str = REDIRECT_URI,
+    session=None,
+) -> List[Dict]:
+    """Log in without a browser and return the session cookies.
+
+    Stored cookies are sent along, so a still valid identity server
+    session is redirected straight to the callback without any forms.
+    Nothing is written: reaching the callback is no proof the session
+    works, so the caller stores the cookies after checking them.
+
+    Args:
+        cookie_file: The shared cookie store to read
+        base: Identity server, overridden to test against a local stand-in
+        redirect_uri: Callback that ends the flow
+        session: requests session to use (default: a thuis_http session)
+
+    Returns:
+        All cookies of the session
+
+    Raises:
+        InteractiveChallenge: A captcha, code or JavaScript page showed up
+        LoginRejected: The credentials were not accepted
+        HTTPLoginError: Any other page the flow can't handle
+    """
+    if session is None:
+        from thuis_http import create_http_session
+
+        session = create_http_session()
+
+    for c in get_store(cookie_file).load() or []:
+        session.cookies.set(c["name"], c["value"], domain=c["domain"], path=c["path"])
+
+    resp = session.get(authorize_url(base, redirect_uri))
+    password_sent = False
+    for _ in range(MAX_STEPS):
+        if reached(resp, redirect_uri):
+            break
+        if resp.status_code >= 400:
+            raise HTTPLoginError(f"Loginpagina gaf HTTP {resp.status_code}")
+
+        page = parse_forms(resp.text)
+        if page.challenge:
+            raise InteractiveChallenge(f"Loginpagina vraagt {page.challenge}")
+        forms = [f for f in page.forms if f["method"] == "post"]
+        if not forms:
+            raise InteractiveChallenge("Loginpagina heeft JavaScript nodig")
+
+        form = forms[0]
+        has_password = any(f["type"] == "password" for f in form["fields"])
+        if has_password and password_sent:
+            raise LoginRejected("E-mailadres of wachtwoord geweigerd")
+        password_sent = password_sent or has_password
+
+        resp = session.post(
+            urljoin(resp.url, form["action"]),
+            data=fill_form(form, username, password),
+        )
+    # The last allowed post may itself have reached the callback
+    if not reached(resp, redirect_uri):
+        raise HTTPLoginError(f"Login niet afgerond na {MAX_STEPS} stappen")
+
+    return jar_to_cookies(session.cookies)
@@ -0,0 +1,278 @@
+"""Prometheus metrics for Thuis.
+
+Small dependency-free registry that renders the Prometheus text exposition
+format. The CLI writes its metrics to a textfile (node_exporter textfile
+collector), the web app serves its own metrics on /metrics.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class for a single unlabelled metric."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[Tuple[str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for sample, value in self.samples():
+            lines.append(f"{sample} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> List[Tuple[str, float]]:
+        return [(self.name, self.value)]
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self.value = 0.0
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def samples(self) -> List[Tuple[str, float]]:
+        return [(self.name, self.value)]
+
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed buckets."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float]):
+        super().__init__(name, documentation)
+        self.buckets = sorted(buckets) + [float("inf")]
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the with-block in seconds."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start)
+
+    def samples(self) -> List[Tuple[str, float]]:
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            result.append((f'{self.name}_bucket{{le="{_format_value(bound)}"}}', count))
+        result.append((f"{self.name}_sum", self.sum))
+        result.append((f"{self.name}_count", self.count))
+        return result
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self.register(Gauge(name, documentation))
+
+    def histogram(
+        self, name: str, documentation: str, buckets: Iterable[float]
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.metrics.values())
+
+    def write_textfile(self, path: Path):
+        """Atomically write the metrics for the node_exporter textfile collector."""
+        write_textfile(path, self.render())
+
+
+def write_textfile(path: Path, text: str):
+    """Write text via a temp file and rename, so scrapers never see half a file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile with linear interpolation between closest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class StageTimer:
+    """Collects wall-clock durations per pipeline stage for a single run."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.durations: Dict[str, List[float]] = {}
+
+    def record(self, stage: str, seconds: float):
+        self.durations.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record the duration of the with-block under the given stage."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, time.monotonic() - start)
+
+    def summary(self) -> Dict:
+        """Totals and percentiles per stage, in recording order."""
+        stages = {}
+        for name, values in self.durations.items():
+            stages[name] = {
+                "count": len(values),
+                "total": round(sum(values), 3),
+                "mean": round(sum(values) / len(values), 3),
+                "min": round(min(values), 3),
+                "p50": round(percentile(values, 50), 3),
+                "p90": round(percentile(values, 90), 3),
+                "p95": round(percentile(values, 95), 3),
+                "max": round(max(values), 3),
+            }
+        return {
+            "wall_seconds": round(time.monotonic() - self.started, 3),
+            "stages": stages,
+        }
+
+    def format_table(self) -> str:
+        """Human readable summary for the end of a CLI run."""
+        summary = self.summary()
+        lines = [
+            f"{'Stap':<18} {'n':>4} {'totaal':>9} {'p50':>8} {'p90':>8} {'p95':>8} {'max':>8}"
+        ]
+        for name, s in summary["stages"].items():
+            lines.append(
+                f"{name:<18} {s['count']:>4} {s['total']:>8.2f}s {s['p50']:>7.2f}s "
+                f"{s['p90']:>7.2f}s {s['p95']:>7.2f}s {s['max']:>7.2f}s"
+            )
+        lines.append(f"Totale looptijd: {summary['wall_seconds']:.2f}s")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+BYTES_DOWNLOADED = REGISTRY.counter(
+    "thuis_bytes_downloaded_total", "Bytes written by completed downloads"
+)
+EPISODES_COMPLETED = REGISTRY.counter(
+    "thuis_episodes_completed_total", "Episodes downloaded successfully"
+)
+EPISODES_FAILED = REGISTRY.counter(
+    "thuis_episodes_failed_total", "Episodes that failed to download"
+)
+LOGIN_DURATION = REGISTRY.histogram(
+    "thuis_login_duration_seconds",
+    "Time to log in or restore a session",
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120),
+)
+RESOLVE_DURATION = REGISTRY.histogram(
+    "thuis_resolve_duration_seconds",
+    "Time from opening an episode page to having the stream URL",
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60),
+)
+FFMPEG_THROUGHPUT = REGISTRY.histogram(
+    "thuis_ffmpeg_throughput_bytes_per_second",
+    "Average ffmpeg transfer rate per download",
+    buckets=(
+        256 * 1024,
+        512 * 1024,
+        1024**2,
+        2 * 1024**2,
+        5 * 1024**2,
+        10 * 1024**2,
+        20 * 1024**2,
+        50 * 1024**2,
+    ),
+)
+QUEUE_DEPTH = REGISTRY.gauge("thuis_queue_depth", "Episodes waiting to be downloaded")
+ACTIVE_WORKERS = REGISTRY.gauge(
+    "thuis_active_workers", "Download workers currently running"
+)
+BROWSER_RSS = REGISTRY.gauge(
+    "thuis_browser_rss_bytes", "Resident memory of the browser process tree"
+)
+BROWSER_RESTARTS = REGISTRY.counter(
+    "thuis_browser_restarts_total", "Browser restarts by the memory watchdog"
+)
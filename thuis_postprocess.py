@@ -0,0 +1,306 @@
+"""Post-processing of finished downloads.
+
+Remuxes mp4 files with the moov atom at the front (faststart), so players
+can start without reading the end of the file first, and optionally
+validates the result. The same remux turns fragmented MP4 or MPEG-TS
+output (written for play-while-downloading) into a regular mp4. Runs in a
+bounded process pool so it overlaps with the next episode's transfer.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import struct
+import subprocess
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from thuis_disk import DiskSpaceScheduler
+
+# Top-level atom types that decide whether a file is faststart
+MOOV = b"moov"
+MDAT = b"mdat"
+MOOF = b"moof"
+
+# Output modes that can be played while downloading, with their muxer options
+FRAGMENTED_FORMATS = {
+    "fmp4": [
+        "-f",
+        "mp4",
+        "-movflags",
+        "+frag_keyframe+empty_moov+default_base_moof",
+        "-flush_packets",
+        "1",
+    ],
+    "ts": ["-f", "mpegts", "-flush_packets", "1"],
+}
+
+
+def pool_context() -> multiprocessing.context.BaseContext:
+    """Start method for process pools: forkserver, or spawn where it is missing.
+
+    Pools are created while logging and transfer threads run, and a forked
+    child could inherit a lock one of them holds.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn"
+    )
+
+
+def partial_path(output_path: Path, output_format: Optional[str]) -> Path:
+    """File written during a play-while-downloading transfer.
+
+    x.mp4 becomes x.part.mp4 or x.part.ts, which is not picked up as an
+    existing episode until the final remux has written x.mp4.
+    """
+    if not output_format:
+        return output_path
+    suffix = ".ts" if output_format == "ts" else output_path.suffix
+    return output_path.with_name(f"{output_path.stem}.part{suffix}")
+
+
+def _top_level_atoms(f: BinaryIO, limit: int = 64) -> List[bytes]:
+    """Types of the first top-level atoms of an ISO BMFF file."""
+    atoms = []
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    offset = 0
+    while offset + 8 <= file_size and len(atoms) < limit:
+        f.seek(offset)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:
+            size = file_size - offset
+        if size < 8:
+            break
+        atoms.append(kind)
+        offset += size
+    return atoms
+
+
+def has_faststart(path: Path) -> bool:
+    """True for a regular mp4 with moov before mdat.
+
+    Fragmented files (moov followed by moof/mdat pairs) are not: they still
+    need the final remux.
+    """
+    with open(path, "rb") as f:
+        atoms = _top_level_atoms(f)
+    if MOOV not in atoms or MOOF in atoms:
+        return False
+    return MDAT not in atoms or atoms.index(MOOV) < atoms.index(MDAT)
+
+
+def validate_media(
+    path: Path, ffmpeg: str = "ffmpeg", ffprobe: Optional[str] = None
+) -> bool:
+    """Check that the file can be read to the end.
+
+    Uses ffprobe when available (reads only the headers), otherwise decodes
+    the file with ffmpeg into the null muxer.
+    """
+    if ffprobe:
+        cmd = [
+            ffprobe,
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            str(path),
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        try:
+            return result.returncode == 0 and float(result.stdout.strip()) > 0
+        except ValueError:
+            return False
+
+    cmd = [ffmpeg, "-v", "error", "-i", str(path), "-f", "null", "-"]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    return result.returncode == 0 and not result.stderr.strip()
+
+
+def remux_faststart(
+    path: Path,
+    ffmpeg: str = "ffmpeg",
+    validate: bool = False,
+    ffprobe: Optional[str] = None,
+    destination: Optional[Path] = None,
+) -> Dict:
+    """Rewrite an mp4 with +faststart and replace the original atomically.
+
+    The remux goes to a temp file next to the destination, so a failed or
+    invalid remux leaves the download untouched. With a destination (the
+    final defragment of a .part file) the source is removed on success.
+
+    Returns:
+        Dict with path, success, skipped, seconds and error
+    """
+    path = Path(path)
+    destination = Path(destination) if destination else path
+    start = time.monotonic()
+    result = {
+        "path": str(destination),
+        "success": False,
+        "skipped": False,
+        "error": None,
+    }
+
+    try:
+        if destination == path and has_faststart(path):
+            result.update(success=True, skipped=True)
+            return result
+
+        tmp_path = destination.with_name(f".{destination.stem}.faststart.mp4")
+        cmd = [
+            ffmpeg,
+            "-y",
+            "-v",
+            "error",
+            "-i",
+            str(path),
+            "-map",
+            "0",
+            "-c",
+            "copy",
+            "-movflags",
+            "+faststart",
+            "-f",
+            "mp4",
+            str(tmp_path),
+        ]
+        process = subprocess.run(cmd, capture_output=True, text=True)
+        if process.returncode != 0 or not tmp_path.exists():
+            result["error"] = process.stderr.strip()[-500:] or "ffmpeg remux mislukt"
+        elif validate and not validate_media(tmp_path, ffmpeg, ffprobe):
+            result["error"] = "Validatie mislukt"
+        else:
+            os.replace(tmp_path, destination)
+            if destination != path:
+                path.unlink(missing_ok=True)
+            result["success"] = True
+        if not result["success"]:
+            tmp_path.unlink(missing_ok=True)
+    except OSError as e:
+        result["error"] = str(e)
+    finally:
+        result["seconds"] = time.monotonic() - start
+
+    return result
+
+
+class PostProcessor:
+    """Bounded process pool for post-processing finished downloads.
+
+    submit() waits while max_pending jobs are queued or running, so a fast
+    season download cannot pile up an unbounded backlog of remuxes. It is
+    awaited, so the downloads on the same event loop keep going meanwhile.
+
+    With a disk scheduler, submit() reserves the size of the file for the
+    temp copy the remux writes next to it, and the result releases it.
+
+    The workers are started with forkserver (spawn where that is missing),
+    see pool_context().
+
+    Args:
+        workers: Number of worker processes
+        max_pending: Jobs allowed in flight before submit() waits
+        on_done: Called with each result dict in the submitting process
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        max_pending: Optional[int] = None,
+        on_done: Optional[Callable[[Dict], None]] = None,
+        **options,
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending or self.workers * 2
+        self.on_done = on_done
+        self.options = options
+        self.results: List[Dict] = []
+        self._pending: List[Future] = []
+        # Disk space reserved per pending job, for its temp copy
+        self._reserved: Dict[Future, Tuple[DiskSpaceScheduler, int]] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _collect(self, futures):
+        for future in futures:
+            self._pending.remove(future)
+            disk, size = self._reserved.pop(future, (None, 0))
+            if disk:
+                disk.release(size)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"path": None, "success": False, "error": str(e)}
+            self.results.append(result)
+            if self.on_done:
+                self.on_done(result)
+
+    def poll(self):
+        """Handle jobs that finished since the last call."""
+        self._collect([f for f in self._pending if f.done()])
+
+    async def submit(
+        self,
+        path: Path,
+        destination: Optional[Path] = None,
+        disk: Optional[DiskSpaceScheduler] = None,
+    ):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=pool_context()
+            )
+        self.poll()
+        while len(self._pending) >= self.max_pending:
+            await asyncio.wait(
+                [asyncio.wrap_future(f) for f in self._pending],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            self.poll()
+        size = 0
+        if disk:
+            try:
+                size = Path(path).stat().st_size
+            except OSError:
+                pass
+            # The remux writes a full copy before it replaces the file
+            if not await asyncio.to_thread(disk.reserve, size):
+                result = {
+                    "path": str(destination or path),
+                    "success": False,
+                    "error": "Onvoldoende schijfruimte",
+                }
+                self.results.append(result)
+                if self.on_done:
+                    self.on_done(result)
+                return
+        future = self._executor.submit(
+            remux_faststart, Path(path), destination=destination, **self.options
+        )
+        self._pending.append(future)
+        if disk:
+            self._reserved[future] = (disk, size)
+
+    def close(self) -> List[Dict]:
+        """Wait for all jobs and shut the pool down."""
+        if self._pending:
+            done, _ = wait(list(self._pending))
+            self._collect(done)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        return self.results
+
+    def __enter__(self) -> "PostProcessor":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,171 @@
+"""S3-compatible object storage output for Thuis.
+
+`-o s3://bucket/prefix/` streams ffmpeg's output straight into a multipart
+upload, so no local copy of the episode is written. Works with AWS S3 and
+with MinIO or other S3-compatible stores via S3_ENDPOINT_URL.
+
+boto3 is imported on first use; credentials come from the usual AWS
+environment variables or config files.
+"""
+
+import os
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+# S3 requires at least 5 MiB for every part except the last
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+
+def is_s3_url(value: Optional[str]) -> bool:
+    return bool(value) and value.startswith("s3://")
+
+
+def parse_s3_url(url: str) -> Tuple[str, str]:
+    """Split s3://bucket/some/prefix into ("bucket", "some/prefix")."""
+    if not is_s3_url(url):
+        raise ValueError(f"Geen S3 URL: {url}")
+    bucket, _, key = url[len("s3://") :].partition("/")
+    if not bucket:
+        raise ValueError(f"Geen bucket in S3 URL: {url}")
+    return bucket, key
+
+
+def create_s3_client():
+    """boto3 S3 client; S3_ENDPOINT_URL points it at MinIO and friends."""
+    try:
+        import boto3
+    except ImportError:
+        raise RuntimeError("boto3 is niet geïnstalleerd (pip install boto3)")
+
+    return boto3.client("s3", endpoint_url=os.getenv("S3_ENDPOINT_URL") or None)
+
+
+class MultipartUpload:
+    """Write-only stream that uploads its data as S3 multipart parts.
+
+    Data is buffered up to part_size and then sent as one part. complete()
+    uploads the remainder and finishes the object; abort() discards all
+    parts, so a failed transfer never leaves a partial object behind.
+    """
+
+    def __init__(
+        self, client, bucket: str, key: str, part_size: int = DEFAULT_PART_SIZE
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.parts: List[dict] = []
+        self.size = 0
+        self._buffer = bytearray()
+        self.upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)[
+            "UploadId"
+        ]
+
+    def write(self, data: bytes):
+        self._buffer.extend(data)
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+
+    def _upload_part(self, data: bytes):
+        number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=data,
+        )
+        self.parts.append({"PartNumber": number, "ETag": response["ETag"]})
+
+    def complete(self) -> int:
+        """Upload the last part and finish the object; returns its size."""
+        if self._buffer or not self.parts:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+        return self.size
+
+    def abort(self):
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+        )
+
+
+def upload_stream(
+    stream: BinaryIO,
+    client,
+    bucket: str,
+    key: str,
+    part_size: int = DEFAULT_PART_SIZE,
+    before_complete: Callable[[], None] = lambda: None,
+) -> int:
+    """Copy a stream (e.g. ffmpeg stdout) into an object.
+
+    before_complete runs at end of stream and may raise to reject the
+    object, e.g. when the writer exited with an error.
+
+    Raises:
+        Whatever the client or before_complete raises; the upload is
+        aborted first.
+
+    Returns:
+        Number of bytes uploaded
+    """
+    upload = MultipartUpload(client, bucket, key, part_size)
+    try:
+        while True:
+            data = stream.read(READ_SIZE)
+            if not data:
+                break
+            upload.write(data)
+        before_complete()
+        return upload.complete()
+    except BaseException:
+        upload.abort()
+        raise
+
+
+class S3Target:
+    """Output location s3://bucket/prefix/ for downloads.
+
+    Args:
+        url: s3://bucket/prefix/ (a directory) or s3://bucket/key.mp4
+        client: S3 client, created with create_s3_client() when omitted
+    """
+
+    def __init__(self, url: str, client=None):
+        self.url = url
+        self.bucket, self.prefix = parse_s3_url(url)
+        self.client = client or create_s3_client()
+
+    @property
+    def is_directory(self) -> bool:
+        return not self.prefix or self.prefix.endswith("/")
+
+    def key_for(self, relative: str) -> str:
+        """Object key for a file name relative to the target."""
+        if not self.is_directory:
+            return self.prefix
+        return f"{self.prefix}{relative}"
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+    def existing(self, directory: str) -> List[str]:
+        """File names already stored under prefix/directory/."""
+        prefix = self.key_for(f"{directory}/")
+        names = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                names.append(item["Key"][len(prefix) :])
+        return names
@@ -0,0 +1,244 @@
+"""Library verification for Thuis.
+
+`thuis.py --verify media/` probes every episode with ffprobe in a process
+pool and compares the container duration with the duration recorded from
+the HLS playlist at download time. Zero-byte, truncated, unreadable and
+leftover partial files are reported. Results are cached by (path, size,
+mtime), so a rerun only probes files that changed.
+"""
+
+import json
+import os
+import re
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from thuis_cookies import file_lock
+from thuis_postprocess import pool_context
+
+# Expected durations, one file per download directory
+EXPECTED_FILE = ".thuis-expected.json"
+CACHE_FILE = ".thuis-verify-cache.json"
+
+MEDIA_EXTENSIONS = (".mp4", ".m4a", ".ts")
+
+# A file may be this much shorter than the playlist before it is truncated
+TOLERANCE_SECONDS = 5.0
+TOLERANCE_RATIO = 0.02
+
+STATUS_OK = "ok"
+STATUS_EMPTY = "leeg"
+STATUS_PARTIAL = "onvolledig"
+STATUS_TRUNCATED = "afgekapt"
+STATUS_CORRUPT = "corrupt"
+
+
+def _load_json(path: Path) -> Dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: Path, data: Dict, **kwargs):
+    """Write through a temp file and os.replace; readers never see half a file."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, **kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def record_expected_duration(media_path: Path, seconds: float):
+    """Remember the playlist duration of a download for later verification.
+
+    Workers on several hosts may add to the same directory's file; the
+    lock keeps them from dropping each other's entries.
+    """
+    media_path = Path(media_path)
+    index_path = media_path.parent / EXPECTED_FILE
+    with file_lock(index_path.with_name(f"{EXPECTED_FILE}.lock")):
+        expected = _load_json(index_path)
+        expected[media_path.name] = round(seconds, 3)
+        _write_json(index_path, expected, indent=2, sort_keys=True)
+
+
+def find_media_files(root: Path) -> List[Path]:
+    """Media files below root, without hidden ones such as a remux's temp copy."""
+    root = Path(root)
+    return sorted(
+        path
+        for path in root.rglob("*")
+        if path.suffix in MEDIA_EXTENSIONS
+        and not any(part.startswith(".") for part in path.relative_to(root).parts)
+        and path.is_file()
+    )
+
+
+def probe_duration(
+    path: Path, ffprobe: Optional[str], ffmpeg: str = "ffmpeg"
+) -> Optional[float]:
+    """Container duration in seconds, None if the file cannot be read."""
+    if ffprobe:
+        cmd = [
+            ffprobe,
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            str(path),
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        try:
+            return float(result.stdout.strip()) if result.returncode == 0 else None
+        except ValueError:
+            return None
+
+    # Without ffprobe: ffmpeg prints the duration while opening the input
+    result = subprocess.run(
+        [ffmpeg, "-hide_banner", "-i", str(path)], capture_output=True, text=True
+    )
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def check_file(
+    path: str,
+    expected: Optional[float] = None,
+    ffprobe: Optional[str] = None,
+    ffmpeg: str = "ffmpeg",
+) -> Dict:
+    """Verify one file; runs in a worker process.
+
+    Returns:
+        Dict with path, status, duration, expected and size; None if the
+        file was removed during the scan
+    """
+    path = Path(path)
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return None
+    result = {
+        "path": str(path),
+        "status": STATUS_OK,
+        "duration": None,
+        "expected": expected,
+        "size": size,
+    }
+
+    if ".part." in path.name:
+        result["status"] = STATUS_PARTIAL
+        return result
+    if result["size"] == 0:
+        result["status"] = STATUS_EMPTY
+        return result
+
+    duration = probe_duration(path, ffprobe, ffmpeg)
+    result["duration"] = duration
+    if not duration:
+        result["status"] = STATUS_CORRUPT
+    elif expected:
+        allowed = max(TOLERANCE_SECONDS, expected * TOLERANCE_RATIO)
+        if duration < expected - allowed:
+            result["status"] = STATUS_TRUNCATED
+    return result
+
+
+def verify_library(
+    root: Path,
+    ffprobe: Optional[str] = None,
+    ffmpeg: str = "ffmpeg",
+    workers: Optional[int] = None,
+    use_cache: bool = True,
+) -> List[Dict]:
+    """Check every media file below root.
+
+    Unchanged files (same size and mtime as in the cache) are not probed
+    again; the rest are probed in a process pool.
+    """
+    root = Path(root)
+    cache_path = root / CACHE_FILE
+    cache = _load_json(cache_path) if use_cache else {}
+    expected_by_dir: Dict[Path, Dict] = {}
+
+    results: Dict[str, Dict] = {}
+    todo = []
+    for path in find_media_files(root):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        key = str(path.relative_to(root))
+        cached = cache.get(key)
+        if (
+            cached
+            and cached["size"] == stat.st_size
+            and cached["mtime"] == stat.st_mtime
+        ):
+            results[key] = cached["result"]
+            continue
+
+        if path.parent not in expected_by_dir:
+            expected_by_dir[path.parent] = _load_json(path.parent / EXPECTED_FILE)
+        todo.append((key, path, stat))
+
+    if todo:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=pool_context()
+        ) as executor:
+            futures = [
+                executor.submit(
+                    check_file,
+                    str(path),
+                    expected_by_dir[path.parent].get(path.name),
+                    ffprobe,
+                    ffmpeg,
+                )
+                for _, path, _ in todo
+            ]
+            for (key, path, stat), future in zip(todo, futures):
+                result = future.result()
+                if result is None:
+                    continue
+                results[key] = result
+                cache[key] = {
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "result": result,
+                }
+
+    if use_cache:
+        # Drop entries of files that no longer exist
+        cache = {key: cache[key] for key in results if key in cache}
+        _write_json(cache_path, cache, indent=1)
+
+    return [results[key] for key in sorted(results)]
+
+
+def format_report(results: List[Dict]) -> str:
+    """Problems first, then a count per status."""
+    lines = []
+    for result in results:
+        if result["status"] == STATUS_OK:
+            continue
+        detail = ""
+        if result["status"] == STATUS_TRUNCATED:
+            detail = f" ({result['duration']:.0f}s van {result['expected']:.0f}s)"
+        lines.append(f"  {result['status']:<11} {result['path']}{detail}")
+
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    lines.append(f"Gecontroleerd: {len(results)} bestanden ({summary or 'geen'})")
+    return "\n".join(lines)